@@ -1,6 +1,8 @@
 import os
+import sys
 
-from pyxadd import diagram as core, matrix_vector
+from pyxadd import diagram as core, matrix_vector, serialize
+from pyxadd.build import Builder
 from pyxadd.timer import Timer
 
 
@@ -30,16 +32,124 @@ class Benchmark(object):
         pool_file = os.path.dirname(os.path.realpath(__file__)) + "/data/test_evaluate_1.txt"
         root_id = 1663
 
-        with open(pool_file, "r") as stream:
-            json_input = stream.readline()
-
-        exported_pool = core.Pool.from_json(json_input)
+        exported_pool = load_pool(pool_file)
         diagram = exported_pool.diagram(root_id)
         var_list = [('r_f0', 0, 1658), ('r_f1', 0, 964), ('c_f0', 0, 1658), ('c_f1', 0, 964)]
         variables = [Variable(name, "int", lb, ub) for name, lb, ub in var_list]
         return diagram, variables
 
 
+def polynomial_blocks(size=60, blocks=6):
+    """
+    Builds a generated diagram (no data files needed) over the variables r and c with polynomial leaves on a grid of
+    blocks (and symbolic leaves in the variable k that is not summed out)
+    :rtype Tuple[Diagram, List[Variable]]:
+    """
+    pool = core.Pool()
+    b = Builder(pool)
+    b.ints("r", "c", "k")
+    width = size // blocks
+    diagram = b.exp(0)
+    for i in range(blocks):
+        for j in range(blocks):
+            block = b.limit("r", i * width, (i + 1) * width - 1) * b.limit("c", j * width, (j + 1) * width - 1)
+            leaf = "{}*r**2*c + {}*r*c/{} + {}*c**3 + k*r".format(i + 1, j + 2, i + 3, (i + j) % 4)
+            diagram += block * b.exp(leaf)
+    variables = [Variable(name, "int", 0, size - 1) for name in ("r", "c")]
+    return diagram, variables
+
+
+def run_summation_engines(size=60, blocks=6, verbose=True):
+    """
+    Compares summing out all variables of a generated diagram (see polynomial_blocks) using the native polynomial
+    summation engine and using SymPy
+    :return Tuple[float, float]: The time using SymPy and the time using the native engine
+    """
+    times = []
+    previous = matrix_vector.SummationCache.native
+    try:
+        for native in (False, True):
+            matrix_vector.SummationCache.native = native
+            diagram, variables = polynomial_blocks(size, blocks)
+            timer = Timer(verbose=verbose)
+            timer.start("Summing out {} ({})".format([v.name for v in variables], "native" if native else "SymPy"))
+            result = diagram.pool.diagram(matrix_vector.sum_out(diagram.pool, diagram.root_id,
+                                                                [v.name for v in variables]))
+            times.append(timer.stop())
+            if verbose:
+                cache = diagram.pool.caches[matrix_vector.SummationCache.name]
+                print("Result: {}, summation cache: {}".format(result.evaluate({"k": 1}), cache.statistics()))
+    finally:
+        matrix_vector.SummationCache.native = previous
+    return tuple(times)
+
+
+def chain(length=4, size=6):
+    """
+    Builds a generated diagram over the variables x0, ..., x{length - 1} in which only consecutive variables share
+    tests (a chain), summing out inner variables first connects their neighbors
+    :rtype Tuple[Diagram, List[Variable]]:
+    """
+    pool = core.Pool()
+    b = Builder(pool)
+    names = ["x{}".format(i) for i in range(length)]
+    b.ints(*names)
+    diagram = b.exp(1)
+    for name in names:
+        diagram *= b.limit(name, 0, size - 1)
+    for name1, name2 in zip(names, names[1:]):
+        test = b.test("{} + {}".format(name1, name2), "<=", size)
+        diagram *= b.ite(test, b.exp("{}*{}".format(name1, name2)), b.exp(1))
+    return diagram, [Variable(name, "int", 0, size - 1) for name in names]
+
+
+def run_elimination_order(length=4, size=6, verbose=True):
+    """
+    Compares summing out all variables of a chain (see chain) eliminating the inner variables first and using the
+    automatic elimination order
+    :return Tuple[float, float]: The time using the given order and the time using the automatic order
+    """
+    times = []
+    for order in (None, "auto"):
+        diagram, variables = chain(length, size)
+        names = [v.name for v in variables]
+        names = names[1::2] + names[0::2]
+        timer = Timer(verbose=verbose)
+        timer.start("Summing out {} (order: {})".format(names, order or "given"))
+        result = diagram.pool.diagram(matrix_vector.sum_out(diagram.pool, diagram.root_id, names, order=order))
+        times.append(timer.stop())
+        if verbose:
+            print("Result: {}".format(result.evaluate({})))
+    return tuple(times)
+
+
+# Directory in which converted pools are cached (ignored by git)
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.realpath(__file__)), ".cache")
+
+
+def load_pool(pool_file):
+    """
+    Loads a JSON exported pool, the pool is converted to the binary format on first use (stored in CACHE_DIRECTORY,
+    keyed by the name of the JSON file and the version of the binary format) since loading JSON is much slower than
+    the operations being benchmarked
+    :param str pool_file: The path of the JSON file
+    :rtype: Pool
+    """
+    name = os.path.splitext(os.path.basename(pool_file))[0]
+    binary_file = os.path.join(CACHE_DIRECTORY, "{}.v{}.xadd".format(name, serialize.VERSION))
+    if os.path.exists(binary_file) and os.path.getmtime(binary_file) >= os.path.getmtime(pool_file):
+        return serialize.load(binary_file)
+
+    with open(pool_file, "r") as stream:
+        json_input = stream.readline()
+
+    pool = core.Pool.from_json(json_input)
+    if not os.path.isdir(CACHE_DIRECTORY):
+        os.makedirs(CACHE_DIRECTORY)
+    serialize.dump(pool, binary_file)
+    return pool
+
+
 def repeat(times, benchmark_test, skip_first=True):
     """
     Repeat a test multiple times
@@ -128,9 +238,15 @@ def run_diagram(method, operation, verbose):
 
 
 if __name__ == "__main__":
-    def eliminate_all(d, v):
-        assert isinstance(d, core.Diagram)
-        matrix_vector.sum_out(d.pool, d.root_id, [t.name for t in v])
-
-    aggregated = average(repeat(1, lambda: run_all_diagrams(eliminate_all), skip_first=False))
-    print("\n".join("Integration {} took {:.2f}s".format(data[0], data[2]) for data in aggregated))
+    # The generated workloads are run on request ("python benchmark.py summation" or "elimination")
+    if "summation" in sys.argv[1:]:
+        run_summation_engines()
+    elif "elimination" in sys.argv[1:]:
+        run_elimination_order()
+    else:
+        def eliminate_all(d, v):
+            assert isinstance(d, core.Diagram)
+            matrix_vector.sum_out(d.pool, d.root_id, [t.name for t in v])
+
+        aggregated = average(repeat(1, lambda: run_all_diagrams(eliminate_all), skip_first=False))
+        print("\n".join("Integration {} took {:.2f}s".format(data[0], data[2]) for data in aggregated))
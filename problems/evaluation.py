@@ -0,0 +1,270 @@
+from __future__ import print_function
+
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import tempfile
+
+import numpy
+
+from pyxadd import matrix_vector
+from pyxadd.build import Builder
+from pyxadd.diagram import Pool
+from pyxadd.disk_cache import DiskCache
+from pyxadd.evaluate import evaluate_arrays, ParallelEvaluator
+from pyxadd.flatten import flatten
+from pyxadd.expression_cache import ExpressionCache
+from pyxadd.ground import ground
+from pyxadd.interval import interval_index
+from pyxadd.matrix.matrix import assignments
+from pyxadd.region import region_index
+from pyxadd.stream import evaluate_file
+from pyxadd.timer import Timer
+from operations import build_matrices
+
+
+def build_product(pool, size=60, blocks=6):
+    """
+    Builds the product of two block matrices (see build_matrices), a diagram over the variables r and k
+    :param Pool pool: The pool to build the diagram in
+    :rtype: Diagram
+    """
+    matrix_a, matrix_b = build_matrices(pool, size=size, blocks=blocks)
+    return pool.diagram(matrix_vector.matrix_multiply(pool, matrix_a.root_id, matrix_b.root_id, ["c"]))
+
+
+def random_assignments(count, size=60):
+    return [{"r": random.randint(-2, size + 2), "k": random.randint(-2, size + 2)} for _ in range(count)]
+
+
+def run_compiled(count=20000, verbose=True):
+    """
+    Compares evaluating assignments one by one using Diagram.evaluate and the compiled diagram (Diagram.compile)
+    :return Tuple[float, float, float]: The time for Diagram.evaluate, compilation and the compiled function
+    """
+    diagram = build_product(Pool())
+    assignments = random_assignments(count)
+    timer = Timer(verbose=verbose)
+
+    timer.start("Diagram.evaluate ({} assignments)".format(count))
+    expected = [diagram.evaluate(assignment) for assignment in assignments]
+    time_evaluate = timer.stop()
+
+    timer.start("Compiling")
+    f = diagram.compile()
+    time_compile = timer.stop()
+
+    timer.start("Compiled function ({} assignments)".format(count))
+    results = [f(*[assignment[var] for var in f.variables]) for assignment in assignments]
+    time_compiled = timer.stop()
+
+    assert all(abs(a - b) < 10 ** -8 for a, b in zip(expected, results))
+    if verbose:
+        print("Speedup: {:.1f}x".format(time_evaluate / max(time_compiled, 10 ** -6)))
+    return time_evaluate, time_compile, time_compiled
+
+
+def run_flat(count=1000000, verbose=True):
+    """
+    Compares batch evaluation using evaluate_arrays (routing index arrays through the diagram) and a flattened diagram
+    (visiting every internal node once with all points that reach it)
+    :return Tuple[float, float, float]: The time for evaluate_arrays, flattening and evaluating the flat diagram
+    """
+    diagram = build_product(Pool())
+    columns = {"r": numpy.random.randint(-2, 63, count), "k": numpy.random.randint(-2, 63, count)}
+    timer = Timer(verbose=verbose)
+
+    timer.start("evaluate_arrays ({} points)".format(count))
+    expected = evaluate_arrays(diagram, columns)
+    time_arrays = timer.stop()
+
+    timer.start("Flattening")
+    flat = flatten(diagram)
+    time_flatten = timer.stop()
+
+    timer.start("Flat diagram ({} points)".format(count))
+    results = flat.evaluate(columns)
+    time_flat = timer.stop()
+
+    assert numpy.allclose(expected, results)
+    return time_arrays, time_flatten, time_flat
+
+
+def run_ground(size=240, verbose=True):
+    """
+    Compares grounding a matrix cell by cell (using Diagram.evaluate) with region-based grounding
+    :return Tuple[float, float]: The time for cell by cell and region-based grounding
+    """
+    diagram = build_product(Pool(), size=size, blocks=6)
+    bounds = [("r", 0, size - 1), ("k", 0, size - 1)]
+    timer = Timer(verbose=verbose)
+
+    timer.start("Grounding {0}x{0} cell by cell".format(size))
+    expected = numpy.array([[diagram.evaluate(assignment) for assignment in assignments(bounds[1:], {"r": r})]
+                            for r in range(size)])
+    time_cells = timer.stop()
+
+    timer.start("Grounding {0}x{0} by regions".format(size))
+    tensor = ground(diagram, bounds)
+    time_regions = timer.stop()
+
+    assert numpy.allclose(expected, tensor)
+    return time_cells, time_regions
+
+
+def run_disk_cache(size=120, verbose=True):
+    """
+    Compares compiling a diagram (and its terminals) in a process with an empty disk cache to a process that finds the
+    generated code in the disk cache
+    :return Tuple[float, float]: The time with an empty and with a filled disk cache
+    """
+    directory = tempfile.mkdtemp()
+    timer = Timer(verbose=verbose)
+    times = []
+    try:
+        for label in ("empty", "filled"):
+            pool = Pool(expression_cache=ExpressionCache(disk_cache=DiskCache(directory)))
+            diagram = build_product(pool, size=size)
+            timer.start("Compiling diagram and terminals ({} disk cache)".format(label))
+            diagram.compile()
+            pool.expression_cache.warm_up(diagram)
+            times.append(timer.stop())
+    finally:
+        shutil.rmtree(directory)
+    return tuple(times)
+
+
+def build_vector(pool, pieces=200, width=10):
+    """
+    Builds a piecewise constant vector over the variable r with the given number of pieces
+    :param Pool pool: The pool to build the diagram in
+    :rtype: Diagram
+    """
+    b = Builder(pool)
+    b.ints("r")
+    # The pieces are chained from the last to the first one (r < 0 leads to 0)
+    vector = b.exp(0)
+    for i in reversed(range(pieces)):
+        vector = b.ite(b.test("r", "<=", (i + 1) * width - 1), b.exp(random.random()), vector)
+    vector = b.ite(b.test("r", "<=", -1), b.exp(0), vector)
+    return vector
+
+
+def run_intervals(count=1000000, verbose=True):
+    """
+    Compares evaluating a univariate diagram using evaluate_arrays and an interval index (binary search)
+    :return Tuple[float, float, float]: The time for evaluate_arrays, building the index and evaluating the index
+    """
+    pieces, width = 200, 10
+    diagram = build_vector(Pool(), pieces=pieces, width=width)
+    values = numpy.random.randint(-5, pieces * width + 5, size=count)
+    timer = Timer(verbose=verbose)
+
+    timer.start("evaluate_arrays ({} points)".format(count))
+    expected = evaluate_arrays(diagram, {"r": values})
+    time_arrays = timer.stop()
+
+    timer.start("Building interval index")
+    index = interval_index(diagram)
+    time_build = timer.stop()
+
+    timer.start("Interval index ({} points)".format(count))
+    results = index.evaluate(values)
+    time_index = timer.stop()
+
+    assert numpy.allclose(expected, results)
+    return time_arrays, time_build, time_index
+
+
+def run_regions(count=1000000, size=240, verbose=True):
+    """
+    Compares batch evaluation using evaluate_arrays and a region index (kd-tree over the boxes of the diagram)
+    :return Tuple[float, float, float]: The time for evaluate_arrays, building the index and evaluating the index
+    """
+    diagram = build_product(Pool(), size=size, blocks=6)
+    columns = {var: numpy.random.randint(-2, size + 2, size=count) for var in ("r", "k")}
+    timer = Timer(verbose=verbose)
+
+    timer.start("evaluate_arrays ({} points)".format(count))
+    expected = evaluate_arrays(diagram, columns)
+    time_arrays = timer.stop()
+
+    timer.start("Building region index")
+    index = region_index(diagram)
+    time_build = timer.stop()
+
+    timer.start("Region index ({} points, {} boxes)".format(count, len(index.leaves)))
+    results = index.evaluate(columns)
+    time_index = timer.stop()
+
+    assert numpy.allclose(expected, results)
+    return time_arrays, time_build, time_index
+
+
+def run_parallel(count=4000000, workers=None, verbose=True):
+    """
+    Compares batch evaluation in the current process to evaluation by worker processes
+    :return Tuple[float, float]: The time for a single process and the time for the workers (excluding startup)
+    """
+    workers = multiprocessing.cpu_count() if workers is None else workers
+    diagram = build_product(Pool())
+    columns = {var: numpy.random.randint(-2, 62, size=count) for var in ("r", "k")}
+    timer = Timer(verbose=verbose)
+
+    timer.start("evaluate_arrays ({} points)".format(count))
+    expected = evaluate_arrays(diagram, columns)
+    time_single = timer.stop()
+
+    evaluator = ParallelEvaluator(diagram, workers)
+    try:
+        timer.start("{} workers ({} points)".format(workers, count))
+        results = evaluator.evaluate(columns)
+        time_parallel = timer.stop()
+    finally:
+        evaluator.close()
+
+    assert numpy.allclose(expected, results)
+    return time_single, time_parallel
+
+
+def run_stream(count=10000000, chunk_size=100000, verbose=True):
+    """
+    Streams a memory-mapped input file through the diagram into an output file, the peak memory of the process
+    (maximum resident set size) is reported before and after streaming
+    :return Tuple[float, int, int]: The time and the peak memory (in kilobytes) before and after streaming
+    """
+    diagram = build_product(Pool())
+    directory = tempfile.mkdtemp()
+    timer = Timer(verbose=verbose)
+    try:
+        input_path = os.path.join(directory, "input.npy")
+        values = numpy.lib.format.open_memmap(input_path, mode="w+", dtype=[("r", int), ("k", int)], shape=(count,))
+        for start in range(0, count, chunk_size):
+            size = min(chunk_size, count - start)
+            for var in ("r", "k"):
+                values[var][start:start + size] = numpy.random.randint(-2, 62, size=size)
+        del values
+        memory_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        timer.start("Streaming {} rows in chunks of {}".format(count, chunk_size))
+        evaluate_file(diagram, input_path, os.path.join(directory, "output.npy"), chunk_size=chunk_size)
+        time_stream = timer.stop()
+        memory_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    finally:
+        shutil.rmtree(directory)
+    if verbose:
+        print("Peak memory: {} kB before streaming, {} kB after".format(memory_before, memory_after))
+    return time_stream, memory_before, memory_after
+
+
+if __name__ == "__main__":
+    run_compiled()
+    run_flat()
+    run_ground()
+    run_disk_cache()
+    run_intervals()
+    run_regions()
+    run_parallel()
+    run_stream()
@@ -0,0 +1,290 @@
+from __future__ import print_function
+
+import sys
+
+import sympy
+
+from pyxadd import leaf_transform, matrix_vector
+from pyxadd.build import Builder
+from pyxadd.diagram import Pool
+from pyxadd.operation import Summation, Multiplication, LogicalAnd, LogicalOr
+from pyxadd.test import LinearTest
+from pyxadd.timer import Timer
+
+
+def build_matrices(pool, size=12, blocks=3):
+    """
+    Builds two block matrices (over r, c and c, k) that share the summed out variable c
+    :param Pool pool: The pool to build the matrices in
+    :param int size: The number of rows / columns of the matrices
+    :param int blocks: The number of blocks per row / column
+    :return Tuple[Diagram, Diagram]: The two matrices
+    """
+    b = Builder(pool)
+    b.ints("r", "c", "k")
+    step = size // blocks
+
+    def block_matrix(row_var, col_var, offset):
+        result = b.terminal(0)
+        for i in range(blocks):
+            for j in range(blocks):
+                block = b.limit(row_var, i * step, (i + 1) * step - 1) & b.limit(col_var, j * step, (j + 1) * step - 1)
+                result += block * b.exp("{} + {}".format((i + j + offset) % 3 + 1, row_var))
+        return result
+
+    return block_matrix("r", "c", 0), block_matrix("c", "k", 1)
+
+
+def commutative_workload(pool):
+    """
+    Runs a matrix multiplication and a leaf transformation (using the test * x + ~test * y pattern)
+    :param Pool pool: The pool to run the workload in
+    """
+    matrix_a, matrix_b = build_matrices(pool)
+    product = matrix_vector.matrix_multiply(pool, matrix_a.root_id, matrix_b.root_id, ["c"])
+    leaf_transform.transform_leaves(lambda terminal, d: d.pool.terminal(terminal.expression * 2), pool.diagram(product))
+    return product
+
+
+def run_commutativity(verbose=True):
+    """
+    Compares apply cache statistics with and without commutative cache keys
+    :return Tuple[dict, dict]: The statistics without and with commutative cache keys
+    """
+    operations = [Summation, Multiplication, LogicalAnd, LogicalOr]
+    results = []
+    for commutative in (False, True):
+        previous = [operation.commutative for operation in operations]
+        for operation in operations:
+            operation.commutative = commutative
+        try:
+            timer = Timer(verbose=verbose)
+            timer.start("Running workload ({} cache keys)".format("commutative" if commutative else "ordered"))
+            pool = Pool()
+            commutative_workload(pool)
+            timer.stop()
+            results.append(pool.apply_cache.statistics())
+        finally:
+            for operation, value in zip(operations, previous):
+                operation.commutative = value
+    if verbose:
+        ordered, normalized = results
+        print("Ordered keys:     {hits} hits, {misses} misses, {entries} entries".format(**ordered))
+        print("Commutative keys: {hits} hits, {misses} misses, {entries} entries".format(**normalized))
+        print("Saved {} apply computations".format(ordered["misses"] - normalized["misses"]))
+    return tuple(results)
+
+
+def build_chain(pool, variables, lb, ub):
+    """
+    Builds a deep diagram that limits every variable to [lb, ub], like a chain of Builder.limit constraints
+    :param Pool pool: The pool to build the diagram in
+    :param List[str] variables: The variables (in order)
+    :return int: The root id
+    """
+    tests = []
+    for var in variables:
+        for test in (LinearTest(var, ">=", lb), LinearTest(var, "<=", ub)):
+            pool.bool_test(test)
+            tests.append(test)
+    node_id = pool.one_id
+    for test in reversed(tests):
+        node_id = pool.internal(test, node_id, pool.zero_id)
+    return node_id
+
+
+def recursive_apply(pool, operation, root1, root2, cache):
+    """
+    Reference recursive implementation of apply
+    """
+    if operation.commutative and root1 > root2:
+        root1, root2 = root2, root1
+    key = (operation, root1, root2)
+    if key in cache:
+        return cache[key]
+    node1, node2 = pool.get_node(root1), pool.get_node(root2)
+    result = operation.compute_terminal(pool, node1, node2)
+    if result is None:
+        if not node1.is_terminal() and (node2.is_terminal() or pool.test_smaller_eq(node1.test, node2.test)):
+            test = node1.test
+        else:
+            test = node2.test
+        children1 = (node1.child_true, node1.child_false) if not node1.is_terminal() and node1.test == test \
+            else (root1, root1)
+        children2 = (node2.child_true, node2.child_false) if not node2.is_terminal() and node2.test == test \
+            else (root2, root2)
+        child_true = recursive_apply(pool, operation, children1[0], children2[0], cache)
+        child_false = recursive_apply(pool, operation, children1[1], children2[1], cache)
+        result = pool.internal(test, child_true, child_false)
+    cache[key] = result
+    return result
+
+
+def run_deep(depths=(100, 250, 1000, 4000), verbose=True):
+    """
+    Measures the throughput of apply (in apply steps per second) on deep diagrams for the iterative implementation and
+    a recursive reference implementation
+    :return List[Tuple[int, float, float|None]]: Tuples of depth, iterative throughput and recursive throughput (None
+        if the recursion limit was exceeded)
+    """
+    results = []
+    for depth in depths:
+        variables = ["x{}".format(i) for i in range(depth // 2)]
+
+        def setup():
+            pool = Pool()
+            pool.int_var(*variables)
+            return pool, build_chain(pool, variables, 0, 10), build_chain(pool, variables, 2, 8)
+
+        pool, root1, root2 = setup()
+        timer = Timer(verbose=verbose)
+        timer.start("Iterative apply (depth {})".format(depth))
+        pool.apply(Multiplication, root1, root2)
+        iterative_time = timer.stop()
+        steps = pool.apply_cache.misses
+        iterative = steps / max(iterative_time, 10 ** -6)
+
+        pool, root1, root2 = setup()
+        timer.start("Recursive apply (depth {})".format(depth))
+        try:
+            recursive_apply(pool, Multiplication, root1, root2, dict())
+            recursive = steps / max(timer.stop(), 10 ** -6)
+        except RuntimeError:
+            timer.stop()
+            recursive = None
+        results.append((depth, iterative, recursive))
+
+    if verbose:
+        for depth, iterative, recursive in results:
+            print("Depth {:>5}: iterative {:.0f} steps/s, recursive {}".format(
+                depth, iterative, "{:.0f} steps/s".format(recursive) if recursive is not None else
+                "exceeded recursion limit ({})".format(sys.getrecursionlimit())))
+    return results
+
+
+def run_summation(count=5000, verbose=True):
+    """
+    Compares substituting numeric bounds in the closed form of a sum symbolically and using the compiled closed form
+    of the summation cache
+    :return Tuple[float, float, dict]: The time for symbolic substitution, the time for the summation cache and the
+        statistics of the summation cache
+    """
+    pool = Pool()
+    pool.int_var("r")
+    node_id = pool.terminal("3*r**2/7 + 2*r + 1")
+    lb, ub = sympy.symbols("lb ub")
+    bounds = [(i, i + 9) for i in range(count)]
+    timer = Timer(verbose=verbose)
+
+    timer.start("Symbolic substitution ({} sums)".format(count))
+    result = sympy.Sum(pool.get_node(node_id).expression, (sympy.Symbol("r"), lb, ub)).doit()
+    expected = [float(result.subs({lb: i, ub: j})) for i, j in bounds]
+    time_symbolic = timer.stop()
+
+    timer.start("Summation cache ({} sums)".format(count))
+    cache = matrix_vector.SummationCache()
+    values = [cache.get(pool, ("r", node_id))(i, j) for i, j in bounds]
+    time_cache = timer.stop()
+
+    assert all(abs(a - b) <= 10 ** -9 * abs(a) for a, b in zip(expected, values))
+    statistics = cache.statistics()
+    if verbose:
+        print("Summation cache: {hits} hits, {misses} misses, {numeric_calls} numeric and {symbolic_calls} symbolic "
+              "evaluations".format(**statistics))
+    return time_symbolic, time_cache, statistics
+
+
+def run_fused_multiplication(size=60, blocks=6, verbose=True):
+    """
+    Compares multiplying two block matrices (see build_matrices) and summing out c in two steps (building the product)
+    and using the fused multiply-and-sum-out
+    :return Tuple[Tuple[float, int, int], Tuple[float, int, int]]: The time, the number of nodes created and the size
+        of the largest diagram (the product or the result) for the two-step and the fused version
+    """
+    results = []
+    for fused in (False, True):
+        pool = Pool()
+        matrix_a, matrix_b = build_matrices(pool, size, blocks)
+        nodes_before = len(pool._test_column)
+        timer = Timer(verbose=verbose)
+        timer.start("Multiplying {0}x{0} matrices ({1})".format(size, "fused" if fused else "two steps"))
+        if fused:
+            largest = 0
+            result = matrix_vector.multiply_sum_out(pool, matrix_a.root_id, matrix_b.root_id, ["c"])
+        else:
+            product = pool.apply(Multiplication, matrix_a.root_id, matrix_b.root_id)
+            largest = len(pool._mark([product]))
+            result = matrix_vector.sum_out(pool, product, ["c"])
+        elapsed = timer.stop()
+        largest = max(largest, len(pool._mark([result])))
+        results.append((elapsed, len(pool._test_column) - nodes_before, largest))
+        if verbose:
+            print("Created {} nodes, largest diagram: {} nodes".format(results[-1][1], largest))
+    return tuple(results)
+
+
+def run_sum_out_cache(size=60, blocks=6, repetitions=5, verbose=True):
+    """
+    Compares repeatedly projecting a block matrix (see build_matrices) and computing its norm (as iterative algorithms
+    do) with and without the pool-wide summation memo
+    :return Tuple[float, float]: The time without and with the memo
+    """
+    from pyxadd.matrix.matrix import Matrix
+
+    times = []
+    previous = matrix_vector.SumOutCache.enabled
+    try:
+        for enabled in (False, True):
+            matrix_vector.SumOutCache.enabled = enabled
+            pool = Pool()
+            matrix_a, _ = build_matrices(pool, size, blocks)
+            matrix = Matrix(matrix_a, [("r", 0, size - 1)], [("c", 0, size - 1)])
+            timer = Timer(verbose=verbose)
+            timer.start("{} projections and norms ({})".format(repetitions, "memo" if enabled else "no memo"))
+            for _ in range(repetitions):
+                matrix.project(True)
+                matrix.project(False)
+                matrix.norm()
+            times.append(timer.stop())
+            if verbose and enabled:
+                cache = pool.caches[matrix_vector.SumOutCache.name]
+                print("Sum out cache: {} hits".format(cache.hits))
+    finally:
+        matrix_vector.SumOutCache.enabled = previous
+    return tuple(times)
+
+
+def run_bound_selection(pieces=20, verbose=True):
+    """
+    Sums out x from a diagram with symbolic bounds on x above many leaves (pieces in w), every leaf selects the largest
+    lower and smallest upper bound among the same bounds and shares the bound selection template
+    :return Tuple[float, dict]: The time and the statistics (hits, misses) of the bound selection cache
+    """
+    pool = Pool()
+    b = Builder(pool)
+    b.ints("x", "y", "z", "w")
+    bounds = b.test("x", ">=", "y") & b.test("x", ">=", "2*z - 3") & b.test("x", ">=", 0) \
+        & b.test("x", "<=", "y + z") & b.test("x", "<=", 20) & b.test("x", "<=", "3*w")
+    leaves = b.exp(0)
+    for i in reversed(range(pieces)):
+        leaves = b.ite(b.test("w", "<=", i), b.exp("{}*x + w*x**2".format(i + 1)), leaves)
+    diagram = bounds * leaves
+
+    timer = Timer(verbose=verbose)
+    timer.start("Summing out x ({} pieces)".format(pieces))
+    matrix_vector.sum_out(pool, diagram.root_id, ["x"])
+    elapsed = timer.stop()
+    cache = pool.caches[matrix_vector.BoundSelectionCache.name]
+    statistics = {"hits": cache.hits, "misses": cache.misses}
+    if verbose:
+        print("Bound selection cache: {hits} hits, {misses} misses".format(**statistics))
+    return elapsed, statistics
+
+
+if __name__ == "__main__":
+    run_commutativity()
+    run_deep()
+    run_summation()
+    run_fused_multiplication()
+    run_sum_out_cache()
+    run_bound_selection()
@@ -0,0 +1,401 @@
+"""
+Apply caches memoize the results of Pool.apply.  Since pools are hash-consed, evicting an entry never changes results,
+a recomputation simply finds the same nodes again.
+"""
+
+import sys
+from collections import OrderedDict
+
+# Rough per-entry overhead of the dictionary slot (hash, key pointer, value pointer) and bookkeeping
+_ENTRY_OVERHEAD = 4 * 8
+
+
+def entry_size(key, value):
+    """
+    Estimates the number of bytes used by a cache entry
+    :param tuple key: The cache key
+    :param value: The cached value
+    :rtype: int
+    """
+    return sys.getsizeof(key) + sys.getsizeof(value) + _ENTRY_OVERHEAD
+
+
+class ApplyCache(object):
+    def __init__(self, max_entries=None, max_bytes=None):
+        """
+        :param int|None max_entries: The maximal number of entries (None for no limit)
+        :param int|None max_bytes: The maximal (estimated) number of bytes used by the entries (None for no limit)
+        """
+        if max_entries is not None and max_entries < 1:
+            raise RuntimeError("The maximal number of entries has to be positive, was {}".format(max_entries))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # The size of the entries is only tracked while storing if it is limited, otherwise computed on demand
+        self._bytes = 0
+
+    @property
+    def bytes(self):
+        """
+        :return int: The estimated number of bytes used by the entries
+        """
+        if self.max_bytes is not None:
+            return self._bytes
+        return sum(entry_size(key, value) for key, value in self.items())
+
+    def lookup(self, key):
+        """
+        :param tuple key: The key to lookup
+        :return: The cached value or None if the key is not cached
+        """
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def store(self, key, value):
+        """
+        Stores the value for the given key, evicting entries if the cache grows beyond its limits
+        :param tuple key: The key
+        :param value: The value (may not be None)
+        """
+        if self._put(key, value) and self.max_bytes is not None:
+            self._bytes += entry_size(key, value)
+        while len(self) > 0 and self._exceeds_limits():
+            evicted_key, evicted_value = self._evict()
+            if self.max_bytes is not None:
+                self._bytes -= entry_size(evicted_key, evicted_value)
+            self.evictions += 1
+
+    def retain(self, predicate):
+        """
+        Removes all entries for which the given predicate does not hold (counters are not affected)
+        :param callable predicate: The predicate [(key, value) -> bool]
+        :return int: The estimated number of bytes that were released
+        """
+        released = 0
+        for key, value in list(self.items()):
+            if not predicate(key, value):
+                self._remove(key)
+                released += entry_size(key, value)
+        if self.max_bytes is not None:
+            self._bytes -= released
+        return released
+
+    def remap(self, mapping):
+        """
+        Renumbers the node ids in all keys (except the leading operation) and values, entries that refer to a node
+        that is not mapped are removed (counters are not affected)
+        :param dict mapping: The mapping from old to new node ids
+        """
+        items = list(self.items())
+        self._clear()
+        self._bytes = 0
+        for key, value in items:
+            if value in mapping and all(node_id in mapping for node_id in key[1:]):
+                key = (key[0],) + tuple(mapping[node_id] for node_id in key[1:])
+                self._put(key, mapping[value])
+                if self.max_bytes is not None:
+                    self._bytes += entry_size(key, mapping[value])
+
+    def _exceeds_limits(self):
+        return (self.max_entries is not None and len(self) > self.max_entries) \
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+
+    def clear(self):
+        """
+        Removes all entries and resets the counters
+        """
+        self._clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+
+    def statistics(self):
+        """
+        :return dict: The hits, misses, evictions, number of entries and estimated size in bytes of this cache
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self),
+            "bytes": self.bytes,
+        }
+
+    def _get(self, key):
+        raise NotImplementedError()
+
+    def _put(self, key, value):
+        """
+        :return bool: True iff a new entry was added
+        """
+        raise NotImplementedError()
+
+    def _evict(self):
+        """
+        :return Tuple[tuple, object]: The evicted key and value
+        """
+        raise NotImplementedError()
+
+    def _clear(self):
+        raise NotImplementedError()
+
+    def _remove(self, key):
+        raise NotImplementedError()
+
+    def items(self):
+        """
+        :return: An iterable over the (key, value) pairs stored in this cache
+        """
+        raise NotImplementedError()
+
+    def __len__(self):
+        raise NotImplementedError()
+
+
+class UnboundedApplyCache(ApplyCache):
+    def __init__(self):
+        ApplyCache.__init__(self)
+        self._cache = dict()
+
+    def _get(self, key):
+        return self._cache.get(key, None)
+
+    def _put(self, key, value):
+        is_new = key not in self._cache
+        self._cache[key] = value
+        return is_new
+
+    def _evict(self):
+        return self._cache.popitem()
+
+    def _clear(self):
+        self._cache = dict()
+
+    def _remove(self, key):
+        del self._cache[key]
+
+    def items(self):
+        return self._cache.items()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+class LruApplyCache(ApplyCache):
+    def __init__(self, max_entries=None, max_bytes=None):
+        ApplyCache.__init__(self, max_entries, max_bytes)
+        self._cache = OrderedDict()
+
+    def _get(self, key):
+        value = self._cache.pop(key, None)
+        if value is not None:
+            self._cache[key] = value
+        return value
+
+    def _put(self, key, value):
+        is_new = key not in self._cache
+        if not is_new:
+            del self._cache[key]
+        self._cache[key] = value
+        return is_new
+
+    def _evict(self):
+        return self._cache.popitem(last=False)
+
+    def _clear(self):
+        self._cache = OrderedDict()
+
+    def _remove(self, key):
+        del self._cache[key]
+
+    def items(self):
+        return self._cache.items()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+class ClockApplyCache(ApplyCache):
+    """
+    Approximates LRU using the clock (second chance) algorithm, which avoids reordering entries on every hit
+    """
+    def __init__(self, max_entries=None, max_bytes=None):
+        ApplyCache.__init__(self, max_entries, max_bytes)
+        self._slots = dict()
+        self._keys = []
+        self._values = []
+        self._referenced = []
+        self._free = []
+        self._hand = 0
+
+    def _get(self, key):
+        slot = self._slots.get(key, None)
+        if slot is None:
+            return None
+        self._referenced[slot] = True
+        return self._values[slot]
+
+    def _put(self, key, value):
+        slot = self._slots.get(key, None)
+        if slot is not None:
+            self._values[slot] = value
+            self._referenced[slot] = True
+            return False
+        if len(self._free) > 0:
+            slot = self._free.pop()
+            self._keys[slot] = key
+            self._values[slot] = value
+            self._referenced[slot] = False
+        else:
+            slot = len(self._keys)
+            self._keys.append(key)
+            self._values.append(value)
+            self._referenced.append(False)
+        self._slots[key] = slot
+        return True
+
+    def _remove(self, key):
+        slot = self._slots.pop(key)
+        self._keys[slot] = None
+        self._values[slot] = None
+        self._free.append(slot)
+
+    def _evict(self):
+        while True:
+            if self._hand >= len(self._keys):
+                self._hand = 0
+            slot = self._hand
+            self._hand += 1
+            key = self._keys[slot]
+            if key is None:
+                continue
+            if self._referenced[slot]:
+                self._referenced[slot] = False
+            else:
+                value = self._values[slot]
+                self._remove(key)
+                return key, value
+
+    def items(self):
+        return ((key, self._values[slot]) for key, slot in self._slots.items())
+
+    def _clear(self):
+        self._slots = dict()
+        self._keys = []
+        self._values = []
+        self._referenced = []
+        self._free = []
+        self._hand = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+
+class PartitionedApplyCache(ApplyCache):
+    """
+    Keeps a separate cache per operation (the first element of the key), so that cheap operations cannot evict the
+    results of expensive ones
+    """
+    def __init__(self, factory):
+        """
+        :param callable factory: Creates a new (empty) cache for a partition [() -> ApplyCache]
+        """
+        # Counters are aggregated over the partitions, hence the base initializer is not used
+        self._factory = factory
+        self._partitions = dict()
+
+    def partition(self, operation):
+        """
+        :param operation: The operation
+        :return ApplyCache: The cache used for the given operation
+        """
+        if operation not in self._partitions:
+            self._partitions[operation] = self._factory()
+        return self._partitions[operation]
+
+    @property
+    def partitions(self):
+        return dict(self._partitions)
+
+    def lookup(self, key):
+        return self.partition(key[0]).lookup(key)
+
+    def store(self, key, value):
+        self.partition(key[0]).store(key, value)
+
+    def clear(self):
+        for cache in self._partitions.values():
+            cache.clear()
+
+    def retain(self, predicate):
+        return sum(cache.retain(predicate) for cache in self._partitions.values())
+
+    def remap(self, mapping):
+        for cache in self._partitions.values():
+            cache.remap(mapping)
+
+    def items(self):
+        for cache in self._partitions.values():
+            for item in cache.items():
+                yield item
+
+    def statistics(self):
+        total = {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "bytes": 0}
+        for cache in self._partitions.values():
+            for name, value in cache.statistics().items():
+                total[name] += value
+        return total
+
+    @property
+    def hits(self):
+        return sum(cache.hits for cache in self._partitions.values())
+
+    @property
+    def misses(self):
+        return sum(cache.misses for cache in self._partitions.values())
+
+    @property
+    def evictions(self):
+        return sum(cache.evictions for cache in self._partitions.values())
+
+    @property
+    def bytes(self):
+        return sum(cache.bytes for cache in self._partitions.values())
+
+    def __len__(self):
+        return sum(len(cache) for cache in self._partitions.values())
+
+
+def create(policy="unbounded", max_entries=None, max_bytes=None, partitioned=False):
+    """
+    Creates an apply cache
+    :param str policy: The eviction policy, either "unbounded", "lru" or "clock"
+    :param int|None max_entries: The maximal number of entries (per partition)
+    :param int|None max_bytes: The maximal estimated size in bytes (per partition)
+    :param bool partitioned: If true, the cache is split into one cache per operation
+    :rtype: ApplyCache
+    """
+    policies = {
+        "lru": LruApplyCache,
+        "clock": ClockApplyCache,
+    }
+    if policy == "unbounded":
+        if max_entries is not None or max_bytes is not None:
+            raise RuntimeError("An unbounded apply cache cannot have a limit, choose 'lru' or 'clock'")
+
+        def factory():
+            return UnboundedApplyCache()
+    elif policy in policies:
+        def factory():
+            return policies[policy](max_entries=max_entries, max_bytes=max_bytes)
+    else:
+        raise RuntimeError("Unknown apply cache policy {} (valid options are 'unbounded', 'lru' or 'clock')"
+                           .format(policy))
+    return PartitionedApplyCache(factory) if partitioned else factory()
@@ -65,4 +65,4 @@ class Builder(object):
             else_diagram = self.terminal(else_diagram)
         assert if_diagram.pool == then_diagram.pool == else_diagram.pool == self.pool
 
-        return if_diagram * then_diagram + (~if_diagram) * else_diagram
+        return Diagram(self.pool, self.pool.ite(if_diagram.root_id, then_diagram.root_id, else_diagram.root_id))
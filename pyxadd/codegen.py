@@ -0,0 +1,157 @@
+import __future__
+import json
+import math
+
+import sympy
+from sympy.printing.lambdarepr import lambdarepr
+from sympy.utilities.lambdify import MATH_TRANSLATIONS
+
+from pyxadd.diagram import DefaultCache
+from pyxadd.disk_cache import diagram_key
+from pyxadd.test import BinaryTest
+from pyxadd.walk import ParentsWalker
+
+# Nodes nested deeper than this are generated as separate functions (Python limits the indentation depth)
+MAX_DEPTH = 50
+
+# Python 2 does not support more arguments, larger diagrams receive the values as one tuple
+MAX_ARGUMENTS = 255
+
+
+def _namespace():
+    namespace = {name: getattr(math, name) for name in dir(math) if not name.startswith("_")}
+    for sympy_name, math_name in MATH_TRANSLATIONS.items():
+        namespace[sympy_name] = getattr(math, math_name)
+    namespace.update({"oo": float("inf"), "Abs": abs, "Max": max, "Min": min})
+    return namespace
+
+
+def _print_number(value):
+    value = float(value)
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def _print_test(test, arguments):
+    if isinstance(test, BinaryTest):
+        return arguments[test.var]
+    operator = test.operator
+    terms = []
+    for var in sorted(operator.lhs):
+        coefficient = operator.lhs[var]
+        if coefficient == 1:
+            term = arguments[var]
+        elif coefficient == -1:
+            term = "-{}".format(arguments[var])
+        else:
+            term = "{}*{}".format(_print_number(coefficient), arguments[var])
+        terms.append(term)
+    return "{} {} {}".format(" + ".join(terms), operator.symbol, _print_number(operator.rhs))
+
+
+def generate_source(diagram, name="evaluate"):
+    """
+    Generates the source code of a Python function that evaluates the given diagram.  The function takes the values of
+    the variables (see the returned variables) as positional arguments, tests are inlined as nested if statements and
+    leaves as return statements.  Nodes with multiple parents (and very deep nodes) are generated as separate
+    functions to keep the code linear in the size of the diagram.
+    :param Diagram diagram: The diagram
+    :param str name: The name of the generated function
+    :return Tuple[str, List[str]]: The source code and the variables (in the order of the arguments)
+    """
+    pool = diagram.pool
+    parents = ParentsWalker(diagram).walk()
+    variables = set()
+    for node_id in parents:
+        node = pool.get_node(node_id)
+        if node.is_terminal():
+            variables |= set(str(symbol) for symbol in node.expression.free_symbols)
+        else:
+            variables |= set(str(var) for var in node.test.variables)
+    variables = sorted(variables)
+    if len(variables) <= MAX_ARGUMENTS:
+        arguments = {var: "v{}".format(i) for i, var in enumerate(variables)}
+        signature = helper_signature = ", ".join(arguments[var] for var in variables)
+    else:
+        arguments = {var: "values[{}]".format(i) for i, var in enumerate(variables)}
+        signature, helper_signature = "*values", "values"
+    replacements = {sympy.Symbol(var): sympy.Symbol(argument) for var, argument in arguments.items()}
+
+    functions = [(name, diagram.root_id)]
+    generated = {diagram.root_id}
+    lines = []
+
+    def function_name(node_id):
+        return "_node{}".format(node_id)
+
+    def body(root_id):
+        # Explicit stack (long chains of false children would exceed the recursion limit), the true branch is emitted
+        # first since it is nested in the if statement
+        stack = [(root_id, 1, True)]
+        while len(stack) > 0:
+            node_id, depth, is_function = stack.pop()
+            indent = "    " * depth
+            if pool.is_terminal_id(node_id):
+                expression = pool.get_node(node_id).expression.xreplace(replacements)
+                lines.append("{}return {}".format(indent, lambdarepr(expression)))
+            elif not is_function and (len(parents[node_id]) > 1 or depth >= MAX_DEPTH):
+                if node_id not in generated:
+                    generated.add(node_id)
+                    functions.append((function_name(node_id), node_id))
+                lines.append("{}return {}({})".format(indent, function_name(node_id), helper_signature))
+            else:
+                child_true, child_false = pool.node_children(node_id)
+                test = pool.get_test(pool.node_test_id(node_id))
+                lines.append("{}if {}:".format(indent, _print_test(test, arguments)))
+                stack.append((child_false, depth, False))
+                stack.append((child_true, depth + 1, False))
+
+    while len(functions) > 0:
+        function, node_id = functions.pop()
+        lines.append("def {}({}):".format(function, signature if function == name else helper_signature))
+        body(node_id)
+        lines.append("")
+    return "\n".join(lines), variables
+
+
+def compile_diagram(diagram, disk_cache=None):
+    """
+    Compiles the given diagram into a Python function (see generate_source), the variables are stored in the
+    attribute "variables" of the function and the source code in the attribute "source"
+    :param Diagram diagram: The diagram
+    :param DiskCache|None disk_cache: An optional disk cache, the generated source code is looked up (or stored) using
+        the structural hash of the diagram
+    :rtype: callable
+    """
+    if disk_cache is None:
+        source, variables = generate_source(diagram)
+    else:
+        key = diagram_key(diagram)
+        entry = disk_cache.get(key)
+        if entry is None:
+            source, variables = generate_source(diagram)
+            disk_cache.put(key, json.dumps({"variables": variables, "source": source}))
+        else:
+            entry = json.loads(entry)
+            source, variables = str(entry["source"]), [str(var) for var in entry["variables"]]
+    namespace = _namespace()
+    code = compile(source, "<diagram {}>".format(diagram.root_id), "exec", __future__.division.compiler_flag, True)
+    exec(code, namespace)
+    f = namespace["evaluate"]
+    f.variables = variables
+    f.source = source
+    return f
+
+
+def get_compiled(diagram):
+    """
+    Returns the compiled function of the given diagram, compiled functions are cached per root node in the pool and
+    on disk if the expression cache of the pool has a disk cache
+    :param Diagram diagram: The diagram
+    :rtype: callable
+    """
+    pool = diagram.pool
+    if not pool.has_cache("compiled"):
+        def calculator(p, node_id):
+            return compile_diagram(p.diagram(node_id), p.expression_cache.disk_cache)
+        pool.add_cache("compiled", DefaultCache(calculator))
+    return pool.get_cached("compiled", diagram.root_id)
@@ -1,15 +1,28 @@
 from __future__ import print_function
 
+import array
 import re
+import sys
 import warnings
+import weakref
 
 import graphviz
 import sympy
 
+from pyxadd.apply_cache import ApplyCache, UnboundedApplyCache
+from pyxadd.expression_cache import ExpressionCache
 from pyxadd.operation import Summation, Multiplication, LogicalOr, LogicalAnd
 from pyxadd.test import LinearTest, Test
 
 
+# Markers used in the test id column of the node table
+_TERMINAL = -1
+_EMPTY = -2
+
+# Apply cache key tag of if-then-else
+ITE = "ite"
+
+
 def check_node_id(node_id, name="Node id"):
     if not isinstance(node_id, int):
         raise RuntimeError("{} must be integer, was {} of type {}".format(name, node_id, type(node_id)))
@@ -17,25 +30,52 @@ def check_node_id(node_id, name="Node id"):
 
 
 class Node:
-    def __init__(self, node_id):
+    def __init__(self, node_id, pool=None):
+        """
+        :param int node_id: The node id
+        :param Pool|None pool: The pool the node belongs to (nodes of different pools are never equal)
+        """
         self._node_id = node_id
+        self._pool = pool
 
     @property
     def node_id(self):
         return self._node_id
 
+    @property
+    def pool(self):
+        return self._pool
+
     def is_terminal(self):
         raise NotImplementedError()
 
+    def __eq__(self, other):
+        return isinstance(other, Node) and self.node_id == other.node_id and self.pool is other.pool
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.node_id, id(self.pool)))
+
 
 class TerminalNode(Node):
-    def __init__(self, node_id, expression):
-        Node.__init__(self, node_id)
+    def __init__(self, node_id, expression, expression_cache=None, pool=None):
+        """
+        :param int node_id: The node id
+        :param sympy.Basic|str expression: The expression
+        :param ExpressionCache|None expression_cache: The cache used to compile the expression (if None, the expression
+            is lambdified separately)
+        :param Pool|None pool: The pool the node belongs to
+        """
+        Node.__init__(self, node_id, pool)
         if type(expression) == str:
             expression = sympy.sympify(expression)
         self._expression = expression
-        self._symbols = tuple(expression.free_symbols)
+        self._symbols = tuple(sorted(expression.free_symbols, key=str))
+        self._expression_cache = expression_cache
         self._f = None
+        self._numpy_f = None
 
     @property
     def expression(self):
@@ -43,9 +83,23 @@ class TerminalNode(Node):
 
     def _get_f(self):
         if self._f is None:
-            self._f = sympy.lambdify(self._symbols, self._expression)
+            if self._expression_cache is None:
+                self._f = sympy.lambdify(self._symbols, self._expression)
+            else:
+                self._f = self._expression_cache.get(self._expression)
         return self._f
 
+    def numpy_function(self, expression_cache):
+        """
+        Returns a vectorized function of the expression, it takes the values of the variables of the expression
+        (ordered by name) as arguments
+        :param ExpressionCache expression_cache: The cache used to compile the function (using the NumPy backend)
+        :rtype: callable
+        """
+        if self._numpy_f is None:
+            self._numpy_f = expression_cache.get(self._expression)
+        return self._numpy_f
+
     def evaluate(self, assignment):
         try:
             return self._get_f()(*[assignment[str(v)] for v in self._symbols])
@@ -65,8 +119,8 @@ class TerminalNode(Node):
 
 
 class InternalNode(Node):
-    def __init__(self, node_id, test, child_true, child_false):
-        Node.__init__(self, node_id)
+    def __init__(self, node_id, test, child_true, child_false, pool=None):
+        Node.__init__(self, node_id, pool)
         self._test = test
         check_node_id(child_true, "Child (true)")
         self._child_true = child_true
@@ -125,6 +179,14 @@ class DefaultCache(object):
         """
         return key in self._cache
 
+    def store(self, key, value):
+        """
+        Stores a value that was computed outside of the cache (e.g. as a by-product of another computation)
+        :param key: The key
+        :param value: The value for the given key
+        """
+        self._cache[key] = value
+
     def clear(self):
         """
         Clears the cache
@@ -133,6 +195,44 @@ class DefaultCache(object):
         self.hits = 0
         self.misses = 0
 
+    def retain(self, predicate):
+        """
+        Removes all entries for which the given predicate does not hold
+        :param callable predicate: The predicate [(key, value) -> bool]
+        :return int: The number of removed entries
+        """
+        removed = [key for key, value in self._cache.items() if not predicate(key, value)]
+        for key in removed:
+            del self._cache[key]
+        return len(removed)
+
+    def node_references(self, key, value):
+        """
+        Returns the node ids an entry refers to, the entry is removed when one of them is collected (see Pool.collect).
+        By default node ids are found in the key and value by node_references, caches that store other integers should
+        override this method.
+        :param key: The key
+        :param value: The value for the given key
+        :rtype: List[int]
+        """
+        return node_references(key) + node_references(value)
+
+
+def node_references(obj):
+    """
+    Finds the node ids referenced by a cache key or value: integers, diagrams and tuples of those
+    :rtype: List[int]
+    """
+    if isinstance(obj, bool):
+        return []
+    elif isinstance(obj, (int, long)):
+        return [obj]
+    elif isinstance(obj, Diagram):
+        return [obj.root_id]
+    elif isinstance(obj, tuple):
+        return [node_id for element in obj for node_id in node_references(element)]
+    return []
+
 
 class Ordering(object):
     def test_smaller_eq(self, test_id1, test1, test_id2, test2):
@@ -140,15 +240,31 @@ class Ordering(object):
 
 
 class Pool:
-    def __init__(self, empty=False, ordering=None):
+    def __init__(self, empty=False, ordering=None, apply_cache=None, expression_cache=None):
+        """
+        :param bool empty: If true, the default terminals (0, 1, oo and -oo) are not created
+        :param Ordering|None ordering: An optional custom test ordering
+        :param ApplyCache|None apply_cache: The cache used to memoize apply (default: unbounded cache)
+        :param ExpressionCache|None expression_cache: The cache used to compile terminal expressions (default: a new
+            cache using the default backend)
+        """
         self._counter = 1
-        self._nodes = dict()
+        # Node table (struct-of-arrays indexed by node id), terminal nodes are stored in a side table
+        self._test_column = array.array("l", [_EMPTY])
+        self._true_column = array.array("l", [0])
+        self._false_column = array.array("l", [0])
+        self._terminals = dict()
         self._internal_map = dict()
         self._expressions = dict()
         self._tests = dict()
+        self._test_list = []
+        self._roots = dict()
+        self._handles = weakref.WeakSet()
         self.vars = dict()
         self.caches = dict()
-        self._apply_cache = dict()
+        self._apply_cache = UnboundedApplyCache() if apply_cache is None else apply_cache
+        self._expression_cache = ExpressionCache() if expression_cache is None else expression_cache
+        self._numpy_expression_cache = None
         self._ordering = ordering
         if not empty:
             self.zero_id = self.terminal(0)
@@ -158,6 +274,209 @@ class Pool:
 
         self.add_cache("diagram", DefaultCache(lambda pool, node_id: Diagram(pool, pool.get_node(node_id))))
 
+    @property
+    def apply_cache(self):
+        """
+        Returns the cache used to memoize apply, its counters (hits, misses and evictions) can be inspected
+        :rtype: ApplyCache
+        """
+        return self._apply_cache
+
+    def set_apply_cache(self, apply_cache):
+        """
+        Replaces the apply cache (the entries of the previous cache are discarded)
+        :param ApplyCache apply_cache: The new apply cache
+        """
+        assert isinstance(apply_cache, ApplyCache)
+        self._apply_cache = apply_cache
+
+    @property
+    def expression_cache(self):
+        """
+        Returns the cache used to compile terminal expressions
+        :rtype: ExpressionCache
+        """
+        return self._expression_cache
+
+    def set_expression_cache(self, expression_cache):
+        """
+        Replaces the expression cache, all terminals will be compiled again using the new cache (e.g. to switch to the
+        NumPy backend)
+        :param ExpressionCache expression_cache: The new expression cache
+        """
+        assert isinstance(expression_cache, ExpressionCache)
+        self._expression_cache = expression_cache
+        self._numpy_expression_cache = None
+        for terminal_node in self._terminals.values():
+            terminal_node._expression_cache = expression_cache
+            terminal_node._f = None
+            terminal_node._numpy_f = None
+
+    @property
+    def numpy_expression_cache(self):
+        """
+        Returns the cache used to compile vectorized functions of terminal expressions (see
+        evaluate.get_numpy_function): the expression cache if it uses the NumPy backend, otherwise a cache using the
+        NumPy backend (and the same disk cache)
+        :rtype: ExpressionCache
+        """
+        if self._expression_cache.backend == "numpy":
+            return self._expression_cache
+        if self._numpy_expression_cache is None:
+            self._numpy_expression_cache = ExpressionCache("numpy", self._expression_cache.disk_cache)
+        return self._numpy_expression_cache
+
+    def add_root(self, node_id):
+        """
+        Registers the given node as a root, protecting it (and its descendants) from garbage collection.  Roots are
+        counted, every call should be matched by a call to remove_root.
+        :param int node_id: The node id
+        """
+        check_node_id(node_id)
+        self._roots[node_id] = self._roots.get(node_id, 0) + 1
+
+    def remove_root(self, node_id):
+        """
+        Unregisters the given root node
+        :param int node_id: The node id
+        """
+        count = self._roots.get(node_id, 0)
+        if count == 0:
+            raise RuntimeError("Node {} is not registered as root".format(node_id))
+        elif count == 1:
+            del self._roots[node_id]
+        else:
+            self._roots[node_id] = count - 1
+
+    def _register_handle(self, diagram):
+        self._handles.add(diagram)
+
+    def _constant_ids(self):
+        names = ("zero_id", "one_id", "pos_inf_id", "neg_inf_id")
+        return [getattr(self, name) for name in names if hasattr(self, name)]
+
+    def _mark(self, roots):
+        marked = set()
+        stack = list(roots)
+        while len(stack) > 0:
+            node_id = stack.pop()
+            if node_id in marked:
+                continue
+            marked.add(node_id)
+            if self._test_column[node_id] >= 0:
+                stack.append(self._true_column[node_id])
+                stack.append(self._false_column[node_id])
+        return marked
+
+    def _live_roots(self, roots):
+        # The diagram cache would keep every diagram alive, it is cleared so that only handles held elsewhere survive
+        self.caches["diagram"].clear()
+        live = set(self._constant_ids()) | set(self._roots) | set(roots)
+        live |= set(diagram.root_id for diagram in list(self._handles))
+        return live
+
+    def collect(self, roots=()):
+        """
+        Removes all nodes that are not reachable from a root and drops every cache entry that refers to them.  Roots
+        are the registered roots (see add_root), the roots of all Diagram objects that are still referenced, the given
+        roots and the constant terminals.  Node ids of collected nodes are never reused.
+        :param iterable roots: Additional root ids to keep
+        :return dict: The number of collected nodes ("nodes"), removed cache entries ("cache_entries") and an estimate
+            of the reclaimed memory in bytes ("bytes", counting map entries, terminals and apply cache entries only: the
+            node table columns keep their size, their memory is only released by compact)
+        """
+        marked = self._mark(self._live_roots(roots))
+
+        collected = 0
+        reclaimed = 0
+        for node_id in range(1, len(self._test_column)):
+            test_id = self._test_column[node_id]
+            if test_id == _EMPTY or node_id in marked:
+                continue
+            if test_id == _TERMINAL:
+                terminal = self._terminals.pop(node_id)
+                del self._expressions[terminal.expression]
+                reclaimed += sys.getsizeof(terminal) + sys.getsizeof(terminal.expression)
+            else:
+                key = (test_id, self._true_column[node_id], self._false_column[node_id])
+                del self._internal_map[key]
+                reclaimed += sys.getsizeof(key)
+            self._test_column[node_id] = _EMPTY
+            self._true_column[node_id] = 0
+            self._false_column[node_id] = 0
+            collected += 1
+
+        entries = len(self._apply_cache)
+        reclaimed += self._apply_cache.retain(lambda key, value: all(n in marked for n in key[1:]) and value in marked)
+        entries -= len(self._apply_cache)
+        for cache in self.caches.values():
+            entries += cache.retain(lambda key, value: all(n in marked for n in cache.node_references(key, value)))
+        return {"nodes": collected, "cache_entries": entries, "bytes": reclaimed}
+
+    def compact(self, roots=()):
+        """
+        Collects all unreachable nodes (see collect) and renumbers the remaining nodes densely.  Since children are
+        always created before their parents, the new ids preserve the (topological) creation order and the constant
+        terminals keep the smallest ids.  The test table is compacted as well, unused tests are dropped and the
+        remaining tests keep their relative order.  Diagram objects and registered roots are updated, the apply
+        cache is renumbered and all other caches are cleared.
+        :param iterable roots: Additional root ids to keep
+        :return dict: The mapping from old to new node ids, to be used for any other root ids held by the caller
+        """
+        roots = list(roots)
+        self.collect(roots)
+        handles = [(diagram, diagram.root_id) for diagram in list(self._handles)]
+        mapping = dict()
+        for node_id in range(1, len(self._test_column)):
+            if self._test_column[node_id] != _EMPTY:
+                mapping[node_id] = len(mapping) + 1
+
+        test_mapping = dict()
+        for test_id in sorted(set(test_id for test_id in self._test_column if test_id >= 0)):
+            test_mapping[test_id] = len(test_mapping)
+        self._test_list = [self._test_list[test_id] for test_id in sorted(test_mapping)]
+        self._tests = {test: test_id for test_id, test in enumerate(self._test_list)}
+
+        test_column = array.array("l", [_EMPTY])
+        true_column = array.array("l", [0])
+        false_column = array.array("l", [0])
+        terminals = dict()
+        self._internal_map = dict()
+        for node_id in sorted(mapping):
+            test_id = self._test_column[node_id]
+            new_id = mapping[node_id]
+            if test_id == _TERMINAL:
+                terminal = self._terminals[node_id]
+                terminal._node_id = new_id
+                terminals[new_id] = terminal
+                self._expressions[terminal.expression] = new_id
+                test_column.append(_TERMINAL)
+                true_column.append(0)
+                false_column.append(0)
+            else:
+                key = (test_mapping[test_id], mapping[self._true_column[node_id]], mapping[self._false_column[node_id]])
+                self._internal_map[key] = new_id
+                test_column.append(key[0])
+                true_column.append(key[1])
+                false_column.append(key[2])
+        self._test_column = test_column
+        self._true_column = true_column
+        self._false_column = false_column
+        self._terminals = terminals
+        self._counter = len(mapping) + 1
+
+        for name in ("zero_id", "one_id", "pos_inf_id", "neg_inf_id"):
+            if hasattr(self, name):
+                setattr(self, name, mapping[getattr(self, name)])
+        self._roots = {mapping[node_id]: count for node_id, count in self._roots.items()}
+        for diagram, root_id in handles:
+            diagram._root_node = self.get_node(mapping[root_id])
+            diagram._profile = None
+        self._apply_cache.remap(mapping)
+        for cache in self.caches.values():
+            cache.clear()
+        return mapping
+
     def has_cache(self, name):
         return name in self.caches
 
@@ -183,20 +502,58 @@ class Pool:
 
     def _add_test(self, test):
         if test not in self._tests:
-            self._tests[test] = len(self._tests)
+            self._tests[test] = len(self._test_list)
+            self._test_list.append(test)
         return self._tests[test]
 
+    def get_test(self, test_id):
+        """
+        Returns the test associated with the given test id
+        :param int test_id: The test id
+        :rtype: Test
+        """
+        return self._test_list[test_id]
+
     def get_node(self, node_id):
         """
-        Returns the node object associated with the given node_id
+        Returns the node object associated with the given node_id.  Internal nodes are created on demand as views on
+        the node table.
         :param int node_id: The node id
         :return: Node The node object
         """
         check_node_id(node_id)
-        if node_id in self._nodes:
-            return self._nodes.get(node_id)
-        else:
-            raise RuntimeError("No node in pool with id {}.".format(node_id))
+        if 0 < node_id < len(self._test_column):
+            test_id = self._test_column[node_id]
+            if test_id >= 0:
+                return InternalNode(node_id, self._test_list[test_id], self._true_column[node_id],
+                                    self._false_column[node_id], self)
+            elif test_id == _TERMINAL:
+                return self._terminals[node_id]
+        raise RuntimeError("No node in pool with id {}.".format(node_id))
+
+    def is_terminal_id(self, node_id):
+        """
+        Checks whether the given node id refers to a terminal node, without constructing a node object
+        :param int node_id: The node id
+        :rtype: bool
+        """
+        return self._test_column[node_id] == _TERMINAL
+
+    def node_test_id(self, node_id):
+        """
+        Returns the test id of the given internal node (or a negative value for terminal nodes)
+        :param int node_id: The node id
+        :rtype: int
+        """
+        return self._test_column[node_id]
+
+    def node_children(self, node_id):
+        """
+        Returns the ids of the true and false child of the given internal node
+        :param int node_id: The node id
+        :rtype: Tuple[int, int]
+        """
+        return self._true_column[node_id], self._false_column[node_id]
 
     def int_var(self, *args):
         self._set_var_type("int", args)
@@ -241,7 +598,8 @@ class Pool:
                     raise RuntimeError("Variable {} not declared".format(var))
                 else:
                     self.add_var(var, v_type)
-        node_id = self._register(lambda n_id: TerminalNode(n_id, expression))
+        node_id = self._register(_TERMINAL, 0, 0)
+        self._terminals[node_id] = TerminalNode(node_id, expression, self._expression_cache, self)
         self._expressions[expression] = node_id
         return node_id
 
@@ -277,7 +635,24 @@ class Pool:
                 else:
                     self.add_var(var, v_type)
         if node_id is None:
-            node_id = self._register(lambda n_id: InternalNode(n_id, test, child_true, child_false))
+            node_id = self._register(test_id, child_true, child_false)
+            self._internal_map[key] = node_id
+        return node_id
+
+    def _internal_by_test_id(self, test_id, child_true, child_false):
+        """
+        Fast variant of internal for tests that are already canonical and stored in this pool
+        :type test_id: int
+        :type child_true: int
+        :type child_false: int
+        :rtype: int
+        """
+        if child_true == child_false:
+            return child_true
+        key = (test_id, child_true, child_false)
+        node_id = self._internal_map.get(key, None)
+        if node_id is None:
+            node_id = self._register(test_id, child_true, child_false)
             self._internal_map[key] = node_id
         return node_id
 
@@ -290,10 +665,12 @@ class Pool:
         """
         return self.internal(test, self.one_id, self.zero_id, v_type=v_type)
 
-    def _register(self, constructor):
+    def _register(self, test_id, child_true, child_false):
         node_id = self._counter
         self._counter += 1
-        self._nodes[node_id] = constructor(node_id)
+        self._test_column.append(test_id)
+        self._true_column.append(child_true)
+        self._false_column.append(child_false)
         return node_id
 
     def apply(self, operation, root1, root2):
@@ -303,53 +680,134 @@ class Pool:
         :type root2: int
         :rtype: int
         """
+        return self._run(lambda operands: self._apply_step(operation, operands[0], operands[1]), (root1, root2))
+
+    def _apply_step(self, operation, root1, root2):
+        """
+        Performs one step of apply: either computes the result directly (cached or terminal) or returns a frame that
+        describes the sub-problems for the true and false branch of the minimal test
+        :return Tuple[int|None, list|None]: The result or None and a frame or None
+        """
+        if operation.commutative and root1 > root2:
+            root1, root2 = root2, root1
         key = (operation, root1, root2)
-        if key in self._apply_cache:
-            return self._apply_cache[key]
-
-        node1 = self.get_node(root1)
-        node2 = self.get_node(root2)
-
-        result = operation.compute_terminal(self, node1, node2)
-
-        if result is None:
-            # Find minimal node (or only internal node)
-            if isinstance(node1, InternalNode):
-                if isinstance(node2, InternalNode):
-                    if self.test_smaller_eq(node1.test, node2.test):
-                        selected_test = node1.test
-                    else:
-                        selected_test = node2.test
-                else:
-                    selected_test = node1.test
-            else:
-                selected_test = node2.test
+        result = self._apply_cache.lookup(key)
+        if result is not None:
+            return result, None
+
+        result = operation.compute_terminal(self, self.get_node(root1), self.get_node(root2))
+        if result is not None:
+            self._apply_cache.store(key, result)
+            return result, None
+
+        # Find minimal test (or only internal node)
+        test_id1 = self._test_column[root1]
+        test_id2 = self._test_column[root2]
+        if test_id1 >= 0 and (test_id2 < 0 or self._test_id_smaller_eq(test_id1, test_id2)):
+            selected_test_id = test_id1
+        else:
+            selected_test_id = test_id2
 
-            if isinstance(node1, InternalNode) and node1.test == selected_test:
-                children1 = (node1.child_true, node1.child_false)
-            else:
-                children1 = (node1.node_id, node1.node_id)
+        if test_id1 == selected_test_id:
+            children1 = (self._true_column[root1], self._false_column[root1])
+        else:
+            children1 = (root1, root1)
 
-            if isinstance(node2, InternalNode) and node2.test == selected_test:
-                children2 = (node2.child_true, node2.child_false)
-            else:
-                children2 = (node2.node_id, node2.node_id)
+        if test_id2 == selected_test_id:
+            children2 = (self._true_column[root2], self._false_column[root2])
+        else:
+            children2 = (root2, root2)
 
-            child_true = self.apply(operation, children1[0], children2[0])
-            child_false = self.apply(operation, children1[1], children2[1])
+        return None, [key, selected_test_id, (children1[0], children2[0]), (children1[1], children2[1]), None, 0]
 
-            result = self.internal(selected_test, child_true, child_false)
+    def ite(self, test_node, then_id, else_id):
+        """
+        Computes the diagram "if test_node then then_id else else_id" in a single pass.  This is equivalent to (but much
+        cheaper than) test_node * then_id + ~test_node * else_id.
+        :param int test_node: The root id of the condition, a diagram with only 0 and 1 leaves (e.g. a bool_test)
+        :param int then_id: The root id of the diagram to use where the condition is 1
+        :param int else_id: The root id of the diagram to use where the condition is 0
+        :rtype: int
+        """
+        return self._run(lambda operands: self._ite_step(*operands), (test_node, then_id, else_id))
+
+    def _ite_step(self, test_node, then_id, else_id):
+        if test_node == self.one_id or then_id == else_id:
+            return then_id, None
+        elif test_node == self.zero_id:
+            return else_id, None
+        elif self._test_column[test_node] < 0:
+            raise RuntimeError("The condition of an if-then-else must have leaves 0 or 1, found {}"
+                               .format(self.get_node(test_node)))
+        elif then_id == self.one_id and else_id == self.zero_id:
+            return test_node, None
+
+        key = (ITE, test_node, then_id, else_id)
+        result = self._apply_cache.lookup(key)
+        if result is not None:
+            return result, None
+
+        operands = (test_node, then_id, else_id)
+        selected_test_id = -1
+        for node_id in operands:
+            test_id = self._test_column[node_id]
+            if test_id >= 0 and (selected_test_id < 0 or not self._test_id_smaller_eq(selected_test_id, test_id)):
+                selected_test_id = test_id
+
+        true_operands = []
+        false_operands = []
+        for node_id in operands:
+            if self._test_column[node_id] == selected_test_id:
+                true_operands.append(self._true_column[node_id])
+                false_operands.append(self._false_column[node_id])
+            else:
+                true_operands.append(node_id)
+                false_operands.append(node_id)
+
+        return None, [key, selected_test_id, tuple(true_operands), tuple(false_operands), None, 0]
 
-        self._apply_cache[key] = result
+    def _run(self, step, operands):
+        """
+        Runs an apply-style computation using an explicit stack instead of recursion.  Sub-problems are solved in the
+        same order as a recursive implementation (true branch first) so that node ids are identical.
+        :param callable step: Computes the result for the given operands or a frame
+            [key, test_id, true_operands, false_operands, true_result, phase]
+        :param tuple operands: The initial operands
+        :rtype: int
+        """
+        result, frame = step(operands)
+        if frame is None:
+            return result
+
+        stack = [frame]
+        while len(stack) > 0:
+            frame = stack[-1]
+            phase = frame[5]
+            if phase == 0:
+                frame[5] = 1
+                result, sub_frame = step(frame[2])
+            elif phase == 1:
+                frame[4] = result
+                frame[5] = 2
+                result, sub_frame = step(frame[3])
+            else:
+                result = self._internal_by_test_id(frame[1], frame[4], result)
+                self._apply_cache.store(frame[0], result)
+                stack.pop()
+                continue
+            if sub_frame is not None:
+                stack.append(sub_frame)
         return result
 
     def test_smaller_eq(self, test1, test2):
-        test_id1 = self._get_test_id(test1)
-        test_id2 = self._get_test_id(test2)
+        return self._test_id_smaller_eq(self._get_test_id(test1), self._get_test_id(test2))
+
+    def _test_id_smaller_eq(self, test_id1, test_id2):
         if self._ordering is None:
             return test_id1 <= test_id2
         else:
-            return self._ordering.test_smaller_eg(test_id1, test1, test_id2, test2)
+            return self._ordering.test_smaller_eq(test_id1, self._test_list[test_id1],
+                                                  test_id2, self._test_list[test_id2])
 
     @staticmethod
     def _transform_invert(terminal_node, diagram):
@@ -425,17 +883,54 @@ class Pool:
         tests = [(Test.import_test(test_string), test_id) for test_string, test_id in representation["tests"]]
         tests = [t[0] for t in sorted(tests, key=lambda p: p[1])]
 
-        nodes = representation["nodes"] + representation["expressions"]
-        nodes = [t[0] for t in sorted(nodes, key=lambda p: p[1])]
-
-        for node in nodes:
+        # Node ids of collected pools have gaps, exported ids are mapped to the ids created in the new pool
+        mapping = dict()
+        for node, node_id in sorted(representation["nodes"] + representation["expressions"], key=lambda p: p[1]):
             if isinstance(node, list):
                 test_id, high, low = node
-                pool.internal(tests[test_id], high, low)
+                mapping[node_id] = pool.internal(tests[test_id], mapping[high], mapping[low])
             else:
-                pool.terminal(node)
+                mapping[node_id] = pool.terminal(node)
         return pool
 
+    @staticmethod
+    def to_binary(pool):
+        """
+        Serializes this pool into a compact binary representation (see pyxadd.serialize), node ids are preserved
+        :type pool: Pool
+        :rtype: bytes
+        """
+        from pyxadd import serialize
+        return serialize.dumps(pool)
+
+    @staticmethod
+    def from_binary(data):
+        """
+        :param data: A binary representation created by to_binary (bytes or a buffer such as an mmap)
+        :rtype: Pool
+        """
+        from pyxadd import serialize
+        return serialize.loads(data)
+
+    def export_subpool(self, roots):
+        """
+        Serializes the nodes reachable from the given roots in the binary format (see pyxadd.serialize), dead nodes
+        and unused tests are left out
+        :param iterable roots: The root ids
+        :rtype: bytes
+        """
+        from pyxadd import serialize
+        return serialize.export_subpool(self, roots)
+
+    def import_subpool(self, data):
+        """
+        Merges an exported sub-pool into this pool, node and test ids are remapped
+        :param data: The data created by export_subpool (bytes or a buffer)
+        :return List[int]: The root ids in this pool (in the order they were exported)
+        """
+        from pyxadd import serialize
+        return serialize.import_subpool(self, data)
+
 
 class Diagram:
     debug = True
@@ -449,6 +944,7 @@ class Diagram:
         else:
             raise RuntimeError("Unexpected root node {} of type {}".format(root_node, type(root_node)))
         self._profile = None
+        pool._register_handle(self)
 
     @property
     def root_node(self):
@@ -492,18 +988,33 @@ class Diagram:
 
     def evaluate(self, assignment):
         assignment = {str(k): v for k, v in assignment.items()}
-        node = self.root_node
+        pool = self._pool
+        node_id = self.root_id
 
         while True:
-            if isinstance(node, InternalNode):
-                if node.test.evaluate(assignment):  # node.test.operator.test(node.test.expression.subs(assignment), 0):
-                    node = self.node(node.child_true)
-                else:
-                    node = self.node(node.child_false)
-            elif isinstance(node, TerminalNode):
-                return node.evaluate(assignment)
+            test_id = pool.node_test_id(node_id)
+            if test_id >= 0:
+                true_id, false_id = pool.node_children(node_id)
+                node_id = true_id if pool.get_test(test_id).evaluate(assignment) else false_id
             else:
-                raise RuntimeError("Unexpected node type {} of node {}".format(type(node), node))
+                return pool.get_node(node_id).evaluate(assignment)
+
+    def export_subpool(self):
+        """
+        Serializes only this diagram (the nodes reachable from its root), see Pool.import_subpool
+        :rtype: bytes
+        """
+        return self._pool.export_subpool([self.root_id])
+
+    def compile(self):
+        """
+        Compiles this diagram into a Python function that takes the values of the variables as positional arguments
+        (in the order given by the attribute "variables" of the function).  Compiled functions are cached per root in
+        the pool.
+        :rtype: callable
+        """
+        from pyxadd.codegen import get_compiled
+        return get_compiled(self)
 
     def reduce(self, variables=None, method="linear"):
         if method == "linear":
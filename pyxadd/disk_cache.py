@@ -0,0 +1,127 @@
+"""
+Generated evaluator source code can be persisted in a directory, so that a new process can compile it directly instead
+of generating it again (which requires SymPy printing or lambdify).  Entries are keyed by a structural hash of the
+expression or (sub)diagram they were generated from.
+"""
+
+import errno
+import hashlib
+import os
+import tempfile
+
+from sympy import srepr
+
+from pyxadd.test import BinaryTest
+
+# Changes to the generated code invalidate all existing entries
+FORMAT_VERSION = 1
+
+
+def _hash(*parts):
+    return hashlib.sha1("\n".join(str(part) for part in (FORMAT_VERSION,) + parts).encode("utf-8")).hexdigest()
+
+
+def expression_key(backend, template_expression, constant_count, variable_count):
+    """
+    :param str backend: The backend of the expression cache
+    :param sympy.Basic template_expression: The template
+    :param int constant_count: The number of constant parameters
+    :param int variable_count: The number of variable parameters
+    :return str: The key of the generated lambda for the given template
+    """
+    return _hash("expression", backend, srepr(template_expression), constant_count, variable_count)
+
+
+def _test_key(test):
+    if isinstance(test, BinaryTest):
+        return "B {}".format(test.var)
+    operator = test.operator
+    lhs = " ".join("{}:{!r}".format(var, float(operator.lhs[var])) for var in sorted(operator.lhs))
+    return "L {} {} {!r}".format(lhs, operator.symbol, float(operator.rhs))
+
+
+def diagram_key(diagram):
+    """
+    Computes a structural hash of the given diagram, diagrams with the same structure have the same key regardless of
+    the pool and node ids
+    :param Diagram diagram: The diagram
+    :return str: The key of the diagram
+    """
+    pool = diagram.pool
+    # Nodes are numbered in depth-first order (true child first), which does not depend on the node ids
+    node_ids = []
+    index = dict()
+    stack = [diagram.root_id]
+    while len(stack) > 0:
+        node_id = stack.pop()
+        if node_id in index:
+            continue
+        index[node_id] = len(node_ids)
+        node_ids.append(node_id)
+        if not pool.is_terminal_id(node_id):
+            child_true, child_false = pool.node_children(node_id)
+            stack += [child_false, child_true]
+    lines = []
+    for node_id in node_ids:
+        if pool.is_terminal_id(node_id):
+            lines.append("T {}".format(srepr(pool.get_node(node_id).expression)))
+        else:
+            child_true, child_false = pool.node_children(node_id)
+            test = pool.get_test(pool.node_test_id(node_id))
+            lines.append("I {} {} {}".format(_test_key(test), index[child_true], index[child_false]))
+    return _hash("diagram", *lines)
+
+
+class DiskCache(object):
+    def __init__(self, directory):
+        """
+        :param str directory: The directory in which entries are stored (created if it does not exist)
+        """
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """
+        :param str key: The key
+        :return str|None: The stored text or None if there is no entry for the given key
+        """
+        try:
+            with open(self._path(key)) as f:
+                text = f.read()
+            self.hits += 1
+            return text
+        except IOError:
+            self.misses += 1
+            return None
+
+    def put(self, key, text):
+        """
+        Stores the given text, entries are written to a temporary file first so concurrent readers never see partial
+        entries
+        :param str key: The key
+        :param str text: The text to store
+        """
+        handle, temporary = tempfile.mkstemp(dir=self.directory, prefix=".tmp")
+        try:
+            with os.fdopen(handle, "w") as f:
+                f.write(text)
+            os.rename(temporary, self._path(key))
+        except Exception:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def __len__(self):
+        return len([name for name in os.listdir(self.directory) if not name.startswith(".")])
@@ -1,7 +1,16 @@
+import collections
+import itertools
+import multiprocessing
+
 import numpy
 
+from pyxadd import serialize
+from pyxadd.test import BinaryTest
 from pyxadd.walk import DepthFirstWalker
 
+# The number of rows sent to a worker process at once
+DEFAULT_CHUNK_SIZE = 100000
+
 
 class EvaluationWalker(DepthFirstWalker):
     def __init__(self, diagram, entries):
@@ -35,8 +44,194 @@ class EvaluationWalker(DepthFirstWalker):
         return true_message, false_message
 
 
-def mass_evaluate(diagram, assignments):
-    walker = EvaluationWalker(diagram, assignments)
-    walker.walk()
-    return walker.results
+def get_numpy_function(pool, node_id):
+    """
+    Returns a vectorized (NumPy) function for the expression of the given terminal node, compiled by the NumPy
+    expression cache of the pool (so terminals that only differ in their constants share the compiled template)
+    :param Pool pool: The pool
+    :param int node_id: The id of the terminal node
+    :return Tuple[List[str], callable]: The names of the arguments and the function
+    """
+    terminal_node = pool.get_node(node_id)
+    names = [str(symbol) for symbol in sorted(terminal_node.expression.free_symbols, key=str)]
+    return names, terminal_node.numpy_function(pool.numpy_expression_cache)
+
+
+def evaluate_arrays(diagram, columns, size=None):
+    """
+    Evaluates the diagram for many assignments at once.  Index arrays are routed top-down through the diagram, every
+    test is evaluated once per node (for all rows that reach it) using a vectorized dot product and every leaf is
+    evaluated once using a NumPy function.
+    :param Diagram diagram: The diagram to evaluate
+    :param dict columns: A mapping from variable names to (equally long) NumPy arrays of values
+    :param int|None size: The number of rows (required if there are no columns, e.g. for constant diagrams, default 1)
+    :return numpy.ndarray: The results (one per row)
+    """
+    pool = diagram.pool
+    columns = {str(var): numpy.asarray(values) for var, values in columns.items()}
+    sizes = set(len(values) for values in columns.values())
+    if size is not None:
+        sizes.add(size)
+    if len(sizes) > 1:
+        raise RuntimeError("All columns must have the same length, found lengths {}".format(sorted(sizes)))
+    size = sizes.pop() if len(sizes) > 0 else 1
+    results = numpy.zeros(size)
+
+    # Parents are always created after their children, hence descending ids are a top-down order
+    node_ids = sorted(pool._mark([diagram.root_id]), reverse=True)
+    tests = {pool.node_test_id(node_id): pool.get_test(pool.node_test_id(node_id))
+             for node_id in node_ids if not pool.is_terminal_id(node_id)}
+    linear_vars = sorted(set(var for test in tests.values() if not isinstance(test, BinaryTest)
+                             for var in test.variables))
+    for var in linear_vars + [test.var for test in tests.values() if isinstance(test, BinaryTest)]:
+        if var not in columns:
+            raise RuntimeError("Missing values for variable {}".format(var))
+    matrix = numpy.column_stack([columns[var].astype(float) for var in linear_vars]) if len(linear_vars) > 0 \
+        else None
+
+    # Column positions and coefficients of every linear test
+    operands = dict()
+    for test_id, test in tests.items():
+        if not isinstance(test, BinaryTest):
+            lhs = test.operator.lhs
+            operands[test_id] = ([linear_vars.index(var) for var in sorted(lhs)],
+                                 numpy.array([float(lhs[var]) for var in sorted(lhs)]))
+
+    routed = {diagram.root_id: [numpy.arange(size)]}
+    for node_id in node_ids:
+        index_arrays = routed.pop(node_id, [])
+        if len(index_arrays) == 0:
+            continue
+        indices = index_arrays[0] if len(index_arrays) == 1 else numpy.concatenate(index_arrays)
+        if len(indices) == 0:
+            continue
+        if pool.is_terminal_id(node_id):
+            names, f = get_numpy_function(pool, node_id)
+            for name in names:
+                if name not in columns:
+                    raise RuntimeError("Missing values for variable {}".format(name))
+            results[indices] = f(*[columns[name][indices] for name in names])
+        else:
+            test_id = pool.node_test_id(node_id)
+            test = tests[test_id]
+            if isinstance(test, BinaryTest):
+                outcome = columns[test.var][indices].astype(bool)
+            else:
+                positions, coefficients = operands[test_id]
+                values = matrix[numpy.ix_(indices, positions)].dot(coefficients)
+                outcome = test.operator.evaluate_values(values, float(test.operator.rhs))
+            child_true, child_false = pool.node_children(node_id)
+            routed.setdefault(child_true, []).append(indices[outcome])
+            routed.setdefault(child_false, []).append(indices[~outcome])
+    return results
+
+
+def _columns(assignments):
+    """
+    Converts a list of assignments into columns (a dictionary of columns is returned unchanged, except for the keys)
+    :param List[dict]|dict assignments: The assignments (or a mapping from variable names to arrays of values)
+    :return Tuple[dict, int]: The columns and the number of rows
+    """
+    if isinstance(assignments, dict):
+        columns = {str(var): numpy.asarray(values) for var, values in assignments.items()}
+        sizes = set(len(values) for values in columns.values())
+        if len(sizes) > 1:
+            raise RuntimeError("All columns must have the same length, found lengths {}".format(sorted(sizes)))
+        return columns, sizes.pop() if len(sizes) > 0 else 0
+    assignments = [{str(k): v for k, v in entry.items()} for entry in assignments]
+    variables = set(var for entry in assignments for var in entry)
+    try:
+        columns = {var: numpy.array([entry[var] for entry in assignments]) for var in variables}
+    except KeyError as e:
+        raise RuntimeError("Assignments did not include all variables, missing {}".format(e))
+    return columns, len(assignments)
+
+
+# The diagram evaluated by a worker process (set by the pool initializer)
+_worker_diagram = None
+
+
+def _initialize_worker(data):
+    global _worker_diagram
+    pool, roots = serialize.read(data)
+    _worker_diagram = pool.diagram(roots[0])
+
+
+def _evaluate_chunk(columns, size):
+    return evaluate_arrays(_worker_diagram, columns, size)
+
+
+class ParallelEvaluator(object):
+    """
+    Evaluates a diagram in worker processes.  The reachable sub-pool of the diagram is sent to every worker once (when
+    the workers are started), afterwards only chunks of columns and results are exchanged.
+    """
+    def __init__(self, diagram, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :param Diagram diagram: The diagram to evaluate
+        :param int|None workers: The number of worker processes (default: the number of cores)
+        :param int chunk_size: The number of rows sent to a worker at once
+        """
+        self.workers = multiprocessing.cpu_count() if workers is None else workers
+        self.chunk_size = chunk_size
+        self._processes = multiprocessing.Pool(self.workers, initializer=_initialize_worker,
+                                               initargs=(diagram.export_subpool(),))
+
+    def evaluate_chunks(self, chunks, sizes=None):
+        """
+        Evaluates a stream of chunks, at most two chunks per worker are read ahead (Pool.imap would consume the whole
+        stream at once)
+        :param iterable chunks: The chunks (mappings from variable names to equally long arrays)
+        :param iterable|None sizes: The number of rows of every chunk (only required for chunks without columns)
+        :return iterable[numpy.ndarray]: The results of every chunk (in order)
+        """
+        pending = collections.deque()
+        sized_chunks = itertools.izip(chunks, sizes) if sizes is not None else ((columns, None) for columns in chunks)
+        for columns, size in sized_chunks:
+            pending.append(self._processes.apply_async(_evaluate_chunk, (columns, size)))
+            if len(pending) >= 2 * self.workers:
+                yield pending.popleft().get()
+        while len(pending) > 0:
+            yield pending.popleft().get()
+
+    def evaluate(self, assignments):
+        """
+        :param List[dict]|dict assignments: The assignments or a mapping from variable names to (equally long) arrays
+        :return numpy.ndarray: The results (in the order of the assignments)
+        """
+        columns, size = _columns(assignments)
+        if size == 0:
+            return numpy.zeros(0)
+        starts = range(0, size, self.chunk_size)
+        chunks = ({var: values[start:start + self.chunk_size] for var, values in columns.items()} for start in starts)
+        sizes = (min(self.chunk_size, size - start) for start in starts)
+        return numpy.concatenate(list(self.evaluate_chunks(chunks, sizes)))
+
+    def close(self):
+        """
+        Stops the worker processes
+        """
+        self._processes.close()
+        self._processes.join()
+
 
+def mass_evaluate(diagram, assignments, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Evaluates the diagram for every given assignment (see evaluate_arrays)
+    :param Diagram diagram: The diagram to evaluate
+    :param List[dict]|dict assignments: The assignments or a mapping from variable names to (equally long) arrays
+    :param int|None workers: If given, the assignments are evaluated in chunks by this many worker processes (see
+        ParallelEvaluator)
+    :param int chunk_size: The number of rows per chunk (only used with workers)
+    :return numpy.ndarray: The results
+    """
+    if workers is not None:
+        evaluator = ParallelEvaluator(diagram, workers, chunk_size)
+        try:
+            return evaluator.evaluate(assignments)
+        finally:
+            evaluator.close()
+    columns, size = _columns(assignments)
+    if size == 0:
+        return numpy.zeros(0)
+    return evaluate_arrays(diagram, columns, size)
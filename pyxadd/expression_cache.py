@@ -0,0 +1,158 @@
+"""
+Terminal expressions are compiled into Python functions through a cache that is shared by all terminals of a pool.
+Expressions are reduced to templates in which numeric constants (except exponents) and variables are replaced by
+parameters, e.g. 3*x + 2 and 5*y + 7 share the template _c0*_v0 + _c1.  Every template is compiled only once, the
+constants are bound to the compiled function per expression.
+"""
+
+from __future__ import division
+
+import functools
+
+import sympy
+from sympy.printing.lambdarepr import LambdaPrinter, NumPyPrinter
+from sympy.utilities.lambdify import lambdastr
+
+from pyxadd.disk_cache import expression_key
+
+# The modules and printer used by every backend (sympy.lambdify also uses these modules by default, but inserts
+# numpy if it is installed)
+BACKENDS = {
+    "default": (["math", "mpmath", "sympy"], LambdaPrinter),
+    "numpy": (["numpy"], NumPyPrinter),
+}
+
+
+_placeholders = dict()
+
+
+def _placeholder(prefix, index):
+    key = (prefix, index)
+    if key not in _placeholders:
+        _placeholders[key] = sympy.Symbol("{}{}".format(prefix, index))
+    return _placeholders[key]
+
+
+def _constant_value(number):
+    if number.is_Integer:
+        return int(number)
+    elif number.is_Rational or number.is_Float:
+        return float(number)
+    return None
+
+
+def template(expression):
+    """
+    Replaces numeric constants (except exponents, 1 and -1) and variables by parameters
+    :param sympy.Basic expression: The expression
+    :return Tuple[sympy.Basic, list, List[sympy.Symbol]]: The template, the values of the constant parameters
+        (_c0, _c1, ...) and the variables corresponding to the variable parameters (_v0, _v1, ...)
+    """
+    variables = sorted(expression.free_symbols, key=str)
+    placeholders = {var: _placeholder("_v", i) for i, var in enumerate(variables)}
+    constants = []
+
+    def replace(node):
+        if node.is_Symbol:
+            return placeholders[node]
+        elif node.is_Number:
+            value = _constant_value(node)
+            if value is None or node in (sympy.S.One, sympy.S.NegativeOne):
+                return node
+            constants.append(value)
+            return _placeholder("_c", len(constants) - 1)
+        elif node.is_Pow and node.exp.is_Number:
+            return sympy.Pow(replace(node.base), node.exp, evaluate=False)
+        elif node.is_Add or node.is_Mul or node.is_Pow:
+            return node.func(*[replace(arg) for arg in node.args], evaluate=False)
+        elif len(node.args) == 0:
+            return node
+        return node.func(*[replace(arg) for arg in node.args])
+
+    return replace(expression), constants, variables
+
+
+class ExpressionCache(object):
+    def __init__(self, backend="default", disk_cache=None):
+        """
+        :param str backend: The backend used by the compiled functions: "default" (math, mpmath and sympy, the
+            functions are applied to scalars) or "numpy" (the functions can be applied to arrays)
+        :param DiskCache|None disk_cache: An optional disk cache in which the generated source code of templates (and
+            compiled diagrams, see codegen.get_compiled) is persisted across processes
+        """
+        if backend not in BACKENDS:
+            raise RuntimeError("Unknown backend {}, valid options are {}".format(backend, sorted(BACKENDS)))
+        self.backend = backend
+        self.disk_cache = disk_cache
+        self._functions = dict()
+        self._namespace = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def namespace(self):
+        if self._namespace is None:
+            # The globals of a lambdified function contain the namespace sympy builds for the given modules
+            modules, _ = BACKENDS[self.backend]
+            self._namespace = dict(sympy.lambdify([], 0, modules=modules).__globals__)
+        return self._namespace
+
+    def source(self, template_expression, constant_count, variable_count):
+        """
+        Generates the source code of a lambda for the given template, it takes the constants followed by the variables
+        :rtype: str
+        """
+        _, printer = BACKENDS[self.backend]
+        arguments = [_placeholder("_c", i) for i in range(constant_count)] + \
+                    [_placeholder("_v", i) for i in range(variable_count)]
+        return lambdastr(arguments, template_expression, printer=printer)
+
+    def _compile(self, key):
+        template_expression, constant_count, variable_count = key
+        if self.disk_cache is None:
+            return eval(self.source(template_expression, constant_count, variable_count), self.namespace)
+        disk_key = expression_key(self.backend, template_expression, constant_count, variable_count)
+        source = self.disk_cache.get(disk_key)
+        if source is None:
+            source = self.source(template_expression, constant_count, variable_count)
+            self.disk_cache.put(disk_key, source)
+        return eval(source, self.namespace)
+
+    def get(self, expression):
+        """
+        Returns a function that evaluates the given expression, it takes the values of the variables of the
+        expression (ordered by name) as arguments
+        :param sympy.Basic expression: The expression
+        :rtype: callable
+        """
+        template_expression, constants, variables = template(expression)
+        key = (template_expression, len(constants), len(variables))
+        f = self._functions.get(key, None)
+        if f is None:
+            self.misses += 1
+            f = self._compile(key)
+            self._functions[key] = f
+        else:
+            self.hits += 1
+        return functools.partial(f, *constants) if len(constants) > 0 else f
+
+    def warm_up(self, diagram):
+        """
+        Compiles the expressions of all terminals reachable in the given diagram (of a pool using this cache)
+        :param Diagram diagram: The diagram
+        :return int: The number of terminals
+        """
+        pool = diagram.pool
+        terminals = [pool.get_node(node_id) for node_id in pool._mark([diagram.root_id])
+                     if pool.is_terminal_id(node_id)]
+        for terminal_node in terminals:
+            terminal_node._get_f()
+        return len(terminals)
+
+    def clear(self):
+        self._functions = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._functions)
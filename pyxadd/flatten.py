@@ -0,0 +1,150 @@
+import numpy
+
+from pyxadd.evaluate import get_numpy_function
+from pyxadd.test import BinaryTest
+from pyxadd.walk import get_profile
+
+
+class FlatDiagram(object):
+    """
+    A diagram stored as flat NumPy arrays.  Internal nodes are numbered 0 to n - 1 in topological order (the root
+    first), leaves are numbered n to n + m - 1.  Every test is stored as a row of the coefficient matrix and an entry
+    of the rhs vector (coefficients * values <= rhs), boolean tests b are stored as -b <= -1.
+    """
+    def __init__(self, variables, coefficients, rhs, child_true, child_false, leaves):
+        """
+        :param List[str] variables: The variables (columns of the coefficient matrix)
+        :param numpy.ndarray coefficients: The coefficient matrix (tests x variables)
+        :param numpy.ndarray rhs: The right hand sides of the tests
+        :param numpy.ndarray child_true: The index of the true child of every internal node
+        :param numpy.ndarray child_false: The index of the false child of every internal node
+        :param List[Tuple[sympy.Basic, List[int], callable]] leaves: The expression of every leaf, the indices of the
+            variables it depends on and a vectorized function that takes the values of these variables
+        """
+        self.variables = variables
+        self.coefficients = coefficients
+        self.rhs = rhs
+        self.child_true = child_true
+        self.child_false = child_false
+        self.leaves = leaves
+        # The non-zero terms (variable indices and coefficients) of every test
+        self.terms = [(numpy.flatnonzero(row), row[numpy.flatnonzero(row)]) for row in coefficients]
+
+    @property
+    def internal_count(self):
+        return len(self.rhs)
+
+    @staticmethod
+    def from_diagram(diagram):
+        """
+        Flattens the given diagram, nodes are ordered following the walking profile of the diagram
+        :param Diagram diagram: The diagram
+        :rtype: FlatDiagram
+        """
+        pool = diagram.pool
+        order = list(reversed(list(get_profile(diagram))))
+        internal = [node_id for node_id in order if not pool.is_terminal_id(node_id)]
+        terminals = [node_id for node_id in order if pool.is_terminal_id(node_id)]
+        index = {node_id: i for i, node_id in enumerate(internal + terminals)}
+
+        tests = [pool.get_test(pool.node_test_id(node_id)) for node_id in internal]
+        variables = set()
+        for test in tests:
+            variables |= set(test.variables)
+        for node_id in terminals:
+            variables |= set(str(symbol) for symbol in pool.get_node(node_id).expression.free_symbols)
+        variables = sorted(variables)
+        positions = {var: i for i, var in enumerate(variables)}
+
+        coefficients = numpy.zeros((len(internal), len(variables)))
+        rhs = numpy.zeros(len(internal))
+        for i, test in enumerate(tests):
+            if isinstance(test, BinaryTest):
+                coefficients[i, positions[test.var]] = -1
+                rhs[i] = -1
+            else:
+                operator = test.operator if test.operator.symbol == "<=" else test.operator.to_canonical()
+                for var, coefficient in operator.lhs.items():
+                    coefficients[i, positions[var]] = coefficient
+                rhs[i] = operator.rhs
+
+        child_true = numpy.array([index[pool.node_children(node_id)[0]] for node_id in internal], dtype=int)
+        child_false = numpy.array([index[pool.node_children(node_id)[1]] for node_id in internal], dtype=int)
+
+        leaves = []
+        for node_id in terminals:
+            names, f = get_numpy_function(pool, node_id)
+            leaves.append((pool.get_node(node_id).expression, [positions[name] for name in names], f))
+        return FlatDiagram(variables, coefficients, rhs, child_true, child_false, leaves)
+
+    def route(self, values):
+        """
+        Finds the leaf reached by every row of values.  Internal nodes are visited once in topological order, every
+        node tests all rows that reach it at once (using only the non-zero terms of its test) and passes them on to
+        its children.
+        :param numpy.ndarray values: A matrix with one row per point and one column per variable
+        :return numpy.ndarray: The leaf index (0 to m - 1) of every row
+        """
+        leaves = numpy.zeros(len(values), dtype=int)
+        if self.internal_count == 0:
+            return leaves
+        columns = [numpy.ascontiguousarray(values[:, j]) for j in range(values.shape[1])]
+        pending = [[] for _ in range(self.internal_count)]
+        pending[0].append(numpy.arange(len(values)))
+        for node in range(self.internal_count):
+            parts, pending[node] = pending[node], None
+            if len(parts) == 0:
+                continue
+            rows = parts[0] if len(parts) == 1 else numpy.concatenate(parts)
+            lhs = numpy.zeros(len(rows))
+            for j, coefficient in zip(*self.terms[node]):
+                lhs += coefficient * columns[j][rows]
+            satisfied = lhs <= self.rhs[node]
+            branches = (self.child_true[node], rows[satisfied]), (self.child_false[node], rows[~satisfied])
+            for child, selected in branches:
+                if len(selected) == 0:
+                    continue
+                if child >= self.internal_count:
+                    leaves[selected] = child - self.internal_count
+                else:
+                    pending[child].append(selected)
+        return leaves
+
+    def evaluate_matrix(self, values):
+        """
+        :param numpy.ndarray values: A matrix with one row per point and one column per variable (see variables)
+        :return numpy.ndarray: The value of every row
+        """
+        values = numpy.asarray(values, dtype=float)
+        leaf_indices = self.route(values)
+        results = numpy.zeros(len(values))
+        order = numpy.argsort(leaf_indices, kind="mergesort")
+        boundaries = numpy.searchsorted(leaf_indices[order], numpy.arange(len(self.leaves) + 1))
+        for leaf in range(len(self.leaves)):
+            rows = order[boundaries[leaf]:boundaries[leaf + 1]]
+            if len(rows) > 0:
+                _, arguments, f = self.leaves[leaf]
+                results[rows] = f(*[values[rows, j] for j in arguments])
+        return results
+
+    def evaluate(self, columns):
+        """
+        :param dict columns: A mapping from variable names to (equally long) arrays of values
+        :return numpy.ndarray: The value of every row
+        """
+        for var in self.variables:
+            if var not in columns:
+                raise RuntimeError("Missing values for variable {}".format(var))
+        if len(self.variables) == 0:
+            size = len(next(iter(columns.values()))) if len(columns) > 0 else 1
+            return self.evaluate_matrix(numpy.zeros((size, 0)))
+        return self.evaluate_matrix(numpy.column_stack([numpy.asarray(columns[var], dtype=float)
+                                                        for var in self.variables]))
+
+
+def flatten(diagram):
+    """
+    :param Diagram diagram: The diagram to flatten
+    :rtype: FlatDiagram
+    """
+    return FlatDiagram.from_diagram(diagram)
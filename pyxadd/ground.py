@@ -0,0 +1,86 @@
+import numpy
+
+from pyxadd.evaluate import get_numpy_function
+from pyxadd.test import BinaryTest
+
+
+def _grids(box):
+    """
+    :return List[numpy.ndarray]: Open (broadcastable) grids with the values of every variable in the given box
+    """
+    grids = []
+    for i, (lb, ub) in enumerate(box):
+        shape = [1] * len(box)
+        shape[i] = ub - lb + 1
+        grids.append(numpy.arange(lb, ub + 1).reshape(shape))
+    return grids
+
+
+def _restrict(test, var, lb, ub, outcome):
+    if isinstance(test, BinaryTest):
+        value = 1 if outcome else 0
+        return max(lb, value), min(ub, value)
+    return test.integer_bounds(var, lb, ub, test=outcome)
+
+
+def ground(diagram, bounds):
+    """
+    Evaluates the diagram for all integer points within the given bounds.  Paths through the diagram are enumerated
+    together with the box of points that reach them: tests on a single variable narrow the box, tests on multiple
+    variables are collected as constraints.  Every leaf then fills the slice of its box at once using a vectorized
+    function, if there are constraints only the points satisfying them (computed as a vectorized mask) are written.
+    :param Diagram diagram: The diagram to ground
+    :param List[Tuple[str, int, int]] bounds: The variables and their (inclusive) lower and upper bounds, boolean
+        variables can be included with bounds 0 and 1
+    :return numpy.ndarray: A tensor with one dimension per variable (in the given order), the entry at index
+        (i_1, ..., i_n) is the value for the assignment {var_k: lb_k + i_k}
+    """
+    pool = diagram.pool
+    variables = [str(var) for var, _, _ in bounds]
+    positions = {var: i for i, var in enumerate(variables)}
+    lower_bounds = [lb for _, lb, _ in bounds]
+    tensor = numpy.zeros(tuple(max(0, ub - lb + 1) for _, lb, ub in bounds))
+    if tensor.size == 0:
+        return tensor
+
+    def missing(var):
+        return RuntimeError("Variable {} is not grounded, only: {}".format(var, variables))
+
+    stack = [(diagram.root_id, tuple((lb, ub) for _, lb, ub in bounds), ())]
+    while len(stack) > 0:
+        node_id, box, constraints = stack.pop()
+        if pool.is_terminal_id(node_id):
+            names, f = get_numpy_function(pool, node_id)
+            for name in names:
+                if name not in positions:
+                    raise missing(name)
+            grids = _grids(box)
+            shape = tuple(ub - lb + 1 for lb, ub in box)
+            values = numpy.broadcast_to(f(*[grids[positions[name]] for name in names]), shape)
+            target = tuple(slice(lb - offset, ub - offset + 1) for (lb, ub), offset in zip(box, lower_bounds))
+            if len(constraints) == 0:
+                tensor[target] = values
+            else:
+                mask = numpy.ones(shape, dtype=bool)
+                for test, outcome in constraints:
+                    lhs = sum(coefficient * grids[positions[var]] for var, coefficient in test.operator.lhs.items())
+                    mask &= test.operator.evaluate_values(lhs, test.operator.rhs) == outcome
+                region = tensor[target]
+                region[mask] = values[mask]
+            continue
+
+        test = pool.get_test(pool.node_test_id(node_id))
+        child_true, child_false = pool.node_children(node_id)
+        for var in test.variables:
+            if var not in positions:
+                raise missing(var)
+        for child, outcome in ((child_false, False), (child_true, True)):
+            if isinstance(test, BinaryTest) or test.operator.is_singular():
+                var = test.variables[0]
+                i = positions[var]
+                lb, ub = _restrict(test, var, box[i][0], box[i][1], outcome)
+                if lb <= ub:
+                    stack.append((child, box[:i] + ((lb, ub),) + box[i + 1:], constraints))
+            else:
+                stack.append((child, box, constraints + ((test, outcome),)))
+    return tensor
@@ -0,0 +1,151 @@
+import numpy
+import sympy
+
+from pyxadd.bounds import BoundsWalker
+from pyxadd.evaluate import get_numpy_function
+from pyxadd.test import LinearTest
+
+
+class IntervalWalker(BoundsWalker):
+    """
+    Collects the integer interval of every path through a diagram that only tests a single integer variable
+    """
+    def __init__(self, variable, diagram):
+        BoundsWalker.__init__(self, variable, diagram)
+        self.cache_messages = True
+        self.intervals = []
+
+    def visit_internal_down(self, internal_node, parent_message):
+        test = internal_node.test
+        if not isinstance(test, LinearTest) or test.variables != [self.variable] or not test.operator.is_singular():
+            raise RuntimeError("Test {} does not only depend on {}".format(test, self.variable))
+        lb, ub = parent_message if parent_message is not None else (-sympy.oo, sympy.oo)
+        return test.integer_bounds(self.variable, lb, ub, test=True), \
+            test.integer_bounds(self.variable, lb, ub, test=False)
+
+    def _visit(self, node, message=None):
+        # Paths with empty bounds are infeasible and not explored (diagrams are not necessarily reduced)
+        if message is not None and message[0] > message[1]:
+            return None
+        return BoundsWalker._visit(self, node, message)
+
+    def visit_internal_aggregate(self, internal_node, true_result, false_result):
+        return None
+
+    def visit_terminal(self, terminal_node, parent_message):
+        lb, ub = parent_message if parent_message is not None else (-sympy.oo, sympy.oo)
+        lb = -float("inf") if lb == -sympy.oo else lb
+        ub = float("inf") if ub == sympy.oo else ub
+        if lb <= ub:
+            self.intervals.append((lb, ub, terminal_node.node_id))
+        return None
+
+
+class IntervalIndex(object):
+    """
+    A piecewise function of a single integer variable, stored as a sorted array of breakpoints and one leaf per
+    interval.  Interval i contains the values breakpoints[i - 1] <= x < breakpoints[i] (the first and last interval are
+    unbounded).
+    """
+    def __init__(self, variable, breakpoints, leaves):
+        """
+        :param str variable: The variable
+        :param numpy.ndarray breakpoints: The (sorted) lower bounds of all but the first interval
+        :param List[Tuple[sympy.Basic, callable]] leaves: The expression of every interval and a vectorized function
+            that evaluates it (taking the value of the variable if the expression depends on it, no arguments otherwise)
+        """
+        if len(leaves) != len(breakpoints) + 1:
+            raise RuntimeError("Expected {} leaves for {} breakpoints, got {}"
+                               .format(len(breakpoints) + 1, len(breakpoints), len(leaves)))
+        self.variable = variable
+        self.breakpoints = breakpoints
+        self.leaves = leaves
+        # Constant leaves are evaluated by a single lookup, other leaves are marked by NaN
+        self.constants = numpy.array([float(expression) if len(expression.free_symbols) == 0 else numpy.nan
+                                      for expression, _ in leaves])
+
+    @staticmethod
+    def from_diagram(diagram, variable=None):
+        """
+        :param Diagram diagram: A diagram that only depends on one integer variable
+        :param str|None variable: The variable (if None, the only variable tested in the diagram)
+        :rtype: IntervalIndex
+        """
+        pool = diagram.pool
+        if variable is None:
+            variables = set()
+            for node_id in pool._mark([diagram.root_id]):
+                if not pool.is_terminal_id(node_id):
+                    variables |= set(pool.get_test(pool.node_test_id(node_id)).variables)
+            if len(variables) != 1:
+                raise RuntimeError("Diagram does not test exactly one variable (it tests {})".format(sorted(variables)))
+            variable = variables.pop()
+        variable = str(variable)
+        if pool.get_var_type(variable) != "int":
+            raise RuntimeError("Interval indices require an int variable, {} is {}"
+                               .format(variable, pool.get_var_type(variable)))
+
+        walker = IntervalWalker(variable, diagram)
+        walker.walk()
+        intervals = sorted(set(walker.intervals))
+        # Adjacent intervals leading to the same leaf are merged
+        merged = []
+        for lb, ub, node_id in intervals:
+            if len(merged) > 0 and merged[-1][1] + 1 != lb:
+                raise RuntimeError("Intervals [{}, {}] and [{}, {}] are not adjacent"
+                                   .format(merged[-1][0], merged[-1][1], lb, ub))
+            if len(merged) > 0 and merged[-1][2] == node_id:
+                merged[-1] = (merged[-1][0], ub, node_id)
+            else:
+                merged.append((lb, ub, node_id))
+
+        leaves = []
+        for _, _, node_id in merged:
+            names, f = get_numpy_function(pool, node_id)
+            if len(set(names) - {variable}) > 0:
+                raise RuntimeError("Leaf {} depends on variables other than {}"
+                                   .format(pool.get_node(node_id).expression, variable))
+            leaves.append((pool.get_node(node_id).expression, f))
+        breakpoints = numpy.array([lb for lb, _, _ in merged[1:]], dtype=float)
+        return IntervalIndex(variable, breakpoints, leaves)
+
+    def intervals(self):
+        """
+        :return List[Tuple[float, float, sympy.Basic]]: The (inclusive) bounds and the expression of every interval
+        """
+        lower = [-float("inf")] + list(self.breakpoints)
+        upper = [b - 1 for b in self.breakpoints] + [float("inf")]
+        return [(lb, ub, expression) for lb, ub, (expression, _) in zip(lower, upper, self.leaves)]
+
+    def _evaluate_leaf(self, leaf, values):
+        expression, f = self.leaves[leaf]
+        return f(values) if len(expression.free_symbols) > 0 else f()
+
+    def evaluate(self, values):
+        """
+        Evaluates the function for a single integer value or an array of integer values
+        :param int|numpy.ndarray values: The value(s) of the variable
+        :return float|numpy.ndarray: The result(s)
+        """
+        if numpy.isscalar(values):
+            leaf = int(numpy.searchsorted(self.breakpoints, values, side="right"))
+            return float(self._evaluate_leaf(leaf, values))
+
+        values = numpy.asarray(values)
+        leaf_indices = numpy.searchsorted(self.breakpoints, values, side="right")
+        results = self.constants[leaf_indices]
+        variable_rows = numpy.flatnonzero(numpy.isnan(results))
+        if len(variable_rows) > 0:
+            for leaf in numpy.unique(leaf_indices[variable_rows]):
+                rows = variable_rows[leaf_indices[variable_rows] == leaf]
+                results[rows] = self._evaluate_leaf(leaf, values[rows])
+        return results
+
+
+def interval_index(diagram, variable=None):
+    """
+    :param Diagram diagram: A diagram that only depends on one integer variable
+    :param str|None variable: The variable (if None, the only variable tested in the diagram)
+    :rtype: IntervalIndex
+    """
+    return IntervalIndex.from_diagram(diagram, variable)
@@ -1,5 +1,8 @@
 from __future__ import print_function
 
+import numpy
+
+from pyxadd.ground import ground
 from pyxadd.leaf_transform import transform_leaves
 from pyxadd.matrix_vector import sum_out
 from pyxadd.rename import rename
@@ -7,6 +10,9 @@ from pyxadd.reduce import LinearReduction, SimpleBoundReducer
 
 
 class Matrix(object):
+    # If true, matrix products sum out the shared variables while multiplying (see matrix_vector.multiply_sum_out)
+    fused = True
+
     def __init__(self, diagram, row_vars, col_vars, height=None, width=None, auto_reduce=False, is_simple=None):
         from pyxadd.diagram import Diagram
         assert isinstance(diagram, Diagram)
@@ -106,7 +112,7 @@ class Matrix(object):
             variables = [t[0] for t in self._col_vars]
             reducer = self.get_reducer() if self.is_simple() else None
             diagram = pool.diagram(matrix_multiply_reduced(pool, self.diagram.root_id, other.diagram.root_id, variables,
-                                                           reducer))
+                                                           reducer, fused=Matrix.fused))
             diagram = self._optional_reduce(diagram)
             return self._matrix(diagram, self._row_vars, other._col_vars, [self, other], self.height, other.width)
         else:
@@ -183,7 +189,7 @@ class Matrix(object):
                 row.append(str(row_assignment))
             row_values = []
             for entry in grounded[row_index]:
-                row_values.append(str(entry))
+                row_values.append(format_entry(entry))
             row += row_values
             results.append(row)
             row_index += 1
@@ -195,21 +201,8 @@ class Matrix(object):
             print(*row, sep="  ")
 
     def to_ground(self, row_limit=None, column_limit=None):
-        matrix = []
-        row_index = 0
-        for row_assignment in assignments(self._row_vars):
-            if row_limit is not None and row_index >= row_limit:
-                break
-            row = []
-            column_index = 0
-            for a in assignments(self._col_vars, fixed=row_assignment):
-                if column_limit is not None and column_index >= column_limit:
-                    break
-                row.append(self.evaluate(a))
-                column_index += 1
-            matrix.append(row)
-            row_index += 1
-        return matrix
+        grounded = ground(self.diagram, self._row_vars + self._col_vars).reshape((self.height, self.width))
+        return grounded[:row_limit, :column_limit].tolist()
 
     def export(self, name):
         from pyxadd.view import export
@@ -252,6 +245,17 @@ class Matrix(object):
         return diagram.pool.diagram(reducer.reduce(diagram.root_id, variables))
 
 
+def format_entry(entry):
+    """
+    Formats a grounded entry, integral values are printed without decimals
+    :param float entry: The entry
+    :rtype: str
+    """
+    if numpy.isfinite(entry) and entry == int(entry):
+        return str(int(entry))
+    return str(entry)
+
+
 def assignments(variables, fixed=None):
     if fixed is None:
         fixed = dict()
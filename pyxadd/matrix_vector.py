@@ -1,24 +1,63 @@
 from __future__ import print_function
 
+import logging
 import sympy
 import math
 from collections import defaultdict
+from fractions import Fraction
 
 from pyxadd import view
 from pyxadd.diagram import Diagram, DefaultCache, Pool
 from pyxadd.operation import Summation, Multiplication
+from pyxadd.polysum import Polynomial
 from pyxadd.test import LinearTest
 from pyxadd.variables import VariableFinder
 from pyxadd.walk import DownUpWalker
 
+logger = logging.getLogger(__name__)
+
+
+def _is_finite_number(value):
+    if isinstance(value, (int, long, float)):
+        return not math.isinf(value)
+    return isinstance(value, sympy.Basic) and value.is_Number and value.is_finite
+
+
+def _exact(value):
+    """
+    Converts integer values to int (so polynomials are evaluated exactly), other values to float
+    """
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def _number(value):
+    """
+    Converts the numeric value of a sum to SymPy: integers and fractions exactly, floats only if they are not zero (so
+    zero sums lead to the zero terminal)
+    """
+    if isinstance(value, Fraction):
+        return sympy.Rational(value.numerator, value.denominator)
+    elif isinstance(value, float):
+        return sympy.S.Zero if value == 0 else value
+    return sympy.Integer(value)
+
 
 class SummationCache(DefaultCache):
 
     name = "summation-cache"
+    # If true, polynomials are summed by the native engine (see polysum), otherwise all sums are computed by SymPy
+    native = True
 
     def __init__(self):
         self.lb = sympy.S("lb")
         self.ub = sympy.S("ub")
+        # Counts how often sums were evaluated numerically (compiled closed form) or symbolically (substitution)
+        self.numeric_calls = 0
+        self.symbolic_calls = 0
+        # Counts how many closed forms were computed natively (polynomials) or by SymPy
+        self.native_sums = 0
+        self.sympy_sums = 0
 
         def calculator(pool, var_node):
             """
@@ -32,15 +71,17 @@ class SummationCache(DefaultCache):
             if len(variables) == 0:
                 return lambda lb, ub: (ub - lb + 1) * float(expression)
 
+            polynomial = Polynomial.from_expression(expression) if self.native else None
+            if polynomial is not None:
+                self.native_sums += 1
+                return self._polynomial_closed_form(polynomial, variable)
+
             v = variables[variable] if variable in variables else sympy.S(variable)
-            # TODO add caching again
-            # TODO Deferred, only numeric / one call => directly
             try:
+                self.sympy_sums += 1
                 expression = sympy.expand(expression)
-                # print("Value at r=10 is {}".format(expression.subs({"r": 10})))
                 result = sympy.Sum(expression, (v, self.lb, self.ub)).doit()
-                # print("Symbolic sum of {} = {}".format(expression, result))
-                return lambda lb, ub: result.subs({self.lb: lb, self.ub: ub})
+                return self._closed_form(result)
             except sympy.BasePolynomialError as e:
                 print("Problem trying to sum the expression {} for variable {}"
                       .format(expression, v))
@@ -48,6 +89,118 @@ class SummationCache(DefaultCache):
 
         super(SummationCache, self).__init__(calculator)
 
+    def _polynomial_closed_form(self, polynomial, variable):
+        """
+        Sums a polynomial using the native summation engine (see polysum).  Numeric bounds are substituted in the closed
+        form (a polynomial in lb and ub), polynomial bounds are summed over directly and other bounds are substituted
+        symbolically.
+        :param Polynomial polynomial: The polynomial to sum
+        :param str variable: The variable to sum out
+        :return callable: A function that takes the lower and upper bound and returns the sum
+        """
+        closed = polynomial.sum(variable, Polynomial.variable(self.lb), Polynomial.variable(self.ub))
+        is_numeric = closed.variables <= {str(self.lb), str(self.ub)}
+
+        def evaluate(lb, ub):
+            if is_numeric and _is_finite_number(lb) and _is_finite_number(ub):
+                self.numeric_calls += 1
+                return _number(closed.evaluate({str(self.lb): _exact(lb), str(self.ub): _exact(ub)}))
+            self.symbolic_calls += 1
+            lb_polynomial, ub_polynomial = Polynomial.from_expression(lb), Polynomial.from_expression(ub)
+            if lb_polynomial is not None and ub_polynomial is not None:
+                return polynomial.sum(variable, lb_polynomial, ub_polynomial).to_sympy()
+            return closed.to_sympy().subs({self.lb: lb, self.ub: ub})
+
+        return evaluate
+
+    def _closed_form(self, result):
+        """
+        Compiles the closed form of a sum into a function of the bounds.  Numeric bounds are substituted in an exact
+        polynomial (if the closed form is exact) or a compiled numeric function (if it contains floats), other bounds
+        are substituted symbolically.
+        :param sympy.Basic result: The closed form (depending on lb and ub)
+        :return callable: A function that takes the lower and upper bound and returns the sum
+        """
+        def substitute(lb, ub):
+            self.symbolic_calls += 1
+            return result.subs({self.lb: lb, self.ub: ub})
+
+        if not result.free_symbols <= {self.lb, self.ub}:
+            return substitute
+
+        if len(result.atoms(sympy.Float)) == 0:
+            polynomial = Polynomial.from_expression(result)
+            if polynomial is None:
+                return substitute
+
+            def evaluate_exact(lb, ub):
+                if _is_finite_number(lb) and _is_finite_number(ub):
+                    self.numeric_calls += 1
+                    return _number(polynomial.evaluate({str(self.lb): _exact(lb), str(self.ub): _exact(ub)}))
+                return substitute(lb, ub)
+
+            return evaluate_exact
+
+        try:
+            numeric = sympy.lambdify((self.lb, self.ub), result, modules="math")
+        except Exception:
+            return substitute
+
+        def evaluate(lb, ub):
+            if _is_finite_number(lb) and _is_finite_number(ub):
+                try:
+                    value = _number(float(numeric(float(lb), float(ub))))
+                    self.numeric_calls += 1
+                    return value
+                except (ArithmeticError, TypeError, ValueError):
+                    pass
+            return substitute(lb, ub)
+
+        return evaluate
+
+    def statistics(self):
+        """
+        :return dict: The number of closed forms computed (misses) and reused (hits), the hit rate, the number of
+            sums evaluated numerically and symbolically and the number of closed forms computed natively and by SymPy
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / float(lookups) if lookups > 0 else 0.0,
+            "numeric_calls": self.numeric_calls,
+            "symbolic_calls": self.symbolic_calls,
+            "native_sums": self.native_sums,
+            "sympy_sums": self.sympy_sums,
+        }
+
+    def clear(self):
+        super(SummationCache, self).clear()
+        self.numeric_calls = 0
+        self.symbolic_calls = 0
+        self.native_sums = 0
+        self.sympy_sums = 0
+
+    @classmethod
+    def initialize(cls, pool):
+        if not pool.has_cache(cls.name):
+            pool.add_cache(cls.name, cls())
+
+
+class SumOutCache(DefaultCache):
+    """
+    Memoizes the result of summing out a variable from a diagram per (root node id, variable) for the whole pool, so
+    repeated summations of the same (sub-)diagrams are lookups.  Summation walkers store the results of all internal
+    nodes they reach with trivial bounds (see SummationWalker).
+    """
+
+    name = "sum-out-cache"
+    # If false, summation walkers neither use nor fill this cache
+    enabled = True
+
+    def __init__(self):
+        DefaultCache.__init__(self, lambda pool, key: SummationWalker(pool.diagram(key[0]), key[1]).walk())
+
     @classmethod
     def initialize(cls, pool):
         if not pool.has_cache(cls.name):
@@ -92,26 +245,51 @@ class SummationWalker(DownUpWalker):
         self.sum_cache = dict()
         self.recursion_cache = dict()
         SummationCache.initialize(diagram.pool)
+        SumOutCache.initialize(diagram.pool)
+        BoundSelectionCache.initialize(diagram.pool)
         self.conflicts = set()
         self.revisit = defaultdict(lambda: 0)
 
+    def _visit(self, node, message=None):
+        # Results of internal nodes reached with trivial bounds do not depend on the path, they are shared pool-wide
+        trivial = message is None or message == (-float("inf"), float("inf"), ())
+        if not SumOutCache.enabled or not trivial or self._diagram.pool.is_terminal_id(node.node_id):
+            return DownUpWalker._visit(self, node, message)
+        cache = self._diagram.pool.caches[SumOutCache.name]
+        key = (node.node_id, self.variable)
+        if cache.contains(key):
+            return cache.get(self._diagram.pool, key)
+        result = DownUpWalker._visit(self, node, message)
+        cache.store(key, result)
+        return result
+
     def visit_internal_down(self, internal_node, parent_message):
         # TODO Can cache if same ubs / lbs are passed to a node again (e.g. integrating out a non-existent variable)
-
+        true_message, false_message, maintained = self._split(internal_node.test, parent_message)
+        if maintained:
+            self.node_cache[internal_node.node_id] = internal_node.test
+        return true_message, false_message
+
+    def _split(self, test, parent_message):
+        """
+        Computes the messages passed to the children of a node with the given test
+        :return Tuple[tuple, tuple, bool]: The messages for the true and false child and whether the test is maintained
+            (True if the test does not include the variable)
+        """
         # Initialize bounds
         if parent_message is not None:
             lb, ub, bounds = parent_message
         else:
             lb, ub, bounds = -float("inf"), float("inf"), ()
 
-        operator = internal_node.test.operator.to_canonical() if isinstance(internal_node.test, LinearTest) else None
-        # expression = internal_node.test.expression
+        operator = test.operator.to_canonical() if isinstance(test, LinearTest) else None
+        # expression = test.expression
         if operator is not None:
             if operator.is_singular() and self.variable in operator.variables:
                 # Test on exactly the given variable: update bounds for the two children (node will be collapsed)
-                lb_t, ub_t = internal_node.test.update_bounds(self.variable, lb, ub, test=True)
-                lb_f, ub_f = internal_node.test.update_bounds(self.variable, lb, ub, test=False)
-                return (lb_t, ub_t, bounds), (lb_f, ub_f, bounds)
+                lb_t, ub_t = test.update_bounds(self.variable, lb, ub, test=True)
+                lb_f, ub_f = test.update_bounds(self.variable, lb, ub, test=False)
+                return (lb_t, ub_t, bounds), (lb_f, ub_f, bounds), False
 
             elif len(operator.variables) > 1 and self.variable in operator.variables:
                 # Test that includes the given variable and others: rewrite and pass both options (node will be collapsed)
@@ -130,21 +308,16 @@ class SummationWalker(DownUpWalker):
 
                 true_bound = (rewritten_positive.symbol, exp_pos)
                 false_bound = (rewritten_negative.symbol, exp_neg)
-                return (lb, ub, bounds + (true_bound,)), (lb, ub, bounds + (false_bound,))
+                return (lb, ub, bounds + (true_bound,)), (lb, ub, bounds + (false_bound,)), False
 
         # Test that does not include the given variable (node test will be maintained)
-        self.node_cache[internal_node.node_id] = internal_node.test
-        return (lb, ub, bounds), (lb, ub, bounds)
+        return (lb, ub, bounds), (lb, ub, bounds), True
 
     def visit_internal_aggregate(self, internal_node, true_result, false_result):
         pool = self._diagram.pool
         if internal_node.node_id in self.node_cache:
             # The node test is maintained and the two results become the new child nodes
-            test_node = pool.bool_test(self.node_cache[internal_node.node_id])
-            result = pool.apply(Summation,
-                                pool.apply(Multiplication, test_node, true_result),
-                                pool.apply(Multiplication, pool.invert(test_node), false_result))
-            return result
+            return pool.ite(pool.bool_test(self.node_cache[internal_node.node_id]), true_result, false_result)
 
         result = pool.apply(Summation, true_result, false_result)
         return result
@@ -192,66 +365,242 @@ class SummationWalker(DownUpWalker):
         # from pyxadd.timer import Timer
         # timer = Timer()
         # timer.start("Building terminal {}".format(terminal_node.node_id))
-        converted_terminal = self._build_terminal(terminal_node, 0, 1, lower_bounds, 0, 1, upper_bounds)
+        converted_terminal = self._build_terminal(terminal_node, lower_bounds, upper_bounds)
         # timer.stop()
         return converted_terminal
 
-    def _build_terminal(self, terminal_node, lb_i, lb_c, lower_bounds, ub_i, ub_c, upper_bounds):
+    def _build_terminal(self, terminal_node, lower_bounds, upper_bounds):
+        """
+        Builds the sum of the terminal for all combinations of lower and upper bounds, the tests that select the
+        largest lower and smallest upper bound are shared between terminals (see BoundSelectionCache)
+        """
         self.revisit[terminal_node.node_id] += 1
         pool = self._diagram.pool
         assert isinstance(pool, Pool)
-
-        # Check lower bounds
-        if lb_c == len(lower_bounds):
-            # Check upper bounds
-            if ub_c == len(upper_bounds):
-                lb = lower_bounds[lb_i]
-                ub = upper_bounds[ub_i]
-                import time
-                # result = sympy.nsimplify(sympy.Sum(sympy.nsimplify(expression), (self.variable, lb, ub)).doit())
-                node_id = terminal_node.node_id
-
-                # if isinstance(lb, float) and isinstance(ub, float):
-                #     print("Shortcut")
-                #     result = sympy.Sum(terminal_node.expression, (self.variable, lb, ub)).doit()
-                # else:
-                # hit = pool.is_cached(SummationCache.name, (self.variable, node_id))
-                f = pool.get_cached(SummationCache.name, (self.variable, node_id))
+        template = pool.get_cached(BoundSelectionCache.name, BoundSelectionCache.key(lower_bounds, upper_bounds))
+        f = pool.get_cached(SummationCache.name, (self.variable, terminal_node.node_id))
+
+        built = []
+        for entry in template:
+            if entry[0] == "select":
+                _, test, true_index, false_index = entry
+                built.append(_combine(pool, test, built[true_index], built[false_index]))
+            elif entry[0] == "sum":
+                _, lb, ub, integrity_check = entry
                 result = f(lb, ub)
-                # print(result)
-                if result == sympy.nan:
+                if result == sympy.nan or (isinstance(result, float) and math.isnan(result)):
                     raise RuntimeError("Result is nan: {} for lb={} and ub={}".format(terminal_node.expression, lb, ub))
-                # print("Leaf sum:", ("cached" if hit else "not cached"), (lb, ub), result)
-                # TODO: simplify result numerically??
+                node_id = pool.terminal(result)
+                if integrity_check is not None:
+                    node_id = pool.internal(integrity_check, node_id, pool.zero_id)
+                built.append(node_id)
+            else:
+                built.append(pool.zero_id)
+        return built[-1]
+
+
+def _combine(pool, test, child_true, child_false):
+    """
+    Builds "if test then child_true else child_false", directly as a node if the test precedes the tests of both
+    children and using ite otherwise
+    """
+    if child_true == child_false:
+        return child_true
+    test_id = pool.node_test_id(pool.bool_test(test))
+    for child in (child_true, child_false):
+        child_test_id = pool.node_test_id(child)
+        if child_test_id >= 0 and (child_test_id == test_id or not pool._test_id_smaller_eq(test_id, child_test_id)):
+            return pool.ite(pool.bool_test(test), child_true, child_false)
+    return pool.internal(test, child_true, child_false)
 
-                # print("SUM {} for x from {} to {} = {}".format(terminal_node.expression, lb, ub, result))
 
+class BoundSelectionCache(DefaultCache):
+    """
+    Caches the bound selection templates of SummationWalker per (sorted, filtered) lower and upper bounds.  A template
+    is a list of entries (in topological order, the root is last) that are either selection tests ("select", test,
+    true entry, false entry), sums over one pair of bounds ("sum", lb, ub, integrity check or None) or zero ("zero",).
+    """
+
+    name = "bound-selection-cache"
+
+    def __init__(self):
+        DefaultCache.__init__(self, lambda pool, key: BoundSelectionCache.template(*key))
+
+    @classmethod
+    def initialize(cls, pool):
+        if not pool.has_cache(cls.name):
+            pool.add_cache(cls.name, cls())
+
+    def node_references(self, key, value):
+        # Templates only consist of bounds and tests, integer bounds are not node ids
+        return []
+
+    @staticmethod
+    def key(lower_bounds, upper_bounds):
+        return tuple(sorted(lower_bounds, key=str)), tuple(sorted(upper_bounds, key=str))
+
+    @staticmethod
+    def template(lower_bounds, upper_bounds):
+        """
+        Builds the template that selects the largest lower bound and the smallest upper bound, the state (current
+        lower bound, next lower bound to compare, current upper bound, next upper bound to compare) of the selection
+        is memoized so equal sub-templates are shared
+        :param tuple lower_bounds: The lower bounds
+        :param tuple upper_bounds: The upper bounds
+        :rtype: list
+        """
+        entries = []
+        indices = dict()
+
+        def build(lb_i, lb_c, ub_i, ub_c):
+            state = (lb_i, lb_c, ub_i, ub_c)
+            if state in indices:
+                return indices[state]
+
+            if lb_c < len(lower_bounds):
+                # Add lower bound check
+                test = LinearTest(lower_bounds[lb_i], ">=", lower_bounds[lb_c])
+                children = (lb_i, lb_c + 1, ub_i, ub_c), (lb_c, lb_c + 1, ub_i, ub_c)
+            elif ub_c < len(upper_bounds):
+                # Add upper bound check
+                test = LinearTest(upper_bounds[ub_i], "<=", upper_bounds[ub_c])
+                children = (lb_i, lb_c, ub_i, ub_c + 1), (lb_i, lb_c, ub_c, ub_c + 1)
+            else:
+                lb, ub = lower_bounds[lb_i], upper_bounds[ub_i]
                 bound_integrity_check = LinearTest(lb, "<=", ub)
-                if bound_integrity_check.operator.is_tautology():
-                    return pool.terminal(result) if bound_integrity_check.evaluate({}) else pool.zero_id
+                if not bound_integrity_check.operator.is_tautology():
+                    entries.append(("sum", lb, ub, bound_integrity_check))
+                elif bound_integrity_check.evaluate({}):
+                    entries.append(("sum", lb, ub, None))
                 else:
-                    node_id = pool.bool_test(bound_integrity_check)
-                    return pool.apply(Multiplication, node_id, pool.terminal(result))
+                    entries.append(("zero",))
+                indices[state] = len(entries) - 1
+                return indices[state]
+
+            # FIXME TRANSITIVITY
+            if test.operator.is_tautology():
+                indices[state] = build(*children[0 if test.evaluate({}) else 1])
             else:
-                # Add upper bound check
-                test = LinearTest(upper_bounds[ub_i], "<=", upper_bounds[ub_c])
-                child_true = self._build_terminal(terminal_node, lb_i, lb_c, lower_bounds, ub_i, ub_c + 1, upper_bounds)
-                child_false = self._build_terminal(terminal_node, lb_i, lb_c, lower_bounds, ub_c, ub_c + 1, upper_bounds)
+                true_index, false_index = build(*children[0]), build(*children[1])
+                entries.append(("select", test, true_index, false_index))
+                indices[state] = len(entries) - 1
+            return indices[state]
 
-        # FIXME TRANSITIVITY
-        else:
-            # Add lower bound check
-            test = LinearTest(lower_bounds[lb_i], ">=", lower_bounds[lb_c])
-            child_true = self._build_terminal(terminal_node, lb_i, lb_c + 1, lower_bounds, ub_i, ub_c, upper_bounds)
-            child_false = self._build_terminal(terminal_node, lb_c, lb_c + 1, lower_bounds, ub_i, ub_c, upper_bounds)
+        build(0, 1, 0, 1)
+        return entries
+
+
+class ProductSummationWalker(SummationWalker):
+    """
+    Sums out a variable from the product of two diagrams in a single pass (a relational product, like AndExists for
+    BDDs).  Pairs of nodes are visited in test order (as by apply) while the bounds of the variable are passed down as
+    in SummationWalker, so only the leaves of the product are built.  Pairs with a zero operand or empty bounds are
+    not explored.
+    """
+    def __init__(self, diagram1, diagram2, variable):
+        SummationWalker.__init__(self, diagram1, variable)
+        self.diagram2 = diagram2
+
+    def walk(self):
+        self.message_cache = dict()
+        result = self._run((self._diagram.root_id, self.diagram2.root_id, None))
+        self.message_cache = None
+        return result
 
-        if test.operator.is_tautology():
-            return child_true if test.evaluate({}) else child_false
+    def _run(self, operands):
+        """
+        Visits all pairs using an explicit stack instead of recursion (see Pool._run), the true branch is visited first
+        :param tuple operands: The root ids of both diagrams and the initial message
+        :rtype: int
+        """
+        pool = self._diagram.pool
+        result, frame = self._step(*operands)
+        if frame is None:
+            return result
+
+        stack = [frame]
+        while len(stack) > 0:
+            frame = stack[-1]
+            phase = frame[5]
+            if phase == 0:
+                frame[5] = 1
+                result, sub_frame = self._step(*frame[2])
+            elif phase == 1:
+                frame[4] = result
+                frame[5] = 2
+                result, sub_frame = self._step(*frame[3])
+            else:
+                key, test, _, _, true_result, _, maintained = frame
+                if maintained:
+                    result = pool.ite(pool.bool_test(test), true_result, result)
+                else:
+                    result = pool.apply(Summation, true_result, result)
+                self.message_cache[key] = result
+                stack.pop()
+                continue
+            if sub_frame is not None:
+                stack.append(sub_frame)
+        return result
+
+    def _step(self, node_id1, node_id2, message):
+        """
+        Computes the result for a pair of nodes directly (cached, pruned or terminal) or returns a frame
+        [key, test, true_operands, false_operands, true_result, phase, maintained] for the pairs of children
+        :return Tuple[int|None, list|None]: The result or None and a frame or None
+        """
+        pool = self._diagram.pool
+        if node_id1 > node_id2:
+            node_id1, node_id2 = node_id2, node_id1
+        key = (node_id1, node_id2, message)
+        if key in self.message_cache:
+            return self.message_cache[key], None
+
+        if message is not None and message[0] > message[1]:
+            result = pool.zero_id
+        else:
+            product = Multiplication.compute_terminal(pool, pool.get_node(node_id1), pool.get_node(node_id2))
+            if product is None or not pool.is_terminal_id(product):
+                test_id1, test_id2 = pool.node_test_id(node_id1), pool.node_test_id(node_id2)
+                if test_id1 >= 0 and (test_id2 < 0 or pool._test_id_smaller_eq(test_id1, test_id2)):
+                    test_id = test_id1
+                else:
+                    test_id = test_id2
+                children1 = pool.node_children(node_id1) if test_id1 == test_id else (node_id1, node_id1)
+                children2 = pool.node_children(node_id2) if test_id2 == test_id else (node_id2, node_id2)
+                test = pool.get_test(test_id)
+                true_message, false_message, maintained = self._split(test, message)
+                return None, [key, test, (children1[0], children2[0], true_message),
+                              (children1[1], children2[1], false_message), None, 0, maintained]
+            result = self.visit_terminal(pool.get_node(product), message)
+        self.message_cache[key] = result
+        return result, None
+
+
+def multiply_sum_out(pool, root1, root2, variables, reducer=None, all_variables=None):
+    """
+    Computes the product of two diagrams and sums out the given variables without building the product: the first
+    integer variable is summed out during the multiplication (see ProductSummationWalker), the remaining variables are
+    summed out of the (typically much smaller) result
+    :param Pool pool: The pool
+    :param int root1: The root of the first diagram
+    :param int root2: The root of the second diagram
+    :param list variables: The variables to sum out
+    :param pyxadd.reduce.Reducer|None reducer: If given, used to reduce the diagram after every integer variable
+    :param list|None all_variables: The variables passed to the reducer
+    :return int: The root of the resulting diagram
+    """
+    variables = [str(v) for v in variables]
+    fused = [var for var in variables if pool.get_var_type(var) == "int"]
+    if len(fused) == 0:
+        return sum_out(pool, pool.apply(Multiplication, root1, root2), variables, reducer, all_variables)
 
-        test_node = pool.bool_test(test)
-        return pool.apply(Summation,
-                          pool.apply(Multiplication, test_node, child_true),
-                          pool.apply(Multiplication, pool.invert(test_node), child_false))
+    result_id = ProductSummationWalker(pool.diagram(root1), pool.diagram(root2), fused[0]).walk()
+    if reducer is not None:
+        result_id = reducer.reduce(result_id, all_variables)
+    remaining = [var for var in variables if var != fused[0]]
+    if len(remaining) == 0:
+        return result_id
+    return sum_out(pool, result_id, remaining, reducer, all_variables)
 
 
 def matrix_multiply(pool, root1, root2, variables):
@@ -264,7 +613,7 @@ def matrix_multiply(pool, root1, root2, variables):
     return sum_out(pool, pool.apply(Multiplication, root1, root2), variables)
 
 
-def matrix_multiply_reduced(pool, root1, root2, variables, reducer=None, all_variables=None):
+def matrix_multiply_reduced(pool, root1, root2, variables, reducer=None, all_variables=None, fused=False):
     """
     :type pool: Pool
     :type root1: int
@@ -272,14 +621,98 @@ def matrix_multiply_reduced(pool, root1, root2, variables, reducer=None, all_var
     :type variables: list
     :type reducer: pyxadd.reduce.Reducer|None
     :type all_variables: list|None
+    :param bool fused: If true, the product is not built (see multiply_sum_out)
     """
+    if fused:
+        return multiply_sum_out(pool, root1, root2, variables, reducer, all_variables)
     multiplied = pool.apply(Multiplication, root1, root2)
     if reducer is not None:
         multiplied = reducer.reduce(multiplied, all_variables)
     return sum_out(pool, multiplied, variables, reducer, all_variables)
 
 
-def sum_out(pool, root, variables, reducer=None, all_variables=None):
+def elimination_statistics(pool, root, variables):
+    """
+    Computes cheap statistics (from one pass over the reachable nodes) that estimate the cost of summing out variables
+    :param Pool pool: The pool
+    :param int root: The root of the diagram
+    :param List[str] variables: The variables to compute statistics for
+    :return dict: A mapping from every variable to a dictionary with the number of (distinct) tests mentioning it
+        ("tests"), the number of multi-variable tests mentioning it ("shared"), the other variables appearing in those
+        tests ("neighbors"), the number of pairs of neighbors that do not yet share a test ("fill") and its maximal
+        degree in the leaves ("degree", infinite if a leaf is not polynomial in the variable)
+    """
+    variables = [str(v) for v in variables]
+    statistics = {var: {"tests": 0, "shared": 0, "neighbors": set(), "fill": 0, "degree": 0} for var in variables}
+    connected = set()
+    test_ids = set()
+    for node_id in pool._mark([root]):
+        if pool.is_terminal_id(node_id):
+            expression = pool.get_node(node_id).expression
+            names = set(str(symbol) for symbol in expression.free_symbols) & set(variables)
+            if len(names) == 0:
+                continue
+            polynomial = Polynomial.from_expression(expression)
+            for var in names:
+                if polynomial is None:
+                    degree = float("inf")
+                else:
+                    degree = max(dict(monomial).get(var, 0) for monomial in polynomial.terms)
+                statistics[var]["degree"] = max(statistics[var]["degree"], degree)
+        else:
+            test_ids.add(pool.node_test_id(node_id))
+
+    for test_id in test_ids:
+        test_variables = set(pool.get_test(test_id).variables)
+        for var in test_variables:
+            connected |= set((var, other) for other in test_variables if other != var)
+            if var in statistics:
+                statistics[var]["tests"] += 1
+                if len(test_variables) > 1:
+                    statistics[var]["shared"] += 1
+                    statistics[var]["neighbors"] |= test_variables - {var}
+
+    for var in variables:
+        neighbors = sorted(statistics[var]["neighbors"])
+        statistics[var]["fill"] = sum(1 for i, v1 in enumerate(neighbors) for v2 in neighbors[i + 1:]
+                                      if (v1, v2) not in connected)
+    return statistics
+
+
+def choose_elimination_variable(pool, root, variables):
+    """
+    Chooses the variable to sum out next (min-fill heuristic): the variable whose elimination connects the fewest pairs
+    of unconnected variables, ties are broken by the number of variables it shares tests with, its leaf degree and the
+    number of tests mentioning it
+    :param Pool pool: The pool
+    :param int root: The root of the diagram
+    :param List[str] variables: The variables that remain to be summed out
+    :return Tuple[str, dict]: The chosen variable and its statistics
+    """
+    statistics = elimination_statistics(pool, root, variables)
+
+    def score(var):
+        s = statistics[var]
+        return s["fill"], len(s["neighbors"]), s["degree"], s["tests"], variables.index(var)
+
+    var = min(variables, key=score)
+    return var, statistics[var]
+
+
+def sum_out(pool, root, variables, reducer=None, all_variables=None, order=None):
+    """
+    Sums out the given variables
+    :param Pool pool: The pool
+    :param int root: The root of the diagram
+    :param list variables: The variables to sum out
+    :param pyxadd.reduce.Reducer|None reducer: If given, used to reduce the diagram after every integer variable
+    :param list|None all_variables: The variables passed to the reducer
+    :param str|None order: If None the variables are summed out in the given order, if "auto" the next variable is
+        chosen before every step based on the current diagram (see choose_elimination_variable)
+    :return int: The root of the resulting diagram
+    """
+    if order not in (None, "auto"):
+        raise RuntimeError("Unknown elimination order {}, expected None or 'auto'".format(order))
     variables = list(str(v) for v in variables)
     diagram = pool.diagram(root)
     result = diagram
@@ -289,7 +722,16 @@ def sum_out(pool, root, variables, reducer=None, all_variables=None):
     # per_var = timer.sub_time()
     # print(variables)
 
-    for var in variables:
+    remaining = list(variables)
+    chosen = []
+    while len(remaining) > 0:
+        if order == "auto":
+            var, statistics = choose_elimination_variable(pool, result.root_id, remaining)
+            size = len(pool._mark([result.root_id]))
+        else:
+            var = remaining[0]
+        remaining.remove(var)
+        chosen.append(var)
         # per_var.start("Summing out {}".format(var))
         v_type = pool.get_var_type(var)
         # print("Eliminate {} var {}".format(v_type, var))
@@ -308,6 +750,12 @@ def sum_out(pool, root, variables, reducer=None, all_variables=None):
             # from numpy import average
             # avg = average(walker.revisit.values())
             # print("Visits to {} nodes, total visits: {}, average: {}".format(len(walker.revisit), total, avg))
+        if order == "auto":
+            logger.info("Summed out %s (fill %s, neighbors %s, degree %s, tests %s): %s -> %s nodes", var,
+                        statistics["fill"], len(statistics["neighbors"]), statistics["degree"], statistics["tests"],
+                        size, len(pool._mark([result.root_id])))
+    if order == "auto":
+        logger.info("Elimination order: %s", ", ".join(chosen))
     # timer.start("Checking output")
     _check_output(diagram, result, variables)
     # timer.stop()
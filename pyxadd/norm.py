@@ -1,7 +1,6 @@
 import sympy
 
 from pyxadd.diagram import Diagram
-from pyxadd.operation import Summation, Multiplication
 from pyxadd.variables import VariableFinder
 from pyxadd.walk import BottomUpWalker
 
@@ -13,10 +12,7 @@ class SquareWalker(BottomUpWalker):
 
     def visit_internal(self, internal_node, true_message, false_message):
         pool = self._diagram.pool
-        test_node = pool.bool_test(internal_node.test)
-        return pool.apply(Summation,
-                          pool.apply(Multiplication, test_node, true_message),
-                          pool.apply(Multiplication, pool.invert(test_node), false_message))
+        return pool.ite(pool.bool_test(internal_node.test), true_message, false_message)
 
 
 class AbsoluteValueWalker(BottomUpWalker):
@@ -29,10 +25,7 @@ class AbsoluteValueWalker(BottomUpWalker):
 
     def visit_internal(self, internal_node, true_message, false_message):
         pool = self._diagram.pool
-        test_node = pool.bool_test(internal_node.test)
-        return pool.apply(Summation,
-                          pool.apply(Multiplication, test_node, true_message),
-                          pool.apply(Multiplication, pool.invert(test_node), false_message))
+        return pool.ite(pool.bool_test(internal_node.test), true_message, false_message)
 
 
 def norm(variables, diagram, l_norm=None):
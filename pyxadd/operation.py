@@ -1,4 +1,10 @@
+import sympy
+
+
 class Operation(object):
+    # Commutative operations share apply cache entries for both operand orders
+    commutative = False
+
     def __init__(self, symbol):
         self._symbol = symbol
 
@@ -18,6 +24,8 @@ class Operation(object):
 
 
 class Multiplication(Operation):
+    commutative = True
+
     def __init__(self):
         Operation.__init__(self, "*")
 
@@ -37,6 +45,8 @@ class Multiplication(Operation):
 
 
 class Summation(Operation):
+    commutative = True
+
     def __init__(self):
         Operation.__init__(self, "+")
 
@@ -44,10 +54,14 @@ class Summation(Operation):
     def compute_terminal(cls, pool, node1, node2):
         # TODO deal with NaN?
         from pyxadd.diagram import TerminalNode
+        infinities = (pool.pos_inf_id, pool.neg_inf_id)
         if node1.node_id == pool.zero_id:
             return node2.node_id
         elif node2.node_id == pool.zero_id:
             return node1.node_id
+        elif node1.node_id in infinities and node2.node_id in infinities and node1.node_id != node2.node_id:
+            # oo + -oo is undefined (independent of the operand order, the cache key is shared by both orders)
+            return pool.terminal(sympy.nan)
         elif node1.node_id == pool.pos_inf_id or node1.node_id == pool.neg_inf_id:
             return node1.node_id
         elif node2.node_id == pool.pos_inf_id or node2.node_id == pool.neg_inf_id:
@@ -59,6 +73,8 @@ class Summation(Operation):
 
 # TODO Review logical operations, is terminal correct? Seems to be missing edge cases
 class LogicalOr(Operation):
+    commutative = True
+
     def __init__(self):
         Operation.__init__(self, "|")
 
@@ -85,6 +101,8 @@ class LogicalOr(Operation):
 
 
 class LogicalAnd(Operation):
+    commutative = True
+
     def __init__(self):
         Operation.__init__(self, "&")
 
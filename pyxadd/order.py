@@ -2,7 +2,6 @@ from pyxadd.diagram import Pool, Diagram, InternalNode
 
 
 # TODO cache variables per node?
-from pyxadd.operation import Operation, Summation, Multiplication
 from pyxadd.walk import BottomUpWalker
 
 
@@ -34,10 +33,7 @@ class Order(BottomUpWalker):
         :type internal_node: InternalNode
         """
         pool = self.diagram.pool
-        true_test = pool.internal(internal_node.test, pool.terminal(1), pool.terminal(0))
-        false_test = pool.internal(internal_node.test, pool.terminal(0), pool.terminal(1))
-        return pool.apply(Summation, pool.apply(Multiplication, true_message, true_test),
-                              pool.apply(Multiplication, false_message, false_test))
+        return pool.ite(pool.bool_test(internal_node.test), true_message, false_message)
 
     def visit_terminal(self, terminal_node):
         """
@@ -0,0 +1,212 @@
+"""
+Native summation of polynomials over integer ranges.  Polynomials are stored sparsely as a mapping from monomials
+(sorted tuples of variable names and exponents) to coefficients (integers, fractions or floats).  Sums are computed in
+closed form using Faulhaber's formula, the coefficients of the power sums are computed once and kept in a table.
+"""
+
+from fractions import Fraction
+
+import sympy
+
+# Faulhaber coefficients per exponent p: the coefficients c_0, ..., c_{p+1} of 1^p + 2^p + ... + n^p = sum_i c_i n^i
+_faulhaber_table = []
+_bernoulli_numbers = [Fraction(1)]
+
+
+def _bernoulli(n):
+    """
+    :return Fraction: The n-th Bernoulli number (using the convention B_1 = +1/2)
+    """
+    while len(_bernoulli_numbers) <= n:
+        m = len(_bernoulli_numbers)
+        # sum_{k=0}^{m} C(m + 1, k) B_k = 0 (for B_1 = -1/2), the sign of B_1 is flipped afterwards
+        total = Fraction(0)
+        binomial = 1
+        for k in range(m):
+            b = -_bernoulli_numbers[k] if k == 1 else _bernoulli_numbers[k]
+            total += binomial * b
+            binomial = binomial * (m + 1 - k) // (k + 1)
+        value = -total / (m + 1)
+        _bernoulli_numbers.append(-value if m == 1 else value)
+    return _bernoulli_numbers[n]
+
+
+def faulhaber(p):
+    """
+    :param int p: The exponent
+    :return List[Fraction]: The coefficients c_0, ..., c_{p+1} of the power sum 1^p + 2^p + ... + n^p (a polynomial
+        in n)
+    """
+    while len(_faulhaber_table) <= p:
+        q = len(_faulhaber_table)
+        coefficients = [Fraction(0)] * (q + 2)
+        binomial = 1
+        for j in range(q + 1):
+            coefficients[q + 1 - j] = binomial * _bernoulli(j) / (q + 1)
+            binomial = binomial * (q + 1 - j) // (j + 1)
+        _faulhaber_table.append(coefficients)
+    return _faulhaber_table[p]
+
+
+def _multiply_monomials(monomial1, monomial2):
+    exponents = dict(monomial1)
+    for var, exponent in monomial2:
+        exponents[var] = exponents.get(var, 0) + exponent
+    return tuple(sorted(exponents.items()))
+
+
+class Polynomial(object):
+    def __init__(self, terms=None):
+        """
+        :param dict|None terms: A mapping from monomials (sorted tuples of (variable, exponent) pairs) to coefficients
+        """
+        self.terms = {monomial: c for monomial, c in (terms or dict()).items() if c != 0}
+
+    @staticmethod
+    def constant(value):
+        return Polynomial({(): value})
+
+    @staticmethod
+    def variable(name):
+        return Polynomial({((str(name), 1),): 1})
+
+    @property
+    def variables(self):
+        return set(var for monomial in self.terms for var, _ in monomial)
+
+    def __add__(self, other):
+        terms = dict(self.terms)
+        for monomial, c in other.terms.items():
+            terms[monomial] = terms.get(monomial, 0) + c
+        return Polynomial(terms)
+
+    def __sub__(self, other):
+        return self + other * Polynomial.constant(-1)
+
+    def __mul__(self, other):
+        terms = dict()
+        for monomial1, c1 in self.terms.items():
+            for monomial2, c2 in other.terms.items():
+                monomial = _multiply_monomials(monomial1, monomial2)
+                terms[monomial] = terms.get(monomial, 0) + c1 * c2
+        return Polynomial(terms)
+
+    def __pow__(self, exponent):
+        result = Polynomial.constant(1)
+        for _ in range(exponent):
+            result = result * self
+        return result
+
+    def __eq__(self, other):
+        return isinstance(other, Polynomial) and self.terms == other.terms
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "Polynomial({})".format(self.terms)
+
+    def power_sum(self, p):
+        """
+        :param int p: The exponent
+        :return Polynomial: The power sum 1^p + 2^p + ... + n^p with this polynomial substituted for n
+        """
+        result = Polynomial()
+        power = Polynomial.constant(1)
+        for c in faulhaber(p):
+            result += power * Polynomial.constant(c)
+            power = power * self
+        return result
+
+    def sum(self, var, lb, ub):
+        """
+        Sums this polynomial over all integer values of var from lb to ub (inclusive), computed in closed form as
+        sum_{var=lb}^{ub} var^p = F_p(ub) - F_p(lb - 1) where F_p is the p-th power sum
+        :param str var: The variable to sum out
+        :param Polynomial lb: The lower bound
+        :param Polynomial ub: The upper bound
+        :rtype: Polynomial
+        """
+        var = str(var)
+        # Group the terms by the exponent of var
+        groups = dict()
+        for monomial, c in self.terms.items():
+            exponent = dict(monomial).get(var, 0)
+            rest = tuple((v, e) for v, e in monomial if v != var)
+            groups.setdefault(exponent, dict())[rest] = c
+        below = lb - Polynomial.constant(1)
+        result = Polynomial()
+        for exponent, terms in groups.items():
+            result += Polynomial(terms) * (ub.power_sum(exponent) - below.power_sum(exponent))
+        return result
+
+    def evaluate(self, assignment):
+        """
+        :param dict assignment: A mapping from variable names to (numeric) values
+        :return: The value of the polynomial (exact if all values and coefficients are integers or fractions)
+        """
+        total = 0
+        for monomial, c in self.terms.items():
+            value = c
+            for var, exponent in monomial:
+                value *= assignment[var] ** exponent
+            total += value
+        return total
+
+    def to_sympy(self):
+        """
+        :rtype: sympy.Basic
+        """
+        def convert(c):
+            if isinstance(c, Fraction):
+                return sympy.Rational(c.numerator, c.denominator)
+            return sympy.sympify(c)
+
+        return sympy.Add(*[convert(c) * sympy.Mul(*[sympy.Symbol(var) ** e for var, e in monomial])
+                           for monomial, c in self.terms.items()])
+
+    @staticmethod
+    def from_expression(expression):
+        """
+        Converts a SymPy expression into a polynomial
+        :param sympy.Basic|int|float expression: The expression
+        :return Polynomial|None: The polynomial or None if the expression is not a polynomial (with numeric
+            coefficients and non-negative integer exponents)
+        """
+        expression = sympy.sympify(expression)
+        if expression.is_Symbol:
+            return Polynomial.variable(expression)
+        elif expression.is_Integer:
+            return Polynomial.constant(int(expression))
+        elif expression.is_Rational:
+            return Polynomial.constant(Fraction(int(expression.p), int(expression.q)))
+        elif expression.is_Float:
+            return Polynomial.constant(float(expression))
+        elif expression.is_Add or expression.is_Mul:
+            result = Polynomial.constant(0 if expression.is_Add else 1)
+            for arg in expression.args:
+                polynomial = Polynomial.from_expression(arg)
+                if polynomial is None:
+                    return None
+                result = result + polynomial if expression.is_Add else result * polynomial
+            return result
+        elif expression.is_Pow and expression.exp.is_Integer and expression.exp >= 0:
+            base = Polynomial.from_expression(expression.base)
+            return base ** int(expression.exp) if base is not None else None
+        return None
+
+
+def sum_expression(expression, var, lb, ub):
+    """
+    Sums an expression over all integer values of var from lb to ub (inclusive) in closed form
+    :param sympy.Basic expression: The expression
+    :param str var: The variable to sum out
+    :param sympy.Basic|int lb: The lower bound (a polynomial)
+    :param sympy.Basic|int ub: The upper bound (a polynomial)
+    :return Polynomial|None: The sum or None if the expression or bounds are not polynomials
+    """
+    polynomial = Polynomial.from_expression(expression)
+    lb, ub = Polynomial.from_expression(lb), Polynomial.from_expression(ub)
+    if polynomial is None or lb is None or ub is None:
+        return None
+    return polynomial.sum(var, lb, ub)
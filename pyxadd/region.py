@@ -0,0 +1,251 @@
+import numpy
+
+from pyxadd.evaluate import get_numpy_function
+from pyxadd.reduce import is_simple
+from pyxadd.test import BinaryTest
+
+# The maximal number of boxes stored in a leaf of the kd-tree
+LEAF_SIZE = 8
+
+# Batch lookups use a grid (cells between all box boundaries) if it has at most this many cells
+MAX_GRID_CELLS = 10 ** 6
+
+
+def _boxes(diagram, variables):
+    """
+    Enumerates the paths of a diagram with single-variable tests, propagating bounds along every path (like
+    SimpleBoundReducer).  Infeasible paths are pruned.
+    :return List[Tuple[List[float], List[float], int]]: The inclusive lower and upper bounds of every path and the leaf
+    """
+    pool = diagram.pool
+    positions = {var: i for i, var in enumerate(variables)}
+    is_int = [pool.get_var_type(var) in ("int", "bool") for var in variables]
+    infinite = float("inf")
+    boxes = []
+    stack = [(diagram.root_id, (-infinite,) * len(variables), (infinite,) * len(variables))]
+    while len(stack) > 0:
+        node_id, lower, upper = stack.pop()
+        if pool.is_terminal_id(node_id):
+            boxes.append((lower, upper, node_id))
+            continue
+        test = pool.get_test(pool.node_test_id(node_id))
+        var = test.variables[0]
+        i = positions[var]
+        for child, outcome in zip(pool.node_children(node_id), (True, False)):
+            if isinstance(test, BinaryTest):
+                value = 1 if outcome else 0
+                lb, ub = max(lower[i], value), min(upper[i], value)
+            elif is_int[i]:
+                lb, ub = test.integer_bounds(var, lower[i], upper[i], test=outcome)
+                lb, ub = float(lb), float(ub)
+            else:
+                lb, ub = test.update_bounds(var, lower[i], upper[i], test=outcome)
+                lb, ub = float(lb), float(ub)
+            if lb <= ub:
+                stack.append((child, lower[:i] + (lb,) + lower[i + 1:], upper[:i] + (ub,) + upper[i + 1:]))
+    return boxes
+
+
+class RegionIndex(object):
+    """
+    A diagram with only single-variable tests stored as a list of disjoint axis-aligned boxes (one per feasible path)
+    and the leaf reached for every box.  The boxes are indexed by a kd-tree in which every tree node stores the bounding
+    box of its boxes, boxes are split at the median lower bound along the dimension with most distinct lower bounds.
+    If all variables are integer (or boolean) and the grid is not too large, batch lookups use a grid instead: the
+    boundaries of all boxes divide every dimension into intervals, every cell of the grid lies within a single box.
+    """
+    def __init__(self, diagram, variables, lower, upper, leaves):
+        """
+        :param Diagram diagram: The diagram
+        :param List[str] variables: The variables (dimensions of the boxes)
+        :param numpy.ndarray lower: The inclusive lower bounds (boxes x variables)
+        :param numpy.ndarray upper: The inclusive upper bounds (boxes x variables)
+        :param numpy.ndarray leaves: The terminal node id of every box
+        """
+        self.diagram = diagram
+        self.variables = variables
+        self.lower = lower
+        self.upper = upper
+        self.leaves = leaves
+        self._tree_lower = []
+        self._tree_upper = []
+        self._tree_children = []
+        self._tree_items = []
+        self._build(numpy.arange(len(leaves)))
+        self._grid = self._build_grid()
+
+    @staticmethod
+    def from_diagram(diagram):
+        """
+        :param Diagram diagram: A diagram that only contains single-variable tests (see reduce.is_simple)
+        :rtype: RegionIndex
+        """
+        if not is_simple(diagram):
+            raise RuntimeError("Region indices require diagrams with single-variable tests only")
+        pool = diagram.pool
+        variables = set()
+        for node_id in pool._mark([diagram.root_id]):
+            if pool.is_terminal_id(node_id):
+                variables |= set(str(symbol) for symbol in pool.get_node(node_id).expression.free_symbols)
+            else:
+                variables |= set(pool.get_test(pool.node_test_id(node_id)).variables)
+        variables = sorted(variables)
+        boxes = _boxes(diagram, variables)
+        shape = (len(boxes), len(variables))
+        lower = numpy.array([box[0] for box in boxes], dtype=float).reshape(shape)
+        upper = numpy.array([box[1] for box in boxes], dtype=float).reshape(shape)
+        leaves = numpy.array([box[2] for box in boxes], dtype=int)
+        return RegionIndex(diagram, variables, lower, upper, leaves)
+
+    def _build(self, items):
+        """
+        Builds the kd-tree node for the given boxes (and its descendants)
+        :return int: The index of the tree node
+        """
+        index = len(self._tree_children)
+        self._tree_lower.append(self.lower[items].min(axis=0) if len(items) > 0 else self.lower.min(axis=0))
+        self._tree_upper.append(self.upper[items].max(axis=0) if len(items) > 0 else self.upper.max(axis=0))
+        self._tree_children.append(None)
+        self._tree_items.append(items)
+        if len(items) <= LEAF_SIZE or len(self.variables) == 0:
+            return index
+        lower = self.lower[items]
+        dimension = int(numpy.argmax([len(numpy.unique(lower[:, j])) for j in range(len(self.variables))]))
+        order = numpy.argsort(lower[:, dimension], kind="mergesort")
+        split = lower[order[len(order) // 2], dimension]
+        left, right = items[lower[:, dimension] < split], items[lower[:, dimension] >= split]
+        if len(left) == 0 or len(right) == 0:
+            return index
+        self._tree_children[index] = (self._build(left), self._build(right))
+        self._tree_items[index] = None
+        return index
+
+    def _build_grid(self):
+        """
+        :return Tuple[List[numpy.ndarray], numpy.ndarray]|None: The cell edges of every dimension and the box of every
+            cell (or None if the grid cannot be used)
+        """
+        pool = self.diagram.pool
+        if any(pool.get_var_type(var) not in ("int", "bool") for var in self.variables):
+            return None
+        edges = []
+        for j in range(len(self.variables)):
+            boundaries = numpy.concatenate([self.lower[:, j], self.upper[:, j] + 1])
+            edges.append(numpy.unique(boundaries[numpy.isfinite(boundaries)]))
+        if numpy.prod([len(e) + 1 for e in edges], dtype=float) > MAX_GRID_CELLS:
+            return None
+        # Every cell is represented by its smallest point, the unbounded first cell of a dimension by its first edge - 1
+        representatives = [numpy.concatenate([[e[0] - 1] if len(e) > 0 else [0], e]) for e in edges]
+        mesh = numpy.meshgrid(*representatives, indexing="ij")
+        points = numpy.column_stack([m.ravel() for m in mesh]) if len(mesh) > 0 else numpy.zeros((1, 0))
+        return edges, self._locate_tree(points)
+
+    def _contains(self, lower, upper, points):
+        return numpy.all((lower <= points) & (points <= upper), axis=-1)
+
+    def locate(self, values):
+        """
+        Finds the box containing every point (using the grid if possible, the kd-tree otherwise)
+        :param numpy.ndarray values: A matrix with one row per point and one column per variable (see variables)
+        :return numpy.ndarray: The index of the box containing every point (-1 if no box contains the point)
+        """
+        values = numpy.asarray(values, dtype=float)
+        if values.ndim != 2:
+            # Matrices are used as they are, so a matrix without columns (no variables) keeps its number of rows
+            values = values.reshape((-1, len(self.variables)))
+        if self._grid is None:
+            return self._locate_tree(values)
+        edges, table = self._grid
+        cells = numpy.zeros(len(values), dtype=int)
+        for j, e in enumerate(edges):
+            cells = cells * (len(e) + 1) + numpy.searchsorted(e, values[:, j], side="right")
+        return table[cells]
+
+    def _locate_tree(self, values):
+        boxes = numpy.full(len(values), -1, dtype=int)
+        stack = [(0, numpy.arange(len(values)))]
+        while len(stack) > 0:
+            tree_node, rows = stack.pop()
+            rows = rows[self._contains(self._tree_lower[tree_node], self._tree_upper[tree_node], values[rows])]
+            if len(rows) == 0:
+                continue
+            if self._tree_children[tree_node] is not None:
+                stack += [(child, rows) for child in self._tree_children[tree_node]]
+            else:
+                for box in self._tree_items[tree_node]:
+                    inside = self._contains(self.lower[box], self.upper[box], values[rows])
+                    boxes[rows[inside]] = box
+        return boxes
+
+    def lookup(self, assignment):
+        """
+        :param dict assignment: A mapping from variable names to values
+        :return int: The index of the box containing the given point (-1 if no box contains it)
+        """
+        return int(self.locate([[assignment[var] for var in self.variables]])[0])
+
+    def query(self, lower, upper):
+        """
+        Finds all boxes that intersect the given range
+        :param dict lower: The inclusive lower bound of every variable (missing variables are unbounded)
+        :param dict upper: The inclusive upper bound of every variable (missing variables are unbounded)
+        :return List[int]: The indices of the boxes intersecting the range (sorted)
+        """
+        lower = numpy.array([lower.get(var, -float("inf")) for var in self.variables], dtype=float)
+        upper = numpy.array([upper.get(var, float("inf")) for var in self.variables], dtype=float)
+
+        def intersects(box_lower, box_upper):
+            return numpy.all((box_lower <= upper) & (lower <= box_upper), axis=-1)
+
+        found = []
+        stack = [0]
+        while len(stack) > 0:
+            tree_node = stack.pop()
+            if not intersects(self._tree_lower[tree_node], self._tree_upper[tree_node]):
+                continue
+            if self._tree_children[tree_node] is not None:
+                stack += list(self._tree_children[tree_node])
+            else:
+                items = self._tree_items[tree_node]
+                found += list(items[intersects(self.lower[items], self.upper[items])])
+        return sorted(int(box) for box in found)
+
+    def region(self, box):
+        """
+        :param int box: The index of a box
+        :return Tuple[dict, sympy.Basic]: The bounds (lower, upper) of every variable and the expression of the box
+        """
+        bounds = {var: (self.lower[box, j], self.upper[box, j]) for j, var in enumerate(self.variables)}
+        return bounds, self.diagram.pool.get_node(int(self.leaves[box])).expression
+
+    def evaluate(self, columns):
+        """
+        :param dict columns: A mapping from variable names to (equally long) arrays of values
+        :return numpy.ndarray: The value of every row (points outside all boxes evaluate to NaN)
+        """
+        for var in self.variables:
+            if var not in columns:
+                raise RuntimeError("Missing values for variable {}".format(var))
+        size = len(next(iter(columns.values()))) if len(columns) > 0 else 1
+        values = numpy.zeros((size, len(self.variables)))
+        for j, var in enumerate(self.variables):
+            values[:, j] = columns[var]
+        boxes = self.locate(values)
+        results = numpy.full(size, numpy.nan)
+        found = boxes >= 0
+        leaves = numpy.full(size, -1, dtype=int)
+        leaves[found] = self.leaves[boxes[found]]
+        pool = self.diagram.pool
+        for node_id in numpy.unique(leaves[found]):
+            rows = numpy.flatnonzero(leaves == node_id)
+            names, f = get_numpy_function(pool, int(node_id))
+            results[rows] = f(*[values[rows, self.variables.index(name)] for name in names])
+        return results
+
+
+def region_index(diagram):
+    """
+    :param Diagram diagram: A diagram that only contains single-variable tests (see reduce.is_simple)
+    :rtype: RegionIndex
+    """
+    return RegionIndex.from_diagram(diagram)
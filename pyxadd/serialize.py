@@ -0,0 +1,419 @@
+"""
+Versioned binary serialization of pools.  The format consists of a fixed size header followed by flat sections of
+little-endian numbers:
+
+1) Strings (offsets and one UTF-8 blob), used for variable names
+2) Variables (name index and type code)
+3) Tests (kind code, right hand side, number of terms) and their terms (variable index and coefficient)
+4) The node table (test id, true child and false child per node id)
+5) Terminals (node ids, expression offsets and one blob of expressions encoded as prefix trees)
+6) Root ids
+
+Loading fills the node table directly, tests and expressions are rebuilt without parsing or canonicalization.
+"""
+
+import array
+import mmap
+import struct
+import sys
+
+import sympy
+
+from pyxadd.diagram import Pool, TerminalNode, _EMPTY, _TERMINAL
+from pyxadd.test import BinaryTest, LinearTest, Operator
+
+MAGIC = b"XADD"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHIIIIqIqI4q")
+
+_VAR_TYPES = ["int", "bool"]
+
+# Arrays are filled from raw bytes with frombytes (Python 3) or fromstring (Python 2)
+_array_from_bytes = array.array.frombytes if hasattr(array.array, "frombytes") else array.array.fromstring
+_SYMBOLS = ["<", "<=", ">", ">="]
+_BOOL_KIND = 0
+
+# Expression kinds, sums, products and powers use consecutive kinds starting at _ADD
+_NUMBER = 0
+_SYMBOL = 1
+_STRING = 2
+_ADD = 3
+_OPERATIONS = [sympy.Add, sympy.Mul, sympy.Pow]
+
+# Number kinds
+_INTEGER = 0
+_RATIONAL = 1
+_FLOAT = 2
+_POS_INF = 3
+_NEG_INF = 4
+
+_NUMBER_RECORD = struct.Struct("<bqq")
+_INT64_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+
+def _pack(code, values):
+    return struct.pack("<{}{}".format(len(values), code), *values)
+
+
+class _Reader(object):
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.offset = offset
+
+    def read(self, code, count):
+        fmt = "<{}{}".format(count, code)
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def read_column(self, count):
+        size = 8 * count
+        column = array.array("l")
+        if column.itemsize == 8 and sys.byteorder == "little":
+            raw = self.data[self.offset:self.offset + size]
+            _array_from_bytes(column, raw)
+            self.offset += size
+        else:
+            column.extend(self.read("q", count))
+        return column
+
+    def read_bytes(self, count):
+        raw = self.data[self.offset:self.offset + count]
+        self.offset += count
+        return raw
+
+
+def _encode_number(value):
+    if value == sympy.oo:
+        return _NUMBER_RECORD.pack(_POS_INF, 0, 0)
+    elif value == -sympy.oo:
+        return _NUMBER_RECORD.pack(_NEG_INF, 0, 0)
+    elif value.is_Integer and _INT64_RANGE[0] <= value <= _INT64_RANGE[1]:
+        return _NUMBER_RECORD.pack(_INTEGER, int(value), 0)
+    elif value.is_Rational and not value.is_Integer and _INT64_RANGE[0] <= value.p <= _INT64_RANGE[1] \
+            and value.q <= _INT64_RANGE[1]:
+        return _NUMBER_RECORD.pack(_RATIONAL, int(value.p), int(value.q))
+    elif value.is_Float:
+        bits = struct.unpack("<q", struct.pack("<d", float(value)))[0]
+        return _NUMBER_RECORD.pack(_FLOAT, bits, 0)
+    return None
+
+
+def _decode_number(reader):
+    kind, a, b = _NUMBER_RECORD.unpack_from(reader.data, reader.offset)
+    reader.offset += _NUMBER_RECORD.size
+    if kind == _INTEGER:
+        return sympy.Integer(a)
+    elif kind == _RATIONAL:
+        return sympy.Rational(a, b)
+    elif kind == _FLOAT:
+        return sympy.Float(struct.unpack("<d", struct.pack("<q", a))[0])
+    elif kind == _POS_INF:
+        return sympy.oo
+    elif kind == _NEG_INF:
+        return -sympy.oo
+    raise RuntimeError("Unknown number kind {}".format(kind))
+
+
+def _encode_tree(expression, string_index):
+    if expression.is_Number:
+        number = _encode_number(expression)
+        if number is not None:
+            return [struct.pack("<b", _NUMBER), number]
+    elif expression.is_Symbol:
+        return [struct.pack("<bi", _SYMBOL, string_index(expression.name))]
+    elif expression.func in _OPERATIONS:
+        encoded = [struct.pack("<bI", _OPERATIONS.index(expression.func) + _ADD, len(expression.args))]
+        for arg in expression.args:
+            encoded += _encode_tree(arg, string_index)
+        return encoded
+    string = sympy.srepr(expression).encode("utf-8")
+    return [struct.pack("<bI", _STRING, len(string)), string]
+
+
+def _encode_expression(expression, string_index, strings):
+    """
+    Encodes an expression as a tree of numbers, symbols, sums, products and powers in prefix order.  Other
+    sub-expressions, or expressions that could not be rebuilt exactly, are stored as srepr strings.
+    :param sympy.Basic expression: The expression
+    :param callable string_index: Returns the string table index of a variable name
+    :param List[str] strings: The string table
+    :rtype: bytes
+    """
+    encoded = b"".join(_encode_tree(expression, string_index))
+    if _decode_expression(_Reader(encoded), strings) == expression:
+        return encoded
+    string = sympy.srepr(expression).encode("utf-8")
+    return struct.pack("<bI", _STRING, len(string)) + string
+
+
+def _decode_expression(reader, strings):
+    kind = reader.read("b", 1)[0]
+    if kind == _NUMBER:
+        return _decode_number(reader)
+    elif kind == _SYMBOL:
+        return sympy.Symbol(strings[reader.read("i", 1)[0]])
+    elif kind == _STRING:
+        length = reader.read("I", 1)[0]
+        return sympy.sympify(reader.read_bytes(length).decode("utf-8"))
+    elif _ADD <= kind < _ADD + len(_OPERATIONS):
+        count = reader.read("I", 1)[0]
+        return _OPERATIONS[kind - _ADD](*[_decode_expression(reader, strings) for _ in range(count)])
+    raise RuntimeError("Unknown expression kind {}".format(kind))
+
+
+def _as_float(value, test):
+    converted = float(value)
+    if converted != value:
+        raise RuntimeError("Cannot serialize test {}, value {} is not a float".format(test, value))
+    return converted
+
+
+def write(pool, node_ids=None, roots=()):
+    """
+    Serializes (a part of) the given pool
+    :param Pool pool: The pool
+    :param List[int]|None node_ids: The ids of the nodes to include (None for all nodes), must be closed under
+        children.  If given, nodes and tests are renumbered densely (in the given order, which must list children
+        before parents) and the roots are renumbered accordingly.
+    :param iterable roots: Root ids to store
+    :rtype: bytes
+    """
+    if node_ids is None:
+        test_ids = list(range(len(pool._test_list)))
+        mapping = None
+        test_column, true_column, false_column = pool._test_column, pool._true_column, pool._false_column
+    else:
+        test_ids = sorted(set(pool._test_column[node_id] for node_id in node_ids
+                              if pool._test_column[node_id] >= 0))
+        test_mapping = {test_id: i for i, test_id in enumerate(test_ids)}
+        test_mapping[_TERMINAL] = _TERMINAL
+        mapping = {node_id: i + 1 for i, node_id in enumerate(node_ids)}
+        mapping[0] = 0
+        test_column = [_EMPTY] + [test_mapping[pool._test_column[node_id]] for node_id in node_ids]
+        true_column = [0] + [mapping[pool._true_column[node_id]] for node_id in node_ids]
+        false_column = [0] + [mapping[pool._false_column[node_id]] for node_id in node_ids]
+
+    def renumber(node_id):
+        return node_id if mapping is None else mapping.get(node_id, 0)
+
+    strings = []
+    string_indices = dict()
+
+    def string_index(string):
+        if string not in string_indices:
+            string_indices[string] = len(strings)
+            strings.append(string)
+        return string_indices[string]
+
+    variables = sorted(pool.vars.items())
+    var_section = _pack("i", [value for name, v_type in variables
+                              for value in (string_index(name), _VAR_TYPES.index(v_type))])
+
+    kinds, right_hand_sides, term_counts, term_vars, term_coefficients = [], [], [], [], []
+    for test_id in test_ids:
+        test = pool.get_test(test_id)
+        if isinstance(test, BinaryTest):
+            kinds.append(_BOOL_KIND)
+            right_hand_sides.append(0.0)
+            term_counts.append(1)
+            term_vars.append(string_index(str(test.var)))
+            term_coefficients.append(1.0)
+        elif isinstance(test, LinearTest):
+            operator = test.operator
+            kinds.append(_SYMBOLS.index(operator.symbol) + 1)
+            right_hand_sides.append(_as_float(operator.rhs, test))
+            term_counts.append(len(operator.lhs))
+            for var in sorted(operator.lhs):
+                term_vars.append(string_index(var))
+                term_coefficients.append(_as_float(operator.lhs[var], test))
+        else:
+            raise RuntimeError("Cannot serialize test {} of type {}".format(test, type(test)))
+
+    terminal_ids = sorted(pool._terminals) if node_ids is None else \
+        [node_id for node_id in node_ids if pool._test_column[node_id] == _TERMINAL]
+    expressions = [_encode_expression(pool._terminals[node_id].expression, string_index, strings)
+                   for node_id in terminal_ids]
+    expression_offsets = [0]
+    for encoded in expressions:
+        expression_offsets.append(expression_offsets[-1] + len(encoded))
+
+    encoded_strings = [string.encode("utf-8") for string in strings]
+    string_offsets = [0]
+    for encoded in encoded_strings:
+        string_offsets.append(string_offsets[-1] + len(encoded))
+
+    constants = [renumber(getattr(pool, name, 0)) for name in ("zero_id", "one_id", "pos_inf_id", "neg_inf_id")]
+    roots = [renumber(root_id) for root_id in roots]
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(strings), len(variables), len(test_ids), len(term_vars),
+                          len(test_column), len(terminal_ids), expression_offsets[-1], len(roots), *constants)
+    return b"".join([
+        header,
+        _pack("I", string_offsets), b"".join(encoded_strings),
+        var_section,
+        _pack("b", kinds), _pack("d", right_hand_sides), _pack("i", term_counts),
+        _pack("i", term_vars), _pack("d", term_coefficients),
+        _pack("q", test_column), _pack("q", true_column), _pack("q", false_column),
+        _pack("q", [renumber(node_id) for node_id in terminal_ids]), _pack("Q", expression_offsets),
+        b"".join(expressions),
+        _pack("q", roots),
+    ])
+
+
+def read(data):
+    """
+    Deserializes a pool
+    :param data: The serialized pool (bytes, or any buffer such as an mmap)
+    :return Tuple[Pool, List[int]]: The pool and the stored root ids
+    """
+    if len(data) < _HEADER.size:
+        raise RuntimeError("Invalid pool data, too short")
+    header = _HEADER.unpack_from(data, 0)
+    magic, version = header[0], header[1]
+    if magic != MAGIC:
+        raise RuntimeError("Invalid pool data, magic number {!r} does not match {!r}".format(magic, MAGIC))
+    if version != VERSION:
+        raise RuntimeError("Unsupported pool format version {} (supported: {})".format(version, VERSION))
+    string_count, var_count, test_count, term_count, node_count, terminal_count, expression_size, root_count = \
+        header[3:11]
+    constants = header[11:]
+    reader = _Reader(data, _HEADER.size)
+
+    string_offsets = reader.read("I", string_count + 1)
+    blob = reader.read_bytes(string_offsets[-1])
+    strings = [blob[string_offsets[i]:string_offsets[i + 1]].decode("utf-8") for i in range(string_count)]
+
+    pool = Pool(empty=True)
+    var_section = reader.read("i", 2 * var_count)
+    for i in range(var_count):
+        pool.add_var(strings[var_section[2 * i]], _VAR_TYPES[var_section[2 * i + 1]])
+
+    kinds = reader.read("b", test_count)
+    right_hand_sides = reader.read("d", test_count)
+    term_counts = reader.read("i", test_count)
+    term_vars = reader.read("i", term_count)
+    term_coefficients = reader.read("d", term_count)
+    position = 0
+    for kind, rhs, count in zip(kinds, right_hand_sides, term_counts):
+        if kind == _BOOL_KIND:
+            test = BinaryTest(strings[term_vars[position]])
+        else:
+            lhs = {strings[term_vars[j]]: term_coefficients[j] for j in range(position, position + count)}
+            test = LinearTest(Operator.constructors[_SYMBOLS[kind - 1]](lhs, rhs))
+        position += count
+        pool._tests[test] = len(pool._test_list)
+        pool._test_list.append(test)
+
+    pool._test_column = reader.read_column(node_count)
+    pool._true_column = reader.read_column(node_count)
+    pool._false_column = reader.read_column(node_count)
+    pool._counter = node_count
+
+    terminal_ids = reader.read("q", terminal_count)
+    expression_offsets = reader.read("Q", terminal_count + 1)
+    expression_reader = _Reader(data, reader.offset)
+    for node_id in terminal_ids:
+        expression = _decode_expression(expression_reader, strings)
+        pool._terminals[node_id] = TerminalNode(node_id, expression, pool.expression_cache, pool)
+        pool._expressions[expression] = node_id
+    reader.offset += expression_size
+
+    test_column, true_column, false_column = pool._test_column, pool._true_column, pool._false_column
+    pool._internal_map = {(test_column[i], true_column[i], false_column[i]): i
+                          for i in range(1, node_count) if test_column[i] >= 0}
+
+    for name, node_id in zip(("zero_id", "one_id", "pos_inf_id", "neg_inf_id"), constants):
+        if node_id > 0:
+            setattr(pool, name, node_id)
+    roots = list(reader.read("q", root_count))
+    return pool, roots
+
+
+def export_subpool(pool, roots):
+    """
+    Serializes only the nodes reachable from the given roots (and the tests and variables they use)
+    :param Pool pool: The pool
+    :param iterable roots: The root ids
+    :rtype: bytes
+    """
+    roots = list(roots)
+    # Children are always created before their parents, so sorting the ids yields a topological order
+    return write(pool, sorted(pool._mark(roots)), roots)
+
+
+def _precedes(pool, test_id, node_id):
+    child_test_id = pool._test_column[node_id]
+    return child_test_id < 0 or (test_id != child_test_id and pool._test_id_smaller_eq(test_id, child_test_id))
+
+
+def import_subpool(pool, data):
+    """
+    Merges a sub-pool (see export_subpool) into the given pool.  Variables, tests and nodes are mapped onto existing
+    ones where possible.  Nodes whose test does not precede the tests of their children in the order of the target
+    pool are rebuilt using if-then-else, so the imported diagrams are always ordered.
+    :param Pool pool: The target pool
+    :param data: The serialized sub-pool (bytes or a buffer)
+    :return List[int]: The ids of the roots in the target pool
+    """
+    source, roots = read(data)
+    for name, v_type in source.vars.items():
+        pool.add_var(name, v_type)
+    test_ids = [pool._add_test(test) for test in source._test_list]
+
+    mapping = dict()
+    for node_id in range(1, source._counter):
+        test_id = source._test_column[node_id]
+        if test_id == _TERMINAL:
+            mapping[node_id] = pool.terminal(source._terminals[node_id].expression)
+        elif test_id >= 0:
+            test_id = test_ids[test_id]
+            child_true = mapping[source._true_column[node_id]]
+            child_false = mapping[source._false_column[node_id]]
+            if _precedes(pool, test_id, child_true) and _precedes(pool, test_id, child_false):
+                mapping[node_id] = pool._internal_by_test_id(test_id, child_true, child_false)
+            else:
+                test_node = pool._internal_by_test_id(test_id, pool.one_id, pool.zero_id)
+                mapping[node_id] = pool.ite(test_node, child_true, child_false)
+    return [mapping[root_id] for root_id in roots]
+
+
+def dumps(pool):
+    """
+    Serializes the given pool (node ids are preserved)
+    :param Pool pool: The pool
+    :rtype: bytes
+    """
+    return write(pool)
+
+
+def loads(data):
+    """
+    :param data: The serialized pool (bytes or a buffer)
+    :rtype: Pool
+    """
+    return read(data)[0]
+
+
+def dump(pool, path):
+    """
+    Writes the given pool to a file
+    :param Pool pool: The pool
+    :param str path: The file path
+    """
+    with open(path, "wb") as stream:
+        stream.write(dumps(pool))
+
+
+def load(path):
+    """
+    Reads a pool from a file using mmap
+    :param str path: The file path
+    :rtype: Pool
+    """
+    with open(path, "rb") as stream:
+        data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return loads(data)
+        finally:
+            data.close()
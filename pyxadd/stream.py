@@ -0,0 +1,143 @@
+"""
+Streaming evaluation of large input files.  Inputs are read in chunks (CSV files line by line, NumPy files as memory
+maps), every chunk is evaluated in batch and the results are written (or yielded) incrementally, so the memory used
+only depends on the chunk size.
+"""
+
+import itertools
+import os
+import struct
+
+import numpy
+
+from pyxadd.evaluate import evaluate_arrays, ParallelEvaluator
+
+# The number of rows read and evaluated at once
+DEFAULT_CHUNK_SIZE = 100000
+
+# Output .npy files are written with a fixed size header, the number of rows is filled in when the file is closed
+_NPY_HEADER_SIZE = 128
+
+
+def read_csv_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, delimiter=","):
+    """
+    Reads a CSV file with a header row (the variable names) and numeric values (booleans as 0 and 1)
+    :param str path: The path of the CSV file
+    :param int chunk_size: The number of rows per chunk
+    :param str delimiter: The delimiter
+    :return iterable[dict]: Mappings from variable names to arrays of values (one per chunk)
+    """
+    with open(path) as f:
+        header = f.readline()
+        variables = [name.strip() for name in header.strip().split(delimiter)]
+        while True:
+            lines = [line for line in itertools.islice(f, chunk_size) if line.strip() != ""]
+            if len(lines) == 0:
+                break
+            values = numpy.loadtxt(lines, delimiter=delimiter, ndmin=2)
+            if values.shape[1] != len(variables):
+                raise RuntimeError("Expected {} values per row, found {}".format(len(variables), values.shape[1]))
+            yield {var: values[:, j] for j, var in enumerate(variables)}
+
+
+def read_npy_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, variables=None):
+    """
+    Reads a NumPy file as a memory map, only one chunk is loaded at a time
+    :param str path: The path of the .npy file, containing either a structured array (the field names are the
+        variables) or a two-dimensional array (one column per variable)
+    :param int chunk_size: The number of rows per chunk
+    :param List[str]|None variables: The variables of the columns (required for two-dimensional arrays)
+    :return iterable[dict]: Mappings from variable names to arrays of values (one per chunk)
+    """
+    data = numpy.load(path, mmap_mode="r")
+    if data.dtype.names is not None:
+        variables = list(data.dtype.names) if variables is None else variables
+        columns = {var: data[var] for var in variables}
+    elif data.ndim == 2 and variables is not None and len(variables) == data.shape[1]:
+        columns = {var: data[:, j] for j, var in enumerate(variables)}
+    else:
+        raise RuntimeError("Expected a structured array or a two-dimensional array with one column per variable")
+    for start in range(0, len(data), chunk_size):
+        yield {var: numpy.array(values[start:start + chunk_size]) for var, values in columns.items()}
+
+
+def read_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, variables=None, delimiter=","):
+    """
+    Reads a CSV (.csv) or NumPy (.npy) file in chunks, see read_csv_chunks and read_npy_chunks
+    :return iterable[dict]: Mappings from variable names to arrays of values (one per chunk)
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return read_npy_chunks(path, chunk_size, variables)
+    elif extension in (".csv", ".txt"):
+        return read_csv_chunks(path, chunk_size, delimiter)
+    raise RuntimeError("Unsupported input format {}, expected .csv, .txt or .npy".format(extension))
+
+
+def evaluate_stream(diagram, chunks, workers=None):
+    """
+    Evaluates a stream of chunks
+    :param Diagram diagram: The diagram to evaluate
+    :param iterable[dict] chunks: Mappings from variable names to arrays of values
+    :param int|None workers: If given, chunks are evaluated by this many worker processes (see ParallelEvaluator)
+    :return iterable[numpy.ndarray]: The results of every chunk (in order)
+    """
+    if workers is None:
+        for columns in chunks:
+            yield evaluate_arrays(diagram, columns)
+    else:
+        evaluator = ParallelEvaluator(diagram, workers)
+        try:
+            for results in evaluator.evaluate_chunks(chunks):
+                yield results
+        finally:
+            evaluator.close()
+
+
+def _npy_header(count):
+    header = "{{'descr': '<f8', 'fortran_order': False, 'shape': ({},), }}".format(count)
+    header = header.ljust(_NPY_HEADER_SIZE - 10 - 1) + "\n"
+    return numpy.lib.format.magic(1, 0) + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def write_results(results, path):
+    """
+    Writes a stream of results to a NumPy (.npy) or text file (one value per line)
+    :param iterable[numpy.ndarray] results: The results of every chunk
+    :param str path: The output path
+    :return int: The number of results written
+    """
+    count = 0
+    if os.path.splitext(path)[1].lower() == ".npy":
+        with open(path, "wb") as f:
+            f.write(_npy_header(count))
+            for chunk in results:
+                f.write(numpy.asarray(chunk, dtype="<f8").tobytes())
+                count += len(chunk)
+            f.seek(0)
+            f.write(_npy_header(count))
+    else:
+        with open(path, "w") as f:
+            for chunk in results:
+                numpy.savetxt(f, chunk)
+                count += len(chunk)
+    return count
+
+
+def evaluate_file(diagram, input_path, output_path=None, chunk_size=DEFAULT_CHUNK_SIZE, variables=None, delimiter=",",
+                  workers=None):
+    """
+    Evaluates all rows of an input file chunk by chunk
+    :param Diagram diagram: The diagram to evaluate
+    :param str input_path: A CSV (.csv, .txt) or NumPy (.npy) file (see read_chunks)
+    :param str|None output_path: The output file (.npy or text), if None the results are returned as a generator
+    :param int chunk_size: The number of rows per chunk
+    :param List[str]|None variables: The variables of the columns (for two-dimensional .npy files)
+    :param str delimiter: The delimiter of CSV files
+    :param int|None workers: If given, chunks are evaluated by this many worker processes
+    :return int|iterable[numpy.ndarray]: The number of rows evaluated or a generator of results per chunk
+    """
+    results = evaluate_stream(diagram, read_chunks(input_path, chunk_size, variables, delimiter), workers)
+    if output_path is None:
+        return results
+    return write_results(results, output_path)
@@ -1,3 +1,5 @@
+import math
+
 import sympy
 import re
 
@@ -88,6 +90,36 @@ class Operator:
     def _update_bounds(self, lb, ub):
         raise NotImplementedError()
 
+    def integer_bounds(self, var, lb, ub):
+        """
+        Updates the bounds of an integer variable: the bound c * var [op] rhs is divided by c (flipping the operator
+        if c is negative) and rounded to the nearest integer within the bound, taking strictness into account
+        :param str var: The (only) variable of this operator
+        :param lb: The current (inclusive) lower bound (an integer or -infinity, None for no bound)
+        :param ub: The current (inclusive) upper bound (an integer or infinity, None for no bound)
+        :return Tuple: The updated (inclusive) integer bounds
+        """
+        if len(self.variables) != 1:
+            raise RuntimeError("Test does not have exactly one variable (it has {})".format(self.variables))
+        lb = -sympy.oo if lb is None else lb
+        ub = sympy.oo if ub is None else ub
+        coefficient = self.coefficient(var, force=True)
+        symbol = self.symbol
+        if coefficient < 0:
+            symbol = {"<": ">", ">": "<", "<=": ">=", ">=": "<="}[symbol]
+        bound = self.rhs / float(coefficient)
+        if abs(bound - round(bound)) < 10 ** -9:
+            # Avoid rounding errors of the division for integral bounds
+            bound = round(bound)
+        if symbol == "<=":
+            return lb, min(ub, int(math.floor(bound)))
+        elif symbol == "<":
+            return lb, min(ub, int(math.ceil(bound)) - 1)
+        elif symbol == ">=":
+            return max(lb, int(math.ceil(bound))), ub
+        else:
+            return max(lb, int(math.floor(bound)) + 1), ub
+
     def to_canonical(self):
         """
         Returns a canonical form of the operator, i.e. rewrites it as a weak inequality (<=)
@@ -490,6 +522,21 @@ class LinearTest(Test):
         else:
             return self._negated_operator.update_bounds(var, lb, ub)
 
+    def integer_bounds(self, var, lb, ub, test=True):
+        """
+        Updates the bounds of an integer variable for the given outcome of this test (see Operator.integer_bounds)
+        :param str var: The variable
+        :param lb: The current (inclusive) lower bound
+        :param ub: The current (inclusive) upper bound
+        :param bool test: The outcome of this test
+        :return Tuple: The updated (inclusive) integer bounds
+        """
+        if len(self.operator.variables) != 1:
+            raise RuntimeError("Test does not have exactly one variable (it has {})".format(self.operator.variables))
+        if var not in self.operator.variables:
+            return lb, ub
+        return (self.operator if test else self._negated_operator).integer_bounds(var, lb, ub)
+
     def evaluate(self, assignment):
         return self.operator.evaluate(assignment)
 
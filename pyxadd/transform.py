@@ -1,7 +1,6 @@
-import numpy
 from pyxadd.bounds import get_bounds
 from pyxadd.build import Builder
-from pyxadd.matrix.matrix import assignments
+from pyxadd.ground import ground
 from pyxadd.reduce import LinearReduction
 from pyxadd.test import LinearTest
 from pyxadd.walk import DownUpWalker
@@ -78,10 +77,7 @@ def to_constant(diagram):
 
 
 def to_ground_tensor(diagram, bounds):
-    tensor = numpy.empty(shape=tuple(ub - lb + 1 for _, lb, ub in bounds))
-    for a in assignments(bounds):
-        tensor.itemset(tuple(a[t[0]] - t[1] for t in bounds), diagram.evaluate(a))
-    return tensor
+    return ground(diagram, bounds)
 
 # TODO Substitute bottom up
 
@@ -150,33 +150,27 @@ class DownUpWalker(Walker):
             raise RuntimeError("Unexpected node type {}.".format(type(node)))
 
 
-class ParentsWalker(DepthFirstUniqueWalker):
-    def __init__(self, diagram):
-        DepthFirstUniqueWalker.__init__(self, diagram)
-        self._nodes = None
-
+class ParentsWalker(Walker):
     def walk(self):
-        self._nodes = {self._diagram.root_node.node_id: set()}
-        DepthFirstUniqueWalker.walk(self)
-        nodes = self._nodes
-        self._nodes = None
+        """
+        Finds the parents of every node, reading the node table of the pool directly
+        :return dict: A dictionary mapping every node id to the set of its parent ids
+        """
+        pool = self._diagram.pool
+        root_id = self._diagram.root_id
+        nodes = {root_id: set()}
+        stack = [root_id]
+        while len(stack) > 0:
+            node_id = stack.pop()
+            if pool.is_terminal_id(node_id):
+                continue
+            for child_id in pool.node_children(node_id):
+                if child_id not in nodes:
+                    nodes[child_id] = set()
+                    stack.append(child_id)
+                nodes[child_id].add(node_id)
         return nodes
 
-    def visit_internal(self, internal_node, parent_message):
-        self._update_parents(internal_node, parent_message)
-        return internal_node.node_id, internal_node.node_id
-
-    def visit_terminal(self, terminal_node, parent_message):
-        self._update_parents(terminal_node, parent_message)
-
-    def _update_parents(self, internal_node, parent):
-        if parent is not None:
-            if internal_node.node_id not in self._nodes:
-                self._nodes[internal_node.node_id] = set()
-            if parent in self._nodes[internal_node.node_id]:
-                print("Already included as parent...")
-            self._nodes[internal_node.node_id].add(parent)
-
 
 class WalkingProfile:
     def __init__(self, diagram):
@@ -239,6 +233,7 @@ class WalkingProfile:
 
     @staticmethod
     def extract_layers(diagram, parents):
+        pool = diagram.pool
         root_id = diagram.root_node.node_id
         positions = {root_id: 0}
         watch = [root_id]
@@ -247,9 +242,8 @@ class WalkingProfile:
             current_parents = parents[current_id]
             if not len(current_parents) == 0:
                 raise RuntimeError("Parents not empty, found {}.".format(current_parents))
-            current_node = diagram.node(current_id)
-            if isinstance(current_node, InternalNode):
-                for child_id in (current_node.child_true, current_node.child_false):
+            if not pool.is_terminal_id(current_id):
+                for child_id in pool.node_children(current_id):
                     if child_id not in positions:
                         positions[child_id] = 0
                     parents[child_id].remove(current_id)
@@ -420,9 +414,9 @@ def walk_leaves(f, root, pool=None):
     profile = get_profile(root, pool=pool)
     assert isinstance(profile, WalkingProfile)
     while profile.has_next():
-        node = pool.get_node(profile.next())
-        if isinstance(node, TerminalNode):
-            f(pool, node)
+        node_id = profile.next()
+        if pool.is_terminal_id(node_id):
+            f(pool, pool.get_node(node_id))
     profile.reset()
 
 
@@ -0,0 +1,99 @@
+import sys
+import unittest
+
+import sympy
+
+from pyxadd import apply_cache
+from pyxadd.build import Builder
+from pyxadd.diagram import Pool
+from pyxadd.operation import Multiplication, Summation
+
+
+class TestApplyCache(unittest.TestCase):
+    @staticmethod
+    def construct(pool):
+        b = Builder(pool)
+        b.ints("x", "y")
+        bounds = b.limit("x", 0, 10) & b.limit("y", 0, 10)
+        d = bounds * b.ite(b.test("x", "<=", "y"), b.exp("x + y"), b.exp("2*x"))
+        return d + d * b.exp(3) + b.limit("x", 2, 5) * b.exp("y")
+
+    def check_policy(self, cache):
+        reference = self.construct(Pool())
+        pool = Pool(apply_cache=cache)
+        diagram = self.construct(pool)
+        self.assertEqual(reference.root_id, diagram.root_id)
+        for x in range(-1, 12):
+            for y in range(-1, 12):
+                assignment = {"x": x, "y": y}
+                self.assertEqual(reference.evaluate(assignment), diagram.evaluate(assignment))
+        return pool
+
+    def test_lru(self):
+        pool = self.check_policy(apply_cache.create("lru", max_entries=5))
+        self.assertTrue(pool.apply_cache.evictions > 0)
+        self.assertTrue(len(pool.apply_cache) <= 5)
+
+    def test_clock(self):
+        pool = self.check_policy(apply_cache.create("clock", max_entries=5))
+        self.assertTrue(pool.apply_cache.evictions > 0)
+        self.assertTrue(len(pool.apply_cache) <= 5)
+
+    def test_byte_budget(self):
+        pool = self.check_policy(apply_cache.create("lru", max_bytes=1000))
+        self.assertTrue(pool.apply_cache.evictions > 0)
+        self.assertTrue(pool.apply_cache.bytes <= 1000)
+
+    def test_partitioned(self):
+        pool = self.check_policy(apply_cache.create("lru", max_entries=3, partitioned=True))
+        cache = pool.apply_cache
+        self.assertTrue(len(cache.partition(Summation)) <= 3)
+        self.assertTrue(len(cache.partition(Multiplication)) <= 3)
+        statistics = cache.statistics()
+        self.assertEqual(cache.hits, statistics["hits"])
+        self.assertEqual(len(cache), statistics["entries"])
+
+    def test_counters(self):
+        pool = Pool()
+        pool.int_var("x")
+        x = pool.terminal("x")
+        pool.apply(Multiplication, x, x)
+        misses = pool.apply_cache.misses
+        pool.apply(Multiplication, x, x)
+        self.assertEqual(1, pool.apply_cache.hits)
+        self.assertEqual(misses, pool.apply_cache.misses)
+        self.assertEqual(0, pool.apply_cache.evictions)
+
+    def test_commutative_keys(self):
+        pool = Pool()
+        pool.int_var("x")
+        x = pool.terminal("x")
+        test = pool.bool_test(pool.get_node(self.construct(pool).root_id).test)
+        product = pool.apply(Multiplication, x, test)
+        misses = pool.apply_cache.misses
+        self.assertEqual(product, pool.apply(Multiplication, test, x))
+        self.assertEqual(misses, pool.apply_cache.misses)
+
+    def test_commutative_infinities(self):
+        # Each operand order is computed in a fresh pool (both orders share a cache entry)
+        for reverse in (False, True):
+            pool = Pool()
+            first, second = (pool.neg_inf_id, pool.pos_inf_id) if reverse else (pool.pos_inf_id, pool.neg_inf_id)
+            self.assertEqual(sympy.nan, pool.get_node(pool.apply(Summation, first, second)).expression)
+        self.assertEqual(pool.pos_inf_id, pool.apply(Summation, pool.pos_inf_id, pool.pos_inf_id))
+
+    def test_deep_apply(self):
+        pool = Pool()
+        b = Builder(pool)
+        variables = ["x{}".format(i) for i in range(sys.getrecursionlimit() + 100)]
+        b.ints(*variables)
+        tests = [b.test(var, ">=", 0) for var in variables]
+        chain = b.terminal(1)
+        for test in reversed(tests):
+            chain = test & chain
+        doubled = chain + chain
+        self.assertEqual(2, doubled.evaluate({var: 1 for var in variables}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import sys
+import unittest
+
+from pyxadd.build import Builder
+from pyxadd.diagram import Pool
+
+
+class TestCompile(unittest.TestCase):
+    def setUp(self):
+        self.pool = Pool()
+        b = Builder(self.pool)
+        b.ints("x", "y")
+        b.vars("bool", "a")
+        bounds = b.limit("x", 0, 10) & b.limit("y", -3, 5)
+        d = bounds * b.ite(b.test("x + 2*y", "<=", 4), b.exp("x**2*y + 1/3"), b.exp("2.5*x - y"))
+        self.diagram = b.ite(b.test("a"), d, d * b.exp("exp(x)")) + b.ite(b.test("x", ">", 7), 1, 0)
+
+    def test_compile(self):
+        f = self.diagram.compile()
+        self.assertEqual(["a", "x", "y"], f.variables)
+        for a in (True, False):
+            for x in range(-1, 12):
+                for y in range(-4, 7):
+                    expected = self.diagram.evaluate({"a": a, "x": x, "y": y})
+                    self.assertAlmostEqual(expected, f(a, x, y), delta=10 ** -8 * max(1, abs(expected)))
+        self.assertTrue(f is self.diagram.compile())
+
+    def test_constant(self):
+        self.assertEqual(float("inf"), self.pool.diagram(self.pool.pos_inf_id).compile()())
+        self.assertEqual([], self.pool.diagram(self.pool.one_id).compile().variables)
+
+    def test_deep(self):
+        b = Builder(self.pool)
+        variables = ["z{}".format(i) for i in range(300)]
+        b.ints(*variables)
+        tests = [b.test(var, ">=", 0) for var in variables]
+        chain = b.exp("z0")
+        for test in reversed(tests):
+            chain = b.ite(test, chain, b.terminal(-1))
+        f = chain.compile()
+        values = {var: 1 for var in variables}
+        self.assertEqual(1, f(*[values[var] for var in f.variables]))
+        values["z299"] = -1
+        self.assertEqual(-1, f(*[values[var] for var in f.variables]))
+
+    def test_long_chain(self):
+        # A chain of false children longer than the recursion limit
+        b = Builder(self.pool)
+        length = sys.getrecursionlimit() + 500
+        tests = [b.test("x", "<=", i) for i in range(length)]
+        chain = b.terminal(-1)
+        for i in reversed(range(length)):
+            chain = b.ite(tests[i], b.exp(i), chain)
+        f = chain.compile()
+        self.assertEqual(["x"], f.variables)
+        for x in (-3, 0, 7, length - 1, length):
+            self.assertEqual(chain.evaluate({"x": x}), f(x))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -161,6 +161,39 @@ class TestDiagram(unittest.TestCase):
         self.assertTrue(time_legacy > time_new, "New inversion ({}) not faster than legacy implementation ({})"
                         .format(time_new, time_legacy))
 
+    def test_node_table(self):
+        pool = self.diagram.pool
+        root_id = self.diagram.root_id
+        self.assertFalse(pool.is_terminal_id(root_id))
+        self.assertTrue(pool.is_terminal_id(self.x))
+
+        node = pool.get_node(root_id)
+        self.assertEqual(node, pool.get_node(root_id))
+        self.assertEqual((node.child_true, node.child_false), pool.node_children(root_id))
+        self.assertEqual(node.test, pool.get_test(pool.node_test_id(root_id)))
+        self.assertIs(pool.get_node(self.x), pool.get_node(self.x))
+
+        with self.assertRaises(RuntimeError):
+            pool.get_node(pool._counter)
+
+        # Nodes of different pools are distinct, even if their ids are equal
+        other = Pool()
+        self.assertNotEqual(pool.get_node(pool.one_id), other.get_node(other.one_id))
+        self.assertEqual(2, len({pool.get_node(pool.one_id), other.get_node(other.one_id)}))
+
+    def test_ite(self):
+        pool = self.diagram.pool
+        condition = pool.apply(Multiplication, self.test2, self.test4)
+        then_id = self.diagram.root_id
+        else_id = pool.terminal("2*x")
+        idiom = pool.apply(Summation, pool.apply(Multiplication, condition, then_id),
+                           pool.apply(Multiplication, pool.invert(condition), else_id))
+        self.assertEqual(idiom, pool.ite(condition, then_id, else_id))
+        self.assertEqual(then_id, pool.ite(pool.one_id, then_id, else_id))
+        self.assertEqual(condition, pool.ite(condition, pool.one_id, pool.zero_id))
+        with self.assertRaises(RuntimeError):
+            pool.ite(self.x, then_id, else_id)
+
     def test_invert_terminal(self):
         pool = Pool()
         self.assertEquals(pool.zero_id, pool.invert(pool.one_id))
@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+import unittest
+
+from pyxadd.build import Builder
+from pyxadd.diagram import Pool
+from pyxadd.disk_cache import DiskCache, diagram_key
+from pyxadd.expression_cache import ExpressionCache
+
+
+def build(pool, reverse=False):
+    b = Builder(pool)
+    b.ints("x", "y")
+    b.vars("bool", "a")
+    expressions = ["3*x + 2*y + 5", "x**2 - 7"]
+    # Creating the leaves in reverse order changes the node ids but not the structure
+    order = [1, 0] if reverse else [0, 1]
+    leaves = {i: b.exp(expressions[i]) for i in order}
+    d = b.ite(b.test("x + y", "<=", 4), leaves[0], leaves[1])
+    return b.ite(b.test("a"), d, d * b.exp(3)) * b.limit("x", 0, 10)
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.entries = [{"x": x, "y": y, "a": a} for x in range(-1, 12) for y in range(-2, 6) for a in (True, False)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def new_pool(self):
+        return Pool(expression_cache=ExpressionCache(disk_cache=DiskCache(self.directory)))
+
+    def test_key(self):
+        # Nodes are created in a different order, the structure is the same
+        self.assertEqual(diagram_key(build(Pool())), diagram_key(build(Pool(), reverse=True)))
+        pool = Pool()
+        self.assertNotEqual(diagram_key(build(pool)), diagram_key(build(pool) * pool.diagram(pool.terminal(2))))
+
+    def test_terminals(self):
+        pool = self.new_pool()
+        diagram = build(pool)
+        expected = [diagram.evaluate(entry) for entry in self.entries]
+        self.assertTrue(len(pool.expression_cache.disk_cache) > 0)
+        self.assertEqual(0, pool.expression_cache.disk_cache.hits)
+
+        cold_pool = self.new_pool()
+        cold_diagram = build(cold_pool)
+        self.assertEqual(expected, [cold_diagram.evaluate(entry) for entry in self.entries])
+        disk_cache = cold_pool.expression_cache.disk_cache
+        self.assertEqual(0, disk_cache.misses)
+        self.assertEqual(len(cold_pool.expression_cache), disk_cache.hits)
+
+    def test_compiled(self):
+        pool = self.new_pool()
+        f = build(pool).compile()
+        expected = [f(*[entry[var] for var in f.variables]) for entry in self.entries]
+
+        cold_pool = self.new_pool()
+        cold_f = build(cold_pool, reverse=True).compile()
+        self.assertEqual(f.source, cold_f.source)
+        self.assertEqual(f.variables, cold_f.variables)
+        self.assertEqual(1, cold_pool.expression_cache.disk_cache.hits)
+        self.assertEqual(expected, [cold_f(*[entry[var] for var in cold_f.variables]) for entry in self.entries])
@@ -3,8 +3,9 @@ import unittest
 
 import numpy
 
+from pyxadd.build import Builder
 from pyxadd.diagram import Pool
-from pyxadd.evaluate import mass_evaluate
+from pyxadd.evaluate import ParallelEvaluator, evaluate_arrays, mass_evaluate
 from pyxadd.timer import Timer
 
 
@@ -49,3 +50,58 @@ class TestDiagram(unittest.TestCase):
         self.assertTrue(time_mass_evaluation < time_individual_evaluation,
                         "Mass evaluation ({}) slower than individual evaluation ({})"
                         .format(time_mass_evaluation, time_individual_evaluation))
+
+
+class TestArrayEvaluation(unittest.TestCase):
+    def setUp(self):
+        pool = Pool()
+        b = Builder(pool)
+        b.ints("x", "y")
+        b.vars("bool", "a")
+        bounds = b.limit("x", 0, 10) & b.limit("y", -3, 5)
+        d = bounds * b.ite(b.test("x + 2*y", "<=", 4), b.exp("x**2*y + 1/3"), b.exp("2.5*x - y"))
+        self.diagram = b.ite(b.test("a"), d, d * b.exp(3)) + b.ite(b.test("x", ">", 7), 1, 0)
+        self.entries = [{"x": x, "y": y, "a": a} for x in range(-1, 12) for y in range(-4, 7) for a in (True, False)]
+
+    def test_mass_evaluate(self):
+        evaluated = mass_evaluate(self.diagram, self.entries)
+        self.assertEqual(len(self.entries), len(evaluated))
+        for entry, value in zip(self.entries, evaluated):
+            self.assertAlmostEqual(self.diagram.evaluate(entry), value, delta=10 ** -8)
+
+    def test_constant(self):
+        constant = self.diagram.pool.diagram(self.diagram.pool.terminal(4))
+        self.assertEqual([4, 4, 4], list(mass_evaluate(constant, [{}, {}, {}])))
+        self.assertEqual([4, 4], list(mass_evaluate(constant, [{"x": 1}, {"x": 2}])))
+        self.assertEqual([4] * 5, list(mass_evaluate(constant, [{}] * 5, workers=2, chunk_size=2)))
+        self.assertEqual([4], list(evaluate_arrays(constant, {})))
+
+    def test_arrays(self):
+        columns = {var: numpy.array([entry[var] for entry in self.entries]) for var in ("x", "y", "a")}
+        evaluated = evaluate_arrays(self.diagram, columns)
+        self.assertTrue(numpy.allclose(mass_evaluate(self.diagram, self.entries), evaluated))
+
+        with self.assertRaises(RuntimeError):
+            evaluate_arrays(self.diagram, {"x": columns["x"], "a": columns["a"]})
+
+    def test_parallel(self):
+        expected = mass_evaluate(self.diagram, self.entries)
+        self.assertTrue(numpy.allclose(expected, mass_evaluate(self.diagram, self.entries, workers=2, chunk_size=50)))
+        columns = {var: numpy.array([entry[var] for entry in self.entries]) for var in ("x", "y", "a")}
+        self.assertTrue(numpy.allclose(expected, mass_evaluate(self.diagram, columns, workers=2, chunk_size=37)))
+
+        # Chunks are read lazily, at most two per worker ahead of the first result
+        read = []
+
+        def chunks():
+            for start in range(0, len(self.entries), 10):
+                read.append(start)
+                yield {var: values[start:start + 10] for var, values in columns.items()}
+
+        evaluator = ParallelEvaluator(self.diagram, workers=1)
+        sizes = (min(10, len(self.entries) - start) for start in range(0, len(self.entries), 10))
+        results = evaluator.evaluate_chunks(chunks(), sizes)
+        self.assertTrue(numpy.allclose(expected[:10], next(results)))
+        self.assertEqual(2, len(read))
+        self.assertEqual(len(self.entries), sum(len(result) for result in results) + 10)
+        evaluator.close()
@@ -0,0 +1,79 @@
+import unittest
+
+import numpy
+import sympy
+
+from pyxadd.build import Builder
+from pyxadd.diagram import Pool
+from pyxadd.evaluate import evaluate_arrays
+from pyxadd.expression_cache import ExpressionCache, template
+from pyxadd.flatten import flatten
+
+
+class TestExpressionCache(unittest.TestCase):
+    def test_template(self):
+        x, y = sympy.symbols("x y")
+        template1, constants1, variables1 = template(3 * x + 2)
+        template2, constants2, variables2 = template(5 * y + 7)
+        self.assertEqual(template1, template2)
+        self.assertEqual([3, 2], sorted(constants1, reverse=True))
+        self.assertEqual([x], variables1)
+        self.assertEqual([y], variables2)
+
+    def test_shared(self):
+        pool = Pool()
+        b = Builder(pool)
+        b.ints("x", "y")
+        terminals = [pool.terminal(sympy.sympify("{}*x + {}*y + {}".format(i, i + 1, i + 2))) for i in range(2, 20)]
+        for node_id in terminals:
+            pool.get_node(node_id).evaluate({"x": 1, "y": 2})
+        self.assertEqual(1, len(pool.expression_cache))
+        self.assertEqual(len(terminals) - 1, pool.expression_cache.hits)
+
+    def test_values(self):
+        pool = Pool()
+        b = Builder(pool)
+        b.ints("x", "y")
+        expressions = ["3", "1/3", "2.5*x - y", "x**2*y + 1/3", "exp(x) - 2*y", "-x", "(x + y)**3 / 7", "oo", "-oo"]
+        for string in expressions:
+            expression = sympy.sympify(string)
+            node = pool.get_node(pool.terminal(expression))
+            for x, y in [(0, 0), (1, -2), (3, 5)]:
+                expected = expression.subs({"x": x, "y": y})
+                self.assertAlmostEqual(float(expected), float(node.evaluate({"x": x, "y": y})), msg=string)
+
+    def test_numpy(self):
+        pool = Pool()
+        b = Builder(pool)
+        b.ints("x", "y")
+        pool.set_expression_cache(ExpressionCache("numpy"))
+        node = pool.get_node(pool.terminal(sympy.sympify("x**2*y + 1/3")))
+        values = node.evaluate({"x": numpy.arange(3), "y": numpy.array([1, 2, 3])})
+        self.assertTrue(numpy.allclose([1 / 3.0, 2 + 1 / 3.0, 12 + 1 / 3.0], values))
+
+    def test_numpy_functions(self):
+        pool = Pool()
+        b = Builder(pool)
+        b.ints("x", "y")
+        diagram = b.exp(0)
+        for i in range(2, 8):
+            diagram = b.ite(b.test("x", "<=", i), b.exp("{}*x + {}*y".format(i, i + 1)), diagram)
+        columns = {"x": numpy.arange(10), "y": numpy.arange(10) % 3}
+        expected = [diagram.evaluate({"x": x, "y": y}) for x, y in zip(columns["x"], columns["y"])]
+        self.assertTrue(numpy.allclose(expected, evaluate_arrays(diagram, columns)))
+        self.assertTrue(numpy.allclose(expected, flatten(diagram).evaluate(columns)))
+        # The leaves only differ in their constants, they share one compiled template (the zero leaf is another one)
+        self.assertEqual("numpy", pool.numpy_expression_cache.backend)
+        self.assertEqual(2, len(pool.numpy_expression_cache))
+
+    def test_warm_up(self):
+        pool = Pool()
+        b = Builder(pool)
+        b.ints("x")
+        diagram = b.ite(b.test("x", "<=", 2), b.exp("2*x + 5"), b.exp("3*x + 4"))
+        self.assertEqual(2, pool.expression_cache.warm_up(diagram))
+        self.assertEqual(1, len(pool.expression_cache))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(RuntimeError):
+            ExpressionCache("fortran")
@@ -0,0 +1,46 @@
+import unittest
+
+import numpy
+
+from pyxadd.build import Builder
+from pyxadd.diagram import Pool
+from pyxadd.evaluate import mass_evaluate
+from pyxadd.flatten import flatten
+
+
+class TestFlatten(unittest.TestCase):
+    def setUp(self):
+        self.pool = Pool()
+        b = Builder(self.pool)
+        b.ints("x", "y")
+        b.vars("bool", "a")
+        bounds = b.limit("x", 0, 10) & b.limit("y", -3, 5)
+        d = bounds * b.ite(b.test("x + 2*y", "<=", 4), b.exp("x**2*y + 1/3"), b.exp("2.5*x - y"))
+        self.diagram = b.ite(b.test("a"), d, d * b.exp(3)) + b.ite(b.test("x", ">", 7), 1, 0)
+        self.entries = [{"x": x, "y": y, "a": a} for x in range(-1, 12) for y in range(-4, 7) for a in (True, False)]
+
+    def test_structure(self):
+        flat = flatten(self.diagram)
+        self.assertEqual(["a", "x", "y"], flat.variables)
+        self.assertEqual((flat.internal_count, 3), flat.coefficients.shape)
+        # Topological order: children always come after their parents
+        self.assertTrue(numpy.all(flat.child_true > numpy.arange(flat.internal_count)))
+        self.assertTrue(numpy.all(flat.child_false > numpy.arange(flat.internal_count)))
+        # Tests only store their non-zero terms
+        for (indices, coefficients), row in zip(flat.terms, flat.coefficients):
+            self.assertEqual(list(numpy.flatnonzero(row)), list(indices))
+            self.assertTrue(numpy.all(coefficients != 0))
+
+    def test_evaluate(self):
+        flat = flatten(self.diagram)
+        columns = {var: numpy.array([entry[var] for entry in self.entries]) for var in flat.variables}
+        self.assertTrue(numpy.allclose(mass_evaluate(self.diagram, self.entries), flat.evaluate(columns)))
+
+    def test_terminal(self):
+        flat = flatten(self.pool.diagram(self.pool.terminal(5)))
+        self.assertEqual(0, flat.internal_count)
+        self.assertTrue(numpy.allclose([5, 5], flat.evaluate_matrix(numpy.zeros((2, 0)))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import gc
+import unittest
+
+from pyxadd.build import Builder
+from pyxadd.diagram import DefaultCache, Pool
+from pyxadd.matrix_vector import BoundSelectionCache, sum_out
+
+
+class TestGarbageCollection(unittest.TestCase):
+    def setUp(self):
+        self.pool = Pool()
+        self.build = Builder(self.pool)
+        self.build.ints("x", "y")
+
+    def diagram(self, factor):
+        b = self.build
+        bounds = b.limit("x", 0, 10) & b.limit("y", 0, 5)
+        return bounds * b.ite(b.test("x", "<=", "y"), b.exp("{}*x".format(factor)), b.exp("y + {}".format(factor)))
+
+    def evaluations(self, diagram):
+        return [diagram.evaluate({"x": x, "y": y}) for x in range(-1, 12) for y in range(-1, 7)]
+
+    def test_collect_unreferenced(self):
+        kept = self.diagram(2)
+        expected = self.evaluations(kept)
+        for i in range(3, 6):
+            self.diagram(i)
+        gc.collect()
+
+        stats = self.pool.collect()
+        self.assertTrue(stats["nodes"] > 0)
+        self.assertTrue(stats["cache_entries"] > 0)
+        self.assertTrue(stats["bytes"] > 0)
+        self.assertEqual(expected, self.evaluations(kept))
+        self.assertEqual(0, self.pool.collect()["nodes"])
+
+        # Collected nodes can be rebuilt
+        rebuilt = self.diagram(3)
+        self.assertEqual(self.evaluations(self.diagram(3)), self.evaluations(rebuilt))
+
+    def test_json(self):
+        for i in range(3, 6):
+            self.diagram(i)
+        kept = self.diagram(2)
+        expected = self.evaluations(kept)
+        gc.collect()
+        self.pool.collect()
+
+        reconstructed = Pool.from_json(Pool.to_json(self.pool))
+        # The kept diagram was created last, its root has the largest id in the reconstructed pool
+        self.assertEqual(expected, self.evaluations(reconstructed.diagram(reconstructed._counter - 1)))
+
+    def test_registered_roots(self):
+        root_id = self.diagram(2).root_id
+        expected = self.evaluations(self.pool.diagram(root_id))
+        self.pool.add_root(root_id)
+        gc.collect()
+        self.pool.collect()
+        self.assertEqual(expected, self.evaluations(self.pool.diagram(root_id)))
+
+        self.pool.remove_root(root_id)
+        gc.collect()
+        self.pool.collect()
+        with self.assertRaises(RuntimeError):
+            self.pool.get_node(root_id)
+
+    def test_derived_caches(self):
+        kept = self.diagram(2)
+        summed = self.pool.diagram(sum_out(self.pool, self.diagram(3).root_id, ["x"]))
+        kept_profile = kept.profile
+        gc.collect()
+        self.pool.collect(roots=[summed.root_id])
+        self.assertTrue(kept_profile is kept.profile)
+        for key, value in self.pool.apply_cache.items():
+            for node_id in key[1:] + (value,):
+                self.pool.get_node(node_id)
+
+    def test_bound_selection_cache(self):
+        # Integer bounds are not node ids, the template is kept even if a node with the same id is collected
+        collected_id = self.diagram(3).root_id
+        BoundSelectionCache.initialize(self.pool)
+        cache = self.pool.caches[BoundSelectionCache.name]
+        key = BoundSelectionCache.key([0, collected_id], ["y"])
+        template = self.pool.get_cached(BoundSelectionCache.name, key)
+        gc.collect()
+        self.pool.collect()
+        with self.assertRaises(RuntimeError):
+            self.pool.get_node(collected_id)
+        self.assertTrue(cache.contains(key))
+        self.assertIs(template, self.pool.get_cached(BoundSelectionCache.name, key))
+
+    def test_cache_node_references(self):
+        class CountCache(DefaultCache):
+            def node_references(self, key, value):
+                return []
+
+        # Both caches store an integer that equals the id of a collected node, only the default cache drops it
+        collected_id = self.diagram(3).root_id
+        self.pool.add_cache("guessed", DefaultCache(lambda pool, key: collected_id))
+        self.pool.add_cache("counts", CountCache(lambda pool, key: collected_id))
+        self.pool.get_cached("guessed", "x")
+        self.pool.get_cached("counts", "x")
+        gc.collect()
+        self.pool.collect()
+        self.assertFalse(self.pool.is_cached("guessed", "x"))
+        self.assertTrue(self.pool.is_cached("counts", "x"))
+
+    def test_compact(self):
+        kept = self.diagram(2)
+        expected = self.evaluations(kept)
+        for i in range(3, 6):
+            self.diagram(i)
+        held = self.diagram(7).root_id
+        held_expected = self.evaluations(self.pool.diagram(held))
+        gc.collect()
+
+        mapping = self.pool.compact(roots=[held])
+        count = len(mapping)
+        self.assertEqual(list(range(1, count + 1)), sorted(mapping.values()))
+        self.assertEqual(count + 1, self.pool._counter)
+        self.assertEqual(expected, self.evaluations(kept))
+        self.assertEqual(held_expected, self.evaluations(self.pool.diagram(mapping[held])))
+
+        # Renumbered nodes remain hash-consed and cached apply results remain valid
+        for key, value in self.pool.apply_cache.items():
+            self.assertTrue(0 < value <= count)
+        rebuilt = self.diagram(2)
+        self.assertEqual(kept.root_id, rebuilt.root_id)
+        self.assertEqual(self.evaluations(self.diagram(7)), held_expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+import numpy
+
+from pyxadd.build import Builder
+from pyxadd.diagram import Pool
+from pyxadd.ground import ground
+from pyxadd.matrix.matrix import Matrix, assignments
+
+
+class TestGround(unittest.TestCase):
+    def setUp(self):
+        self.pool = Pool()
+        b = Builder(self.pool)
+        b.ints("x", "y")
+        b.vars("bool", "a")
+        bounds = b.limit("x", 0, 10) & b.limit("y", -3, 5)
+        d = bounds * b.ite(b.test("x + 2*y", "<=", 4), b.exp("x**2*y + 1/3"), b.exp("2.5*x - y"))
+        self.diagram = b.ite(b.test("a"), d, d * b.exp(3)) + b.ite(b.test("x", ">", 7), 1, 0)
+
+    def check(self, bounds):
+        tensor = ground(self.diagram, bounds)
+        self.assertEqual(tuple(ub - lb + 1 for _, lb, ub in bounds), tensor.shape)
+        for assignment in assignments(bounds):
+            index = tuple(assignment[var] - lb for var, lb, _ in bounds)
+            expected = self.diagram.evaluate(assignment)
+            self.assertAlmostEqual(expected, tensor[index], delta=10 ** -8 * max(1, abs(expected)))
+
+    def test_ground(self):
+        self.check([("x", -2, 12), ("y", -5, 7), ("a", 0, 1)])
+        self.check([("a", 0, 1), ("y", 0, 0), ("x", 3, 9)])
+
+    def test_integer_bounds(self):
+        b = Builder(self.pool)
+        diagram = b.ite(b.test("2*x", "<=", 5), 1, 2) + b.ite(b.test("-3*x", "<", -4), 10, 20)
+        expected = [diagram.evaluate({"x": x}) for x in range(-2, 6)]
+        self.assertEqual([21, 21, 21, 21, 11, 12, 12, 12], expected)
+        self.assertEqual(expected, list(ground(diagram, [("x", -2, 5)])))
+
+    def test_missing_variable(self):
+        with self.assertRaises(RuntimeError):
+            ground(self.diagram, [("x", 0, 5), ("y", 0, 5)])
+
+    def test_matrix(self):
+        b = Builder(self.pool)
+        diagram = b.limit("x", 0, 10) * b.limit("y", -3, 5) * b.ite(b.test("x + y", "<=", 6), b.exp("x - y"), b.exp(2))
+        matrix = Matrix(diagram, [("x", 0, 10)], [("y", -3, 5)])
+        expected = [[diagram.evaluate({"x": x, "y": y}) for y in range(-3, 6)] for x in range(0, 11)]
+        self.assertTrue(numpy.allclose(expected, matrix.to_ground()))
+        self.assertTrue(numpy.allclose([row[:4] for row in expected[:2]], matrix.to_ground(2, 4)))
+
+
+if __name__ == '__main__':
+    unittest.main()
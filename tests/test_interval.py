@@ -0,0 +1,56 @@
+import unittest
+
+import numpy
+
+from pyxadd.build import Builder
+from pyxadd.diagram import Pool
+from pyxadd.evaluate import mass_evaluate
+from pyxadd.interval import interval_index
+
+
+class TestIntervalIndex(unittest.TestCase):
+    def setUp(self):
+        self.pool = Pool()
+        self.b = Builder(self.pool)
+        self.b.ints("x", "y")
+        self.b.vars("bool", "a")
+
+    def check(self, diagram, values):
+        index = interval_index(diagram)
+        expected = mass_evaluate(diagram, [{"x": int(value)} for value in values])
+        self.assertTrue(numpy.allclose(expected, index.evaluate(numpy.array(values))))
+        for value in values:
+            self.assertAlmostEqual(diagram.evaluate({"x": value}), index.evaluate(value))
+        return index
+
+    def test_vector(self):
+        b = self.b
+        diagram = b.limit("x", 1, 20) * (b.ite(b.test("x", "<", 8), b.exp(0.5), b.exp(0.25)) + b.exp(1))
+        index = self.check(diagram, range(-5, 30))
+        self.assertEqual([1, 8, 21], list(index.breakpoints))
+        self.assertEqual(4, len(index.intervals()))
+
+    def test_symbolic_leaves(self):
+        b = self.b
+        diagram = b.ite(b.test("x", ">=", 3), b.exp("2*x + 1"), b.exp("x**2")) * b.ite(b.test("x", "<=", 10), 1, 2)
+        self.check(diagram, range(-5, 20))
+
+    def test_coefficients(self):
+        b = self.b
+        diagram = b.ite(b.test("2*x", "<=", 5), 1, 2) + b.ite(b.test("-3*x", "<", -4), 10, 20)
+        index = self.check(diagram, range(-5, 10))
+        self.assertEqual([2, 3], list(index.breakpoints))
+
+    def test_constant(self):
+        index = interval_index(self.b.exp(7), "x")
+        self.assertEqual(0, len(index.breakpoints))
+        self.assertTrue(numpy.allclose([7, 7], index.evaluate(numpy.array([-100, 100]))))
+
+    def test_invalid(self):
+        b = self.b
+        with self.assertRaises(RuntimeError):
+            interval_index(b.ite(b.test("x + y", "<=", 2), 1, 0))
+        with self.assertRaises(RuntimeError):
+            interval_index(b.limit("x", 0, 5) * b.exp("y"))
+        with self.assertRaises(RuntimeError):
+            interval_index(b.ite(b.test("a"), 1, 0))
@@ -1,10 +1,14 @@
 from __future__ import print_function
 
+import sys
 import unittest
 
+import sympy
+
 from pyxadd.build import Builder
 from pyxadd.diagram import Diagram, Pool
-from pyxadd.matrix_vector import SummationWalker, matrix_multiply
+from pyxadd.matrix_vector import BoundSelectionCache, SummationCache, SumOutCache, SummationWalker, matrix_multiply, \
+    sum_out, elimination_statistics, multiply_sum_out
 from pyxadd.partial import PartialWalker
 from pyxadd.reduce import SmtReduce, LinearReduction
 from pyxadd.test import LinearTest
@@ -117,5 +121,171 @@ class TestMatrixVector(unittest.TestCase):
         for x1 in range(0, 4):
             self.assertEqual(8 if x1 < 2 else 23, result.evaluate({"x1": x1}))
 
+    def test_multiply_sum_out(self):
+        def build(pool):
+            pool.int_var("r", "c", "k")
+            pool.bool_var("a")
+            b = Builder(pool)
+            left = b.limit("r", 0, 4) * b.limit("c", 0, 4) * b.ite(b.test("r - c", "<=", 1), b.exp("r + c"), b.exp(2))
+            right = b.limit("c", 0, 4) * b.limit("k", 0, 3) * b.ite(b.test("a"), b.exp("c*k"), b.exp(3))
+            return left.root_id, right.root_id
+
+        points = [{"r": r, "c": c, "k": k, "a": True} for r in range(-1, 6) for c in (0, 2) for k in range(-1, 5)]
+        sizes = []
+        for variables in (["c"], ["c", "a"], ["a"]):
+            pool, fused_pool = Pool(), Pool()
+            expected = pool.diagram(matrix_multiply(pool, *(build(pool) + (variables,))))
+            result = fused_pool.diagram(multiply_sum_out(fused_pool, *(build(fused_pool) + (variables,))))
+            for point in points:
+                self.assertEqual(expected.evaluate(point), result.evaluate(point))
+            sizes.append((len(pool._test_column), len(fused_pool._test_column)))
+
+        # The product is not built when summing out c
+        self.assertTrue(sizes[0][1] < sizes[0][0])
+
+    def test_multiply_sum_out_long_chain(self):
+        pool = Pool()
+        pool.int_var("x", "y")
+        b = Builder(pool)
+        # A chain of tests on y (which is maintained) longer than the recursion limit
+        length = sys.getrecursionlimit() + 500
+        tests = [b.test("y", "<=", i) for i in range(length)]
+        chain = b.terminal(-1)
+        for i in reversed(range(length)):
+            chain = b.ite(tests[i], b.exp(i % 3), chain)
+        right = b.limit("x", 0, 3) * b.exp("x + 1")
+        result = pool.diagram(multiply_sum_out(pool, chain.root_id, right.root_id, ["x"]))
+        for y in (-3, 0, 7, length - 1, length):
+            self.assertEqual(10 * chain.evaluate({"y": y}), result.evaluate({"y": y}))
+
+    def test_summation_cache(self):
+        pool = Pool()
+        pool.int_var("x", "y")
+        node_id = pool.terminal("x**2/3 + 2*x")
+        cache = SummationCache()
+        f = cache.get(pool, ("x", node_id))
+        self.assertAlmostEqual(sum(x ** 2 / 3.0 + 2 * x for x in range(-3, 8)), f(-3, 7))
+        self.assertEqual(1, cache.statistics()["numeric_calls"])
+        # Symbolic bounds are substituted
+        y = pool.get_node(pool.terminal("y")).expression
+        self.assertEqual(0, (f(y, y) - (y ** 2 / 3 + 2 * y)).expand())
+        self.assertEqual(1, cache.statistics()["symbolic_calls"])
+        self.assertIs(f, cache.get(pool, ("x", node_id)))
+        self.assertEqual(0.5, cache.statistics()["hit_rate"])
+
+        walker_pool = self.diagram.pool
+        Diagram(walker_pool, SummationWalker(self.diagram, "x").walk())
+        self.assertTrue(walker_pool.caches[SummationCache.name].statistics()["symbolic_calls"] > 0)
+
+    def test_exact_sums(self):
+        pool = Pool()
+        pool.int_var("x")
+        cache = SummationCache()
+        cache.native = False
+        rational = cache.get(pool, ("x", pool.terminal("x**2/3 + 2*x")))(-3, 7)
+        self.assertIsInstance(rational, sympy.Rational)
+        self.assertEqual(sympy.Rational(sum(x ** 2 + 6 * x for x in range(-3, 8)), 3), rational)
+        integer = cache.get(pool, ("x", pool.terminal("x")))(1, 30)
+        self.assertIsInstance(integer, sympy.Integer)
+        self.assertEqual(465, integer)
+        # Sums of float leaves are floats, unless they are zero
+        self.assertAlmostEqual(7.5, cache.get(pool, ("x", pool.terminal("0.5*x")))(0, 5))
+        self.assertEqual(pool.zero_id, pool.terminal(cache.get(pool, ("x", pool.terminal("0.5*x")))(-3, 3)))
+
+    def test_auto_order(self):
+        pool = Pool()
+        pool.int_var("x", "y", "z")
+        pool.bool_var("a")
+        b = Builder(pool)
+        # The tests form a chain x - y - z, summing out y first would connect x and z
+        bounds = b.limit("x", 0, 5) & b.limit("y", 0, 5) & b.limit("z", 0, 5)
+        chain = b.test("x + y", "<=", 6) & b.test("y - z", "<=", 1)
+        d = bounds * b.ite(chain, b.exp("x*y + z**2"), b.exp(2)) * b.ite(b.test("a"), b.exp(3), b.exp("z"))
+
+        statistics = elimination_statistics(pool, d.root_id, ["x", "y", "z", "a"])
+        self.assertEqual(1, statistics["y"]["fill"])
+        self.assertEqual({"x", "z"}, statistics["y"]["neighbors"])
+        self.assertEqual(0, statistics["x"]["fill"])
+        self.assertEqual(3, statistics["z"]["degree"])
+        self.assertEqual(0, statistics["a"]["shared"])
+
+        values = range(6)
+        grid = [{"x": x, "y": y, "z": z, "a": a} for x in values for y in values for z in values for a in (True, False)]
+        expected = sum(d.evaluate(assignment) for assignment in grid)
+        result = pool.diagram(sum_out(pool, d.root_id, ["y", "x", "z", "a"], order="auto"))
+        self.assertEqual(expected, result.evaluate({}))
+        self.assertRaises(RuntimeError, sum_out, pool, d.root_id, ["x"], order="random")
+
+        partial = pool.diagram(sum_out(pool, d.root_id, ["y", "a"], order="auto"))
+        expected = sum(d.evaluate(assignment) for assignment in grid if assignment["x"] == 1 and assignment["z"] == 2)
+        self.assertEqual(expected, partial.evaluate({"x": 1, "z": 2}))
+
+    def test_sum_out_cache(self):
+        def build(pool):
+            pool.int_var("x", "y")
+            b = Builder(pool)
+            # The test on y is created first (it is on top) and maintained, so inner is reached with trivial bounds
+            test = b.test("y", ">=", 3)
+            inner = b.limit("x", 0, 10) * b.ite(b.test("x", "<=", "y"), b.exp("x*y"), b.exp(2))
+            return inner, b.ite(test, inner, inner * b.exp(5))
+
+        pool = Pool()
+        inner, outer = build(pool)
+        summed = pool.diagram(sum_out(pool, outer.root_id, ["x"]))
+        cache = pool.caches[SumOutCache.name]
+        self.assertTrue(cache.contains((inner.root_id, "x")))
+        hits = cache.hits
+        self.assertEqual(summed.root_id, sum_out(pool, outer.root_id, ["x"]))
+        inner_summed = pool.diagram(sum_out(pool, inner.root_id, ["x"]))
+        self.assertEqual(hits + 2, cache.hits)
+
+        previous = SumOutCache.enabled
+        try:
+            SumOutCache.enabled = False
+            uncached_pool = Pool()
+            _, uncached = build(uncached_pool)
+            expected = uncached_pool.diagram(sum_out(uncached_pool, uncached.root_id, ["x"]))
+            self.assertFalse(uncached_pool.caches[SumOutCache.name].contains((uncached.root_id, "x")))
+        finally:
+            SumOutCache.enabled = previous
+        for y in range(-2, 14):
+            self.assertEqual(expected.evaluate({"y": y}), summed.evaluate({"y": y}))
+            self.assertEqual(sum(inner.evaluate({"x": x, "y": y}) for x in range(11)), inner_summed.evaluate({"y": y}))
+
+        # Entries that refer to collected nodes are removed
+        temporary = outer * pool.diagram(pool.terminal(7))
+        key = (temporary.root_id, "x")
+        sum_out(pool, temporary.root_id, ["x"])
+        self.assertTrue(cache.contains(key))
+        del temporary
+        pool.collect()
+        self.assertFalse(cache.contains(key))
+        self.assertTrue(cache.contains((outer.root_id, "x")))
+
+    def test_bound_selection_cache(self):
+        pool = Pool()
+        pool.int_var("x", "y", "w")
+        b = Builder(pool)
+        bounds = b.test("x", ">=", "y") & b.test("x", ">=", 0) & b.test("x", "<=", "y + 4") & b.test("x", "<=", 6)
+        leaves = b.exp(0)
+        for i in reversed(range(4)):
+            leaves = b.ite(b.test("w", "<=", i), b.exp("{}*x + w".format(i + 1)), leaves)
+        d = bounds * leaves
+
+        result = pool.diagram(sum_out(pool, d.root_id, ["x"]))
+        cache = pool.caches[BoundSelectionCache.name]
+        # All leaves share the same bounds, the template is built once
+        self.assertEqual(1, cache.misses)
+        self.assertTrue(cache.hits >= 3)
+        for y in range(-2, 8):
+            for w in range(0, 5):
+                expected = sum(d.evaluate({"x": x, "y": y, "w": w}) for x in range(-1, 12))
+                self.assertEqual(expected, result.evaluate({"y": y, "w": w}))
+
+        template = BoundSelectionCache.template(*BoundSelectionCache.key([0, "y"], [6, "y + 4"]))
+        self.assertEqual("select", template[-1][0])
+        self.assertTrue(all(entry[0] in ("select", "sum", "zero") for entry in template))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from fractions import Fraction
+
+import sympy
+
+from pyxadd.diagram import Pool
+from pyxadd.matrix_vector import SummationCache
+from pyxadd.polysum import Polynomial, faulhaber, sum_expression
+
+
+class TestPolynomialSummation(unittest.TestCase):
+    def test_faulhaber(self):
+        self.assertEqual([0, 1], faulhaber(0))
+        self.assertEqual([0, Fraction(1, 2), Fraction(1, 2)], faulhaber(1))
+        self.assertEqual([0, 0, Fraction(1, 4), Fraction(1, 2), Fraction(1, 4)], faulhaber(3))
+        for p in range(8):
+            for n in range(6):
+                self.assertEqual(sum(k ** p for k in range(1, n + 1)), Polynomial.constant(n).power_sum(p).evaluate({}))
+
+    def test_sum(self):
+        x, y = sympy.symbols("x y")
+        expression = sympy.sympify("3*x**2*y/7 + 5*x - y + 1")
+        summed = sum_expression(expression, "x", sympy.sympify("y - 2"), sympy.sympify("2*y + 3"))
+        self.assertEqual({"y"}, summed.variables)
+        for value in range(-4, 5):
+            expected = sum(expression.subs({x: k, y: value}) for k in range(value - 2, 2 * value + 4))
+            self.assertEqual(expected, summed.evaluate({"y": value}))
+        self.assertEqual(0, sympy.expand(summed.to_sympy() - sympy.summation(expression, (x, y - 2, 2 * y + 3))))
+
+    def test_not_polynomial(self):
+        self.assertIsNone(Polynomial.from_expression(sympy.sympify("exp(x)")))
+        self.assertIsNone(Polynomial.from_expression(sympy.sympify("1/x")))
+        self.assertIsNone(sum_expression(sympy.sympify("x"), "x", 0, sympy.sympify("sqrt(y)")))
+
+    def test_summation_cache(self):
+        pool = Pool()
+        pool.int_var("x", "y")
+        cache = SummationCache()
+        x, y = sympy.symbols("x y")
+        numeric = cache.get(pool, ("x", pool.terminal("x**2/3 + 3")))
+        self.assertAlmostEqual(sum(k ** 2 / 3.0 + 3 for k in range(2, 9)), numeric(2, 8))
+        # Numeric sums are exact
+        self.assertEqual(sympy.Rational(sum(k ** 2 + 9 for k in range(2, 9)), 3), numeric(2, 8))
+        self.assertIsInstance(cache.get(pool, ("x", pool.terminal("x")))(1, 30), sympy.Integer)
+        symbolic = cache.get(pool, ("x", pool.terminal("x**2 + y")))
+        self.assertEqual(0, sympy.expand(symbolic(2, 8) - (203 + 7 * y)))
+        self.assertEqual(0, sympy.expand(symbolic(0, y) - sympy.summation(x ** 2 + y, (x, 0, y))))
+        # Non-polynomial leaves are summed by SymPy
+        exponential = cache.get(pool, ("x", pool.terminal("exp(x)")))
+        self.assertAlmostEqual(float(sum(sympy.exp(k) for k in range(0, 4))), float(exponential(0, 3)))
+        statistics = cache.statistics()
+        self.assertEqual((3, 1), (statistics["native_sums"], statistics["sympy_sums"]))
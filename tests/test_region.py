@@ -0,0 +1,74 @@
+import unittest
+
+import numpy
+
+from pyxadd.build import Builder
+from pyxadd.diagram import Pool
+from pyxadd.evaluate import mass_evaluate
+from pyxadd.region import region_index
+
+
+class TestRegionIndex(unittest.TestCase):
+    def setUp(self):
+        self.pool = Pool()
+        b = Builder(self.pool)
+        b.ints("x", "y")
+        b.vars("bool", "a")
+        self.b = b
+        blocks = b.exp(0)
+        for i in range(4):
+            for j in range(3):
+                blocks += b.limit("x", 5 * i, 5 * i + 4) * b.limit("y", 4 * j, 4 * j + 3) * b.exp(i + 10 * j + 1)
+        self.diagram = b.ite(b.test("a"), blocks, blocks * b.exp("x + y"))
+        self.entries = [{"x": x, "y": y, "a": a} for x in range(-2, 23) for y in range(-2, 14) for a in (True, False)]
+
+    def test_evaluate(self):
+        index = region_index(self.diagram)
+        self.assertEqual(["a", "x", "y"], index.variables)
+        columns = {var: numpy.array([entry[var] for entry in self.entries]) for var in index.variables}
+        self.assertTrue(numpy.allclose(mass_evaluate(self.diagram, self.entries), index.evaluate(columns)))
+
+    def test_boxes_partition(self):
+        index = region_index(self.diagram)
+        values = numpy.array([[entry[var] for var in index.variables] for entry in self.entries])
+        # Every point is contained in exactly one box
+        inside = numpy.all((index.lower[None, :, :] <= values[:, None, :]) &
+                           (values[:, None, :] <= index.upper[None, :, :]), axis=2)
+        self.assertTrue(numpy.all(inside.sum(axis=1) == 1))
+        self.assertTrue(numpy.array_equal(numpy.argmax(inside, axis=1), index.locate(values)))
+        # The kd-tree (used when the grid is not available) finds the same boxes
+        self.assertTrue(numpy.array_equal(numpy.argmax(inside, axis=1), index._locate_tree(values)))
+
+    def test_lookup_and_query(self):
+        index = region_index(self.diagram)
+        box = index.lookup({"x": 7, "y": 9, "a": True})
+        bounds, expression = index.region(box)
+        self.assertEqual((5, 9), bounds["x"])
+        self.assertEqual((8, 11), bounds["y"])
+        self.assertEqual(22, expression)
+
+        found = index.query({"x": 6, "y": 1, "a": 1}, {"x": 12, "y": 2, "a": 1})
+        expressions = set(index.region(box)[1] for box in found)
+        self.assertEqual({2, 3}, expressions)
+        for box in found:
+            self.assertEqual((1, 1), index.region(box)[0]["a"])
+
+    def test_coefficients(self):
+        b = self.b
+        diagram = b.ite(b.test("2*x", "<=", 5), 1, 2) * b.ite(b.test("-3*y", "<", -4), 10, 20)
+        index = region_index(diagram)
+        entries = [{"x": x, "y": y} for x in range(-4, 8) for y in range(-4, 8)]
+        columns = {var: numpy.array([entry[var] for entry in entries]) for var in index.variables}
+        self.assertTrue(numpy.allclose(mass_evaluate(diagram, entries), index.evaluate(columns)))
+        self.assertEqual((3, float("inf")), index.region(index.lookup({"x": 3, "y": 0}))[0]["x"])
+
+    def test_constant(self):
+        index = region_index(self.b.exp(3))
+        self.assertEqual([], index.variables)
+        self.assertTrue(numpy.allclose([3, 3, 3], index.evaluate({"x": numpy.arange(3)})))
+        self.assertTrue(numpy.array_equal([0, 0], index._locate_tree(numpy.zeros((2, 0)))))
+
+    def test_not_simple(self):
+        b = self.b
+        with self.assertRaises(RuntimeError):
+            region_index(b.ite(b.test("x + y", "<=", 3), 1, 0))
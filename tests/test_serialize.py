@@ -0,0 +1,104 @@
+import gc
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyxadd import serialize
+from pyxadd.build import Builder
+from pyxadd.diagram import Pool
+from pyxadd.order import is_ordered
+from pyxadd.test import LinearTest
+
+
+class TestSerialize(unittest.TestCase):
+    def setUp(self):
+        self.pool = Pool()
+        b = Builder(self.pool)
+        b.ints("x", "y")
+        b.vars("bool", "a")
+        bounds = b.limit("x", 0, 10) & b.limit("y", -3, 5)
+        d = bounds * b.ite(b.test("x", "<=", "y"), b.exp("x**2*y + 1/3"), b.exp("2.5*x - y"))
+        d = b.ite(b.test("a"), d, d * b.exp("exp(x) + 2")) + b.exp("x") * b.ite(b.test("x", ">", 7), 1, 0)
+        self.diagram = d
+
+    def check_equal(self, pool, root_id):
+        diagram = pool.diagram(root_id)
+        for a in (True, False):
+            for x in range(-1, 12):
+                for y in range(-4, 7):
+                    assignment = {"a": a, "x": x, "y": y}
+                    self.assertEqual(self.diagram.evaluate(assignment), diagram.evaluate(assignment))
+
+    def test_round_trip(self):
+        loaded = Pool.from_binary(Pool.to_binary(self.pool))
+        self.check_equal(loaded, self.diagram.root_id)
+        self.assertEqual(self.pool._counter, loaded._counter)
+        self.assertEqual(self.pool._internal_map, loaded._internal_map)
+        self.assertEqual(self.pool._expressions, loaded._expressions)
+        self.assertEqual(self.pool._test_list, loaded._test_list)
+        self.assertEqual(self.pool.vars, loaded.vars)
+        self.assertEqual(self.pool.zero_id, loaded.zero_id)
+
+        # The loaded pool is hash-consed with the original ids
+        test = self.pool.get_node(self.diagram.root_id).test
+        self.assertEqual(self.pool.bool_test(test), loaded.bool_test(test))
+        self.assertEqual(self.pool.terminal("x**2*y + 1/3"), loaded.terminal("x**2*y + 1/3"))
+        self.assertEqual(self.pool.bool_test(LinearTest("x + y", "<=", 2)),
+                         loaded.bool_test(LinearTest("x + y", "<=", 2)))
+
+    def test_collected_pool(self):
+        Builder(self.pool).exp("3*x") * self.diagram
+        root_id = self.diagram.root_id
+        gc.collect()
+        self.pool.collect()
+        loaded = Pool.from_binary(Pool.to_binary(self.pool))
+        self.check_equal(loaded, root_id)
+        self.assertEqual(self.pool._counter, loaded._counter)
+
+    def test_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "pool.xadd")
+            serialize.dump(self.pool, path)
+            self.check_equal(serialize.load(path), self.diagram.root_id)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_invalid(self):
+        data = Pool.to_binary(self.pool)
+        with self.assertRaises(RuntimeError):
+            Pool.from_binary(b"JSON" + data[4:])
+        with self.assertRaises(RuntimeError):
+            Pool.from_binary(data[:10])
+
+    def test_subpool(self):
+        Builder(self.pool).exp("3*x") * self.diagram
+        data = self.diagram.export_subpool()
+        self.assertTrue(len(data) < len(Pool.to_binary(self.pool)))
+
+        target = Pool()
+        root_id, = target.import_subpool(data)
+        self.check_equal(target, root_id)
+        self.assertEqual(len(self.pool._mark([self.diagram.root_id]) | set(target._constant_ids())),
+                         target._counter - 1)
+
+        # Importing into the source pool finds the existing nodes
+        self.assertEqual([self.diagram.root_id], self.pool.import_subpool(data))
+
+    def test_subpool_reordered(self):
+        target = Pool()
+        b = Builder(target)
+        b.ints("x", "y")
+        b.vars("bool", "a")
+        existing = b.ite(b.test("x", ">", 7), b.test("y", "<=", 5), b.exp("x")) + b.ite(b.test("a"), 1, 0)
+
+        roots = target.import_subpool(self.pool.export_subpool([self.diagram.root_id, self.pool.one_id]))
+        self.assertEqual(target.one_id, roots[1])
+        self.assertTrue(is_ordered(target.diagram(roots[0])))
+        self.check_equal(target, roots[0])
+        self.assertTrue(is_ordered(existing + target.diagram(roots[0])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from pyxadd.build import Builder
+from pyxadd.diagram import Pool
+from pyxadd.evaluate import mass_evaluate
+from pyxadd.stream import evaluate_file, read_chunks
+
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        pool = Pool()
+        b = Builder(pool)
+        b.ints("x", "y")
+        b.vars("bool", "a")
+        d = b.limit("x", 0, 10) * b.ite(b.test("x + 2*y", "<=", 4), b.exp("x**2*y + 1/3"), b.exp("2.5*x - y"))
+        self.diagram = b.ite(b.test("a"), d, d * b.exp(3))
+        self.entries = [{"x": x, "y": y, "a": a} for x in range(-1, 12) for y in range(-4, 7) for a in (1, 0)]
+        self.expected = mass_evaluate(self.diagram, self.entries)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write_csv(self):
+        with open(self.path("input.csv"), "w") as f:
+            f.write("a,x,y\n")
+            for entry in self.entries:
+                f.write("{a},{x},{y}\n".format(**entry))
+        return self.path("input.csv")
+
+    def test_csv(self):
+        input_path = self.write_csv()
+        chunks = list(read_chunks(input_path, chunk_size=50))
+        self.assertEqual(int(numpy.ceil(len(self.entries) / 50.0)), len(chunks))
+        self.assertEqual(50, len(chunks[0]["x"]))
+
+        results = numpy.concatenate(list(evaluate_file(self.diagram, input_path, chunk_size=50)))
+        self.assertTrue(numpy.allclose(self.expected, results))
+
+        self.assertEqual(len(self.entries), evaluate_file(self.diagram, input_path, self.path("out.npy"), 41))
+        self.assertTrue(numpy.allclose(self.expected, numpy.load(self.path("out.npy"))))
+        self.assertEqual(len(self.entries), evaluate_file(self.diagram, input_path, self.path("out.txt"), 41))
+        self.assertTrue(numpy.allclose(self.expected, numpy.loadtxt(self.path("out.txt"))))
+
+    def test_npy(self):
+        matrix = numpy.array([[entry["x"], entry["y"], entry["a"]] for entry in self.entries])
+        numpy.save(self.path("matrix.npy"), matrix)
+        results = evaluate_file(self.diagram, self.path("matrix.npy"), chunk_size=64, variables=["x", "y", "a"])
+        self.assertTrue(numpy.allclose(self.expected, numpy.concatenate(list(results))))
+        with self.assertRaises(RuntimeError):
+            list(evaluate_file(self.diagram, self.path("matrix.npy")))
+
+        structured = numpy.zeros(len(self.entries), dtype=[("x", int), ("y", int), ("a", bool)])
+        for var in ("x", "y", "a"):
+            structured[var] = matrix[:, ["x", "y", "a"].index(var)]
+        numpy.save(self.path("structured.npy"), structured)
+        count = evaluate_file(self.diagram, self.path("structured.npy"), self.path("out.npy"), 64, workers=2)
+        self.assertEqual(len(self.entries), count)
+        self.assertTrue(numpy.allclose(self.expected, numpy.load(self.path("out.npy"))))